@@ -1,5 +1,25 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User  # أو import get_user_model()
+from .models import User, DeliverySlot  # أو import get_user_model()
 
-admin.site.register(User, UserAdmin)
\ No newline at end of file
+
+@admin.register(User)
+class ATMUserAdmin(UserAdmin):
+    # is_active خاصية محسوبة من status وليست حقلاً
+    list_display = ('username', 'email', 'first_name', 'last_name', 'status', 'is_staff')
+    list_filter = ('status', 'is_staff', 'is_superuser', 'groups')
+    fieldsets = (
+        (None, {'fields': ('username', 'password')}),
+        ('Personal info', {'fields': ('first_name', 'last_name', 'email', 'phone_number', 'birth_date')}),
+        ('Permissions', {'fields': ('status', 'is_staff', 'is_superuser', 'groups', 'user_permissions')}),
+        ('Important dates', {'fields': ('last_login', 'date_joined')}),
+    )
+
+
+@admin.register(DeliverySlot)
+class DeliverySlotAdmin(admin.ModelAdmin):
+    # booked يُدار من core/slots.py فقط
+    list_display = ('date', 'slot', 'region', 'capacity', 'booked')
+    list_filter = ('date',)
+    search_fields = ('region',)
+    readonly_fields = ('booked',)
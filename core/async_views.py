@@ -0,0 +1,53 @@
+import asyncio
+
+from asgiref.sync import markcoroutinefunction, sync_to_async
+from django.utils.decorators import classonlymethod
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView بمعالجات async (async def post/get ...).
+
+    تحت ASGI يعمل المعالج في event loop مباشرة؛ فقط المصادقة والصلاحيات (initial)
+    تنتقل إلى thread مرة واحدة لأنها قد تستعلم قاعدة البيانات.
+    تحت WSGI يشغّل Django المعالج عبر async_to_sync فتبقى النتيجة نفسها.
+    """
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        # csrf_exempt في Django < 5.0 يلف الدالة بدالة متزامنة
+        if cls.view_is_async:
+            markcoroutinefunction(view)
+        return view
+
+    async def aload_data(self, request):
+        # تحليل الجسم (multipart قد يكتب ملفات مؤقتة على القرص) خارج event loop
+        return await sync_to_async(lambda: request.data)()
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            # options و http_method_not_allowed متزامنة في APIView
+            if asyncio.iscoroutine(response):
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
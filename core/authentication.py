@@ -1,9 +1,141 @@
-from rest_framework.authentication import TokenAuthentication
+import hashlib
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import router
+from django.utils import timezone
+from rest_framework.authentication import get_authorization_header
 from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from .local_cache import LocalTTLCache
+from .models import User, ATMDevice
+from .permission_cache import get_principal
+
+DEFAULTS = {
+    # مدة بقاء (رمز -> هوية) في الذاكرة بالثواني
+    'TOKEN_CACHE_TTL': 60,
+    'TOKEN_CACHE_MAX_ENTRIES': 10000,
+}
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, 'ATM_AUTH', {})}
+
+
+# مفتاح الكاش هو SHA-256 للرمز الخام، فلا تبقى الرموز نفسها في الذاكرة
+token_cache = LocalTTLCache(max_entries=_config()['TOKEN_CACHE_MAX_ENTRIES'])
+
+
+def token_cache_key(raw_token):
+    return hashlib.sha256(raw_token).hexdigest()
+
+
+def _light_user(user_id, email, status):
+    # كائن User خفيف: بقية الحقول مؤجلة وتُحمّل عند الحاجة فقط
+    return User.from_db(router.db_for_read(User), ['id', 'email', 'status'], [user_id, email, status])
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    """
+    مصادقة JWT بدون تحميل المستخدم من قاعدة البيانات.
+
+    الرموز الصادرة من ATMRefreshToken تحمل status و role و rev.
+    يكفي مقارنة rev بكاش الصلاحيات، ثم يُبنى كائن User خفيف من الـ claims
+    (بقية الحقول مؤجلة وتُحمّل عند الحاجة فقط).
+    الرموز القديمة بدون rev تمر عبر المسار العادي لـ simplejwt.
+    """
+
+    def get_user(self, validated_token):
+        if 'rev' not in validated_token:
+            return super().get_user(validated_token)
+
+        try:
+            # simplejwt يخزّن المعرّف كنص
+            user_id = User._meta.pk.to_python(validated_token[api_settings.USER_ID_CLAIM])
+        except (KeyError, ValidationError):
+            raise InvalidToken("الرمز لا يحتوي على معرّف مستخدم صالح")
+
+        principal = get_principal(user_id)
+        if principal is None:
+            raise AuthenticationFailed("المستخدم غير موجود", code='user_not_found')
+        if principal['rev'] != validated_token['rev']:
+            raise AuthenticationFailed("تم إبطال هذا الرمز. الرجاء تسجيل الدخول مجدداً.", code='token_revoked')
+        if validated_token.get('status') != 'verified':
+            raise AuthenticationFailed("الحساب غير مفعّل", code='user_inactive')
+
+        return _light_user(user_id, validated_token.get('email'), validated_token['status'])
+
+
+class ATMAuthentication(ClaimsJWTAuthentication):
+    """
+    مصادِق موحّد لكل الطلبات، بتمريرة واحدة على ترويسة Authorization:
+
+      Bearer <jwt>            -> رمز JWT (ClaimsJWTAuthentication)
+      Bearer|Token <key>      -> رمز جهاز صراف معتم (ATMDevice)
+
+    نتيجة التحقق من كل رمز تُحفظ في token_cache لمدة TOKEN_CACHE_TTL،
+    مع إعادة فحص rev / الحالة من كاش الصلاحيات في كل طلب.
+    """
+    device_keywords = (b'bearer', b'token')
+
+    def authenticate(self, request):
+        header = get_authorization_header(request).split()
+        if not header:
+            return None
+
+        keyword = header[0].lower()
+        if keyword not in self.device_keywords:
+            return None
+        if len(header) != 2:
+            raise AuthenticationFailed("ترويسة Authorization غير صالحة")
+
+        raw_token = header[1]
+        if keyword == b'bearer' and raw_token.count(b'.') == 2:
+            return self.authenticate_jwt(raw_token)
+        return self.authenticate_device(raw_token)
+
+    def authenticate_jwt(self, raw_token):
+        key = token_cache_key(raw_token)
+        validated_token = token_cache.get(key)
+        if validated_token is None:
+            validated_token = self.get_validated_token(raw_token)
+            token_cache.set(key, validated_token, self._ttl(validated_token.get('exp')))
+        return self.get_user(validated_token), validated_token
+
+    def authenticate_device(self, raw_token):
+        try:
+            raw_key = raw_token.decode()
+        except UnicodeError:
+            raise AuthenticationFailed("رمز الجهاز غير صالح")
+
+        key_hash = ATMDevice.hash_key(raw_key)
+        identity = token_cache.get(key_hash)
+        if identity is None:
+            device = (
+                ATMDevice.objects.using(router.db_for_write(ATMDevice))
+                .select_related('user')
+                .only('id', 'user__id', 'user__email', 'user__status')
+                .filter(key_hash=key_hash, is_active=True)
+                .first()
+            )
+            if device is None:
+                raise AuthenticationFailed("رمز الجهاز غير صالح", code='invalid_device')
+            identity = (device.id, device.user.id, device.user.email)
+            token_cache.set(key_hash, identity, self._ttl())
+
+        device_id, user_id, email = identity
+        # الحالة دائماً من كاش الصلاحيات حتى يسري الحظر فوراً
+        principal = get_principal(user_id)
+        if principal is None or principal['status'] != 'verified':
+            raise AuthenticationFailed("تم رفض حسابك أو لم يتم الموافقة عليه بعد.", code='user_inactive')
+        device = ATMDevice.from_db(router.db_for_read(ATMDevice), ['id', 'user_id'], [device_id, user_id])
+        return _light_user(user_id, email, principal['status']), device
 
-class ApprovedUserTokenAuthentication(TokenAuthentication):
-    def authenticate_credentials(self, key):
-        user, token = super().authenticate_credentials(key)
-        if not user.is_approved:
-            raise AuthenticationFailed("تم رفض حسابك أو لم يتم الموافقة عليه بعد.")
-        return user, token
\ No newline at end of file
+    def _ttl(self, exp=None):
+        ttl = _config()['TOKEN_CACHE_TTL']
+        if exp is not None:
+            ttl = min(ttl, exp - int(timezone.now().timestamp()))
+        return max(ttl, 0)
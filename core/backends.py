@@ -0,0 +1,86 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import load_backend
+from django.contrib.auth.backends import ModelBackend
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.exceptions import PermissionDenied
+
+from .hashing import get_hashing_pool
+from .models import User
+
+
+class EmailBackend(ModelBackend):
+    """
+    مصادقة بالبريد الإلكتروني باستعلام واحد على الفهرس الفريد لـ email.
+
+    التجزئة تتم في HashingPool (قد ترفع HashingPoolSaturated عند الضغط).
+    إذا تغيّرت خوارزمية التجزئة المفضلة أو كلفتها يُعاد تجزئ كلمة المرور تلقائياً.
+    """
+
+    def authenticate(self, request, email=None, password=None, **kwargs):
+        email = email or kwargs.get('username')
+        if email is None or password is None:
+            return None
+
+        pool = get_hashing_pool()
+        user = User.objects.filter(email=email).first()
+        if user is None:
+            # تشغيل التجزئة لتقليل فرق التوقيت مع المستخدم الموجود
+            pool.run(make_password, password)
+            return None
+
+        needs_rehash = []
+        is_correct = pool.run(check_password, password, user.password, needs_rehash.append)
+        if not is_correct:
+            return None
+
+        if needs_rehash:
+            user.password = pool.run(make_password, password)
+            user.save(update_fields=['password'])
+
+        return user if self.user_can_authenticate(user) else None
+
+    async def aauthenticate(self, request, email=None, password=None, **kwargs):
+        """نفس authenticate عبر ORM غير المتزامن و HashingPool.arun (بدون حجز thread)."""
+        email = email or kwargs.get('username')
+        if email is None or password is None:
+            return None
+
+        pool = get_hashing_pool()
+        user = await User.objects.filter(email=email).afirst()
+        if user is None:
+            await pool.arun(make_password, password)
+            return None
+
+        needs_rehash = []
+        is_correct = await pool.arun(check_password, password, user.password, needs_rehash.append)
+        if not is_correct:
+            return None
+
+        if needs_rehash:
+            user.password = await pool.arun(make_password, password)
+            await user.asave(update_fields=['password'])
+
+        return user if self.user_can_authenticate(user) else None
+
+
+async def aauthenticate(request=None, **credentials):
+    """
+    نسخة async من django.contrib.auth.authenticate (غير متوفرة قبل Django 5.0).
+    المصادِقات التي لا تملك aauthenticate تعمل في thread عبر sync_to_async.
+    """
+    for backend_path in settings.AUTHENTICATION_BACKENDS:
+        backend = load_backend(backend_path)
+        if hasattr(backend, 'aauthenticate'):
+            authenticate_method = backend.aauthenticate
+        else:
+            authenticate_method = sync_to_async(backend.authenticate)
+        try:
+            user = await authenticate_method(request, **credentials)
+        except PermissionDenied:
+            break
+        if user is None:
+            continue
+        user.backend = backend_path
+        return user
+    return None
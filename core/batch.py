@@ -0,0 +1,143 @@
+from django.db import transaction as db_transaction
+
+from .models import User, CardDetail, Transaction, DeliveryLocation, DeliverySchedule
+from .serializers import TransactionBatchItemSerializer
+from . import geo, ledger, rates, response_cache, slots, tasks, transfers
+
+
+class TransactionBatch:
+    """
+    إدخال دفعة من المعاملات في وحدة ذرية واحدة.
+
+    التحقق يتم على مستوى الدفعة: استعلام واحد للبطاقات واستعلام واحد للمستلمين
+    مهما كان عدد العناصر، ثم bulk_create للمعاملات وصفوف التسليم.
+    العناصر غير الصالحة لا تمنع إدخال العناصر الصالحة، وتُعاد أخطاؤها لكل عنصر.
+    """
+
+    def __init__(self, items, user):
+        self.items = items
+        self.user = user
+        self.results = [None] * len(items)
+
+    def _fail(self, index, errors):
+        self.results[index] = {'index': index, 'status': 'failed', 'errors': errors}
+
+    def validate(self):
+        valid = []
+        for index, item in enumerate(self.items):
+            if not isinstance(item, dict):
+                self._fail(index, {'non_field_errors': ['يجب أن يكون كل عنصر كائن JSON.']})
+                continue
+            serializer = TransactionBatchItemSerializer(data=item)
+            if not serializer.is_valid():
+                self._fail(index, serializer.errors)
+                continue
+            valid.append((index, serializer.validated_data))
+
+        # البطاقات والمستلمون: استعلام واحد لكل منهما
+        card_ids = {data['card_id'] for _, data in valid}
+        cards = {
+            card.id: card
+            for card in CardDetail.objects.filter(user=self.user, id__in=card_ids)
+        }
+        recipient_ids = {data['recipient_id'] for _, data in valid if data.get('recipient_id')}
+        existing_recipients = set(
+            User.objects.filter(id__in=recipient_ids).values_list('id', flat=True)
+        ) if recipient_ids else set()
+
+        checked = []
+        for index, data in valid:
+            if data['card_id'] not in cards:
+                self._fail(index, {'card_id': ['البطاقة لا تخصك.']})
+                continue
+            if data['transaction_type'] in ['send_money', 'receive_money']:
+                if not data.get('recipient_id'):
+                    self._fail(index, {'recipient_id': ["حقل 'recipient_id' مطلوب للتحويلات."]})
+                    continue
+                if data['recipient_id'] not in existing_recipients:
+                    self._fail(index, {'recipient_id': ['المستخدم المستلم غير موجود.']})
+                    continue
+            checked.append((index, data, cards[data['card_id']]))
+        return checked
+
+    def save(self):
+        checked = self.validate()
+
+        transactions = []
+        nested = []
+        for index, data, card in checked:
+            data = dict(data)
+            locations_data = data.pop('delivery_locations', [])
+            schedules_data = data.pop('delivery_schedules', [])
+            data.pop('card_id')
+            recipient_id = data.pop('recipient_id', None)
+            if data['transaction_type'] not in ['send_money', 'receive_money']:
+                recipient_id = None
+            transaction = Transaction(user=self.user, card=card, recipient_id=recipient_id, **data)
+            # كل عنصر يخصم من رصيد صاحب الدفعة فقط
+            try:
+                ledger.check_payer(transaction)
+            except ledger.ForeignDebit:
+                self._fail(index, {'transaction_type': ['لا يمكن الخصم من رصيد مستخدم آخر.']})
+                continue
+            rates.stamp(transaction)
+            transactions.append(transaction)
+            nested.append((index, locations_data, schedules_data))
+
+        with db_transaction.atomic():
+            # حجز فترات التسليم (core/slots.py): العنصر يُرفض كاملاً إذا امتلأت إحدى فتراته
+            groups = [
+                ([DeliverySchedule(transaction=transaction, **sched) for sched in schedules_data],
+                 slots.region_of_locations(locations_data))
+                for transaction, (_, locations_data, schedules_data) in zip(transactions, nested)
+            ]
+            booked = []
+            for transaction, (index, locations_data, _), (schedules, _), full in zip(
+                transactions, nested, groups, slots.admit(groups)
+            ):
+                if full is not None:
+                    self._fail(index, {'delivery_schedules': ['لا توجد سعة متاحة في فترة التسليم المختارة.']})
+                    continue
+                booked.append((transaction, (index, locations_data, schedules)))
+            transactions = [transaction for transaction, _ in booked]
+            nested = [item for _, item in booked]
+
+            # التحويلات (والسحب عند LEDGER['ENFORCE_FUNDS']) تُقبل عنصراً عنصراً حسب الرصيد المقفول
+            enforce_funds = ledger.get_config()['ENFORCE_FUNDS']
+            if enforce_funds or any(map(transfers.is_transfer, transactions)):
+                decisions = ledger.admit(transactions, lambda t: enforce_funds or transfers.is_transfer(t))
+                admitted = []
+                unbooked = []
+                for (transaction, accepted), item in zip(decisions, nested):
+                    if accepted:
+                        admitted.append((transaction, item))
+                    else:
+                        self._fail(item[0], {'non_field_errors': ['الرصيد غير كافٍ.']})
+                        unbooked.extend(schedule.slot_id for schedule in item[2])
+                slots.release(unbooked)
+                transactions = [transaction for transaction, _ in admitted]
+                nested = [item for _, item in admitted]
+
+            Transaction.objects.bulk_create(transactions)
+            # الأرصدة: 3 استعلامات للدفعة كاملة
+            ledger.apply(transactions, enforce_funds=False)
+            missing_rates = [transaction.pk for transaction in transactions if transaction.exchange_rate is None]
+            if missing_rates:
+                tasks.enqueue(rates.fill_transaction_rates, missing_rates, priority=tasks.PRIORITY_LOW)
+
+            locations = []
+            schedules = []
+            for transaction, (_, locations_data, item_schedules) in zip(transactions, nested):
+                locations.extend(DeliveryLocation(transaction=transaction, **loc) for loc in locations_data)
+                schedules.extend(item_schedules)
+            if locations:
+                DeliveryLocation.objects.bulk_create(geo.assign_cells(locations))
+            if schedules:
+                DeliverySchedule.objects.bulk_create(schedules)
+            # bulk_create لا يرسل إشارات: إبطال كاش قوائم المستخدم يدوياً
+            response_cache.bump_on_commit([self.user.pk])
+
+        for transaction, (index, _, _) in zip(transactions, nested):
+            self.results[index] = {'index': index, 'status': 'created', 'id': transaction.id}
+
+        return self.results
@@ -0,0 +1,148 @@
+"""
+فهرس شبكي لمواقع التسليم (بدون PostGIS، يعمل على SQLite).
+
+الأرض مقسّمة إلى خلايا مربعة بحجم CELL_DEGREES. رقم الخلية = صف * عدد الأعمدة + عمود،
+فالخلايا المتجاورة في نفس الصف أرقام متتالية: كل صف من مربع البحث هو نطاق BETWEEN واحد
+على فهرس grid_cell. بعد ذلك تصفية بالمربع الدقيق ثم مسافة haversine في Python.
+"""
+import math
+
+from django.conf import settings
+from django.db.models import Q
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE_LAT = 111.32
+
+DEFAULTS = {
+    # ~1.1 كم عند خط الاستواء؛ تغييره يتطلب manage.py rebuild_delivery_cells
+    'CELL_DEGREES': 0.01,
+    'MAX_RADIUS_KM': 100,
+    'MAX_NEAREST': 100,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'DELIVERY_GEO', {})}
+
+
+def _grid():
+    cell = get_config()['CELL_DEGREES']
+    return cell, math.ceil(360 / cell), math.ceil(180 / cell)
+
+
+def _row_col(latitude, longitude, cell, rows, cols):
+    row = min(max(int((float(latitude) + 90) // cell), 0), rows - 1)
+    col = int((float(longitude) + 180) // cell) % cols
+    return row, col
+
+
+def cell_for(latitude, longitude):
+    if latitude is None or longitude is None:
+        return None
+    cell, cols, rows = _grid()
+    row, col = _row_col(latitude, longitude, cell, rows, cols)
+    return row * cols + col
+
+
+def assign_cells(locations):
+    """قبل bulk_create (لا يستدعي save)."""
+    for location in locations:
+        location.grid_cell = cell_for(location.latitude, location.longitude)
+    return locations
+
+
+def rebuild(DeliveryLocation, using='default', batch_size=5000):
+    """
+    إعادة حساب grid_cell لكل المواقع (بعد تغيير CELL_DEGREES أو استيراد مجمّع).
+    DeliveryLocation: النموذج الحالي أو النموذج التاريخي داخل migration.
+    """
+    total = 0
+    last_id = 0
+    while True:
+        locations = list(
+            DeliveryLocation.objects.using(using).filter(id__gt=last_id).order_by('id')
+            .only('id', 'latitude', 'longitude')[:batch_size]
+        )
+        if not locations:
+            return total
+        last_id = locations[-1].id
+        DeliveryLocation.objects.using(using).bulk_update(assign_cells(locations), ['grid_cell'])
+        total += len(locations)
+
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (float(lat1), float(lon1), float(lat2), float(lon2)))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """(min_lat, max_lat, min_lon, max_lon) للمربع المحيط بالدائرة."""
+    latitude, longitude = float(latitude), float(longitude)
+    dlat = radius_km / KM_PER_DEGREE_LAT
+    cos_lat = math.cos(math.radians(latitude))
+    dlon = 180.0 if cos_lat < 1e-6 else min(radius_km / (KM_PER_DEGREE_LAT * cos_lat), 180.0)
+    return max(latitude - dlat, -90.0), min(latitude + dlat, 90.0), longitude - dlon, longitude + dlon
+
+
+def cell_ranges(box):
+    """نطاقات (من، إلى) لأرقام الخلايا التي تغطي المربع، نطاق لكل صف (أو اثنان عند خط 180)."""
+    min_lat, max_lat, min_lon, max_lon = box
+    cell, cols, rows = _grid()
+    first_row, first_col = _row_col(min_lat, min_lon, cell, rows, cols)
+    last_row, last_col = _row_col(max_lat, max_lon, cell, rows, cols)
+    if max_lon - min_lon >= 360 - cell:
+        first_col, last_col = 0, cols - 1
+
+    spans = [(first_col, last_col)] if first_col <= last_col else [(first_col, cols - 1), (0, last_col)]
+    return [
+        (row * cols + start, row * cols + end)
+        for row in range(first_row, last_row + 1)
+        for start, end in spans
+    ]
+
+
+def box_filter(box):
+    """شرط Q: خلايا المربع (الفهرس) ثم حدوده الدقيقة."""
+    min_lat, max_lat, min_lon, max_lon = box
+    cells = Q()
+    for start, end in cell_ranges(box):
+        cells |= Q(grid_cell__range=(start, end))
+    exact = Q(latitude__gte=min_lat, latitude__lte=max_lat)
+    if min_lon < -180 or max_lon > 180:
+        # المربع يعبر خط 180: الطرفان
+        exact &= Q(longitude__gte=(min_lon + 540) % 360 - 180) | Q(longitude__lte=(max_lon + 540) % 360 - 180)
+    else:
+        exact &= Q(longitude__gte=min_lon, longitude__lte=max_lon)
+    return cells & exact
+
+
+def within(queryset, latitude, longitude, radius_km, fields=()):
+    """
+    الصفوف داخل الدائرة مرتبة بالمسافة: [(row_dict, distance_km)].
+    fields: حقول إضافية تُقرأ بـ values() (دون إنشاء كائنات النموذج).
+    """
+    rows = queryset.filter(box_filter(bounding_box(latitude, longitude, radius_km))).values(
+        'id', 'latitude', 'longitude', *fields
+    )
+    matches = []
+    for row in rows:
+        distance = haversine_km(latitude, longitude, row['latitude'], row['longitude'])
+        if distance <= radius_km:
+            matches.append((row, distance))
+    matches.sort(key=lambda match: match[1])
+    return matches
+
+
+def nearest(queryset, latitude, longitude, k, fields=()):
+    """
+    أقرب k صفوف: بحث بدوائر متضاعفة على الفهرس الشبكي حتى تحوي k نتائج
+    (أي نتيجة خارج الدائرة الحالية أبعد حتماً من كل ما بداخلها).
+    """
+    config = get_config()
+    radius = config['CELL_DEGREES'] * KM_PER_DEGREE_LAT
+    while True:
+        matches = within(queryset, latitude, longitude, radius, fields)
+        if len(matches) >= k or radius >= config['MAX_RADIUS_KM']:
+            return matches[:k]
+        radius = min(radius * 2, config['MAX_RADIUS_KM'])
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    Argon2PasswordHasher,
+    BCryptSHA256PasswordHasher,
+    PBKDF2PasswordHasher,
+)
+
+# كلفة التجزئة قابلة للضبط من PASSWORD_HASHING_COST في الإعدادات.
+# تغيير الكلفة يجعل must_update صحيحاً، فيُعاد التجزئ تلقائياً عند تسجيل الدخول التالي.
+_cost = getattr(settings, 'PASSWORD_HASHING_COST', {})
+
+
+class ATMArgon2PasswordHasher(Argon2PasswordHasher):
+    time_cost = _cost.get('ARGON2_TIME_COST', Argon2PasswordHasher.time_cost)
+    memory_cost = _cost.get('ARGON2_MEMORY_COST', Argon2PasswordHasher.memory_cost)
+    parallelism = _cost.get('ARGON2_PARALLELISM', Argon2PasswordHasher.parallelism)
+
+
+class ATMBCryptSHA256PasswordHasher(BCryptSHA256PasswordHasher):
+    rounds = _cost.get('BCRYPT_ROUNDS', BCryptSHA256PasswordHasher.rounds)
+
+
+class ATMPBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    iterations = _cost.get('PBKDF2_ITERATIONS', PBKDF2PasswordHasher.iterations)
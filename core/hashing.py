@@ -0,0 +1,70 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+DEFAULTS = {
+    # عدد عمليات التجزئة المتزامنة (حد أعلى لاستهلاك المعالج في تسجيل الدخول)
+    'WORKERS': 2,
+    # عدد الطلبات المسموح لها بالانتظار قبل الرفض بـ 429
+    'MAX_PENDING': 32,
+    # أقصى انتظار لنتيجة التجزئة بالثواني
+    'TIMEOUT': 10,
+}
+
+
+class HashingPoolSaturated(Exception):
+    pass
+
+
+class HashingPool:
+    """
+    مجموعة threads محدودة لتجزئة كلمات المرور.
+
+    argon2 / bcrypt / pbkdf2 تُحرر الـ GIL أثناء الحساب، لذلك تحديد عدد الـ workers
+    يحدد عدد الأنوية التي يستهلكها تسجيل الدخول، وتبقى بقية الطلبات سريعة.
+    عند امتلاء الطابور يُرفض الطلب فوراً بدلاً من تكديسه.
+    """
+
+    def __init__(self, workers, max_pending, timeout):
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+        self._slots = threading.BoundedSemaphore(workers + max_pending)
+
+    def run(self, fn, *args, **kwargs):
+        if not self._slots.acquire(blocking=False):
+            raise HashingPoolSaturated
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(timeout=self.timeout)
+
+    async def arun(self, fn, *args, **kwargs):
+        # نفس run لكن دون حجز thread من خادم ASGI أثناء انتظار التجزئة
+        if not self._slots.acquire(blocking=False):
+            raise HashingPoolSaturated
+        try:
+            future = self._executor.submit(fn, *args, **kwargs)
+        except BaseException:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_hashing_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                config = {**DEFAULTS, **getattr(settings, 'PASSWORD_HASHING_POOL', {})}
+                _pool = HashingPool(config['WORKERS'], config['MAX_PENDING'], config['TIMEOUT'])
+    return _pool
@@ -0,0 +1,106 @@
+"""
+مفاتيح عدم التكرار لطلبات الكتابة (ترويسة Idempotency-Key).
+
+يُسجّل المفتاح في نفس معاملة قاعدة البيانات التي ينفّذ فيها الطلب، مع قيد فريد (user, key):
+- طلبان متزامنان بنفس المفتاح: الثاني ينتظر على الفهرس الفريد حتى تنتهي معاملة الأول،
+  ثم يعيد استجابته المحفوظة.
+- إذا فشل الطلب باستثناء (أخطاء التحقق، الرصيد غير الكافي، 5xx) يُلغى كل شيء بما فيه المفتاح،
+  فيمكن إعادة المحاولة بنفس المفتاح. الطلب المنتظر عندها يحاول حجز المفتاح مجدداً، وإلا 409.
+"""
+import functools
+import hashlib
+
+from django.conf import settings
+from django.db import IntegrityError, transaction as db_transaction
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+DEFAULTS = {
+    # بعد هذه المدة يُحذف المفتاح (manage.py prune_idempotency_keys)
+    'TTL': 24 * 60 * 60,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'IDEMPOTENCY', {})}
+
+
+def fingerprint(request):
+    digest = hashlib.sha256()
+    digest.update(request.method.encode())
+    digest.update(request.path.encode())
+    digest.update(request.body)
+    return digest.hexdigest()
+
+
+def replay(record, request_fingerprint):
+    if record.fingerprint != request_fingerprint:
+        return Response(
+            {"error": "مفتاح Idempotency-Key مستخدم لطلب مختلف."},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    response = Response(record.response_body, status=record.response_status)
+    response[REPLAY_HEADER] = 'true'
+    return response
+
+
+def idempotent(handler):
+    """
+    مزخرف لدوال الكتابة في الـ ViewSets (create وما شابه).
+    بدون الترويسة يُنفّذ الطلب كالمعتاد.
+    """
+    @functools.wraps(handler)
+    def wrapper(view, request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if not key:
+            return handler(view, request, *args, **kwargs)
+        if len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"error": f"طول Idempotency-Key يجب ألا يتجاوز {MAX_KEY_LENGTH}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        # قراءة body قبل أن يستهلكه الـ parser
+        request_fingerprint = fingerprint(request._request)
+        existing = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+        if existing is not None:
+            return replay(existing, request_fingerprint)
+
+        for _ in range(2):
+            with db_transaction.atomic():
+                try:
+                    with db_transaction.atomic():
+                        record = IdempotencyKey.objects.create(
+                            user=request.user, key=key, fingerprint=request_fingerprint, response_status=0,
+                        )
+                except IntegrityError:
+                    # طلب متزامن بنفس المفتاح أنهى معاملته للتو
+                    record = None
+
+                if record is not None:
+                    response = handler(view, request, *args, **kwargs)
+                    if response.status_code >= 500:
+                        db_transaction.set_rollback(True)
+                        return response
+                    record.response_status = response.status_code
+                    record.response_body = response.data
+                    record.save(update_fields=['response_status', 'response_body'])
+                    return response
+
+            existing = IdempotencyKey.objects.filter(user=request.user, key=key).first()
+            if existing is not None:
+                return replay(existing, request_fingerprint)
+            # الطلب المتزامن فشل وأُلغي مفتاحه: محاولة حجز المفتاح مرة أخرى
+
+        return Response(
+            {"error": "طلب آخر بنفس Idempotency-Key قيد التنفيذ، أعد المحاولة."},
+            status=status.HTTP_409_CONFLICT,
+        )
+
+    return wrapper
@@ -0,0 +1,231 @@
+"""
+دفتر الأرصدة: كل Transaction و TransferTransaction يُترجم إلى قيود (user_id, currency, delta) تُطبق على جدول Balance
+داخل نفس المعاملة، مع قفل صفوف الرصيد (select_for_update) بترتيب ثابت لتفادي الـ deadlock.
+"""
+import copy
+from collections import defaultdict
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import models
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Balance, TransferTransaction
+
+# الحالات التي تحجز المبلغ من الرصيد (الفاشلة والملغاة لا تُحتسب)
+COUNTED_STATUSES = ('pending', 'completed')
+
+DEFAULTS = {
+    # رفض السحب/التحويل الذي يتجاوز الرصيد
+    'ENFORCE_FUNDS': False,
+}
+
+
+class InsufficientFunds(Exception):
+    def __init__(self, user_id, currency, available):
+        super().__init__(f"Insufficient funds for user {user_id}: {available} {currency}")
+        self.user_id = user_id
+        self.currency = currency
+        self.available = available
+
+
+class ForeignDebit(Exception):
+    """قيد يخصم من حساب غير صاحب المعاملة (مثل receive_money ينشئه المستخدم باسم المستلم)."""
+
+    def __init__(self, user_id):
+        super().__init__(f"Transaction debits another user's balance: {user_id}")
+        self.user_id = user_id
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'LEDGER', {})}
+
+
+def postings(transaction):
+    """
+    قيود المعاملة على الأرصدة. المبلغ بعملة currency_from.
+    send_money: من المستخدم إلى المستلم؛ receive_money: من المستلم إلى المستخدم.
+    """
+    if transaction.status not in COUNTED_STATUSES:
+        return []
+    if isinstance(transaction, TransferTransaction):
+        return transfer_postings(transaction)
+    amount, currency = Decimal(transaction.amount), transaction.currency_from
+    kind = transaction.transaction_type
+    if kind == 'deposit':
+        return [(transaction.user_id, currency, amount)]
+    if kind == 'withdrawal':
+        return [(transaction.user_id, currency, -amount)]
+
+    sign = -1 if kind == 'send_money' else 1
+    entries = [(transaction.user_id, currency, sign * amount)]
+    if transaction.recipient_id:
+        entries.append((transaction.recipient_id, currency, -sign * amount))
+    return entries
+
+
+def transfer_postings(transfer):
+    """
+    الدافع يخسر amount_sent بعملة currency_sent، والمستفيد يكسب amount_received بعملة currency_received.
+    send_money: الدافع هو المستخدم؛ receive_money: الدافع هو المستلم.
+    """
+    payer, payee = transfer.user_id, transfer.recipient_id
+    if transfer.transaction_type == 'receive_money':
+        payer, payee = payee, payer
+    entries = []
+    if payer:
+        entries.append((payer, transfer.currency_sent, -Decimal(transfer.amount_sent)))
+    if payee:
+        entries.append((payee, transfer.currency_received, Decimal(transfer.amount_received)))
+    return entries
+
+
+def status_postings(transaction, previous_status):
+    """
+    فرق القيود عند تغيّر الحالة فقط: postings(الحالة الجديدة) − postings(previous_status).
+    فشل أو إلغاء معاملة معلّقة يعيد المبلغ، وإعادتها إلى pending تحجزه من جديد.
+    """
+    before = copy.copy(transaction)
+    before.status = previous_status
+    return [(user_id, currency, -delta) for user_id, currency, delta in postings(before)] + postings(transaction)
+
+
+def other_accounts(transaction):
+    """المستخدمون الآخرون الذين تمس قيود المعاملة أرصدتهم."""
+    return {user_id for user_id, _, _ in postings(transaction) if user_id != transaction.user_id}
+
+
+def check_payer(transaction):
+    """المستخدم يدفع من رصيده فقط: ForeignDebit إذا خصمت المعاملة من حساب غيره."""
+    for user_id, _, delta in postings(transaction):
+        if delta < 0 and user_id != transaction.user_id:
+            raise ForeignDebit(user_id)
+
+
+def lock(keys):
+    """
+    إنشاء صفوف الرصيد الناقصة ثم قفلها بترتيب (user_id, currency). استعلامان.
+    """
+    Balance.objects.bulk_create(
+        [Balance(user_id=user_id, currency=currency) for user_id, currency in keys],
+        ignore_conflicts=True,
+    )
+    match = Q()
+    for user_id, currency in keys:
+        match |= Q(user_id=user_id, currency=currency)
+    return list(Balance.objects.select_for_update().filter(match).order_by('user_id', 'currency'))
+
+
+def admit(transactions, must_cover):
+    """
+    قفل أرصدة كل المعاملات ثم قبولها بالترتيب: المعاملة التي تحقق must_cover(transaction)
+    تُرفض إذا جعلت أحد الأرصدة سالباً. تُعاد قائمة (transaction, accepted).
+    """
+    entries = {id(transaction): postings(transaction) for transaction in transactions}
+    keys = {(user_id, currency) for items in entries.values() for user_id, currency, _ in items}
+    running = {(balance.user_id, balance.currency): balance.amount for balance in lock(keys)} if keys else {}
+
+    decisions = []
+    for transaction in transactions:
+        items = entries[id(transaction)]
+        after = dict(running)
+        for user_id, currency, delta in items:
+            after[(user_id, currency)] += delta
+        accepted = not must_cover(transaction) or all(
+            after[(user_id, currency)] >= 0 for user_id, currency, delta in items if delta < 0
+        )
+        if accepted:
+            running = after
+        decisions.append((transaction, accepted))
+    return decisions
+
+
+def apply_postings(entries, enforce_funds=None):
+    """
+    تطبيق قيود على Balance. يجب استدعاؤها داخل transaction.atomic().
+
+    3 استعلامات مهما كان عدد القيود: إنشاء الصفوف الناقصة، قفلها بترتيب (user_id, currency)،
+    ثم تحديث مجمّع.
+    """
+    deltas = defaultdict(Decimal)
+    for user_id, currency, delta in entries:
+        deltas[(user_id, currency)] += delta
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return {}
+
+    if enforce_funds is None:
+        enforce_funds = get_config()['ENFORCE_FUNDS']
+
+    balances = lock(deltas)
+    now = timezone.now()
+    for balance in balances:
+        delta = deltas[(balance.user_id, balance.currency)]
+        if enforce_funds and delta < 0 and balance.amount + delta < 0:
+            raise InsufficientFunds(balance.user_id, balance.currency, balance.amount)
+        balance.amount += delta
+        balance.updated_at = now
+    # bulk_update لا يطبق auto_now، لذلك يُضبط updated_at يدوياً
+    Balance.objects.bulk_update(balances, ['amount', 'updated_at'])
+    return {(balance.user_id, balance.currency): balance.amount for balance in balances}
+
+
+def apply(transactions, enforce_funds=None):
+    entries = [entry for transaction in transactions for entry in postings(transaction)]
+    return apply_postings(entries, enforce_funds)
+
+
+def revert(transactions, enforce_funds=None):
+    entries = [(user_id, currency, -delta) for transaction in transactions for user_id, currency, delta in postings(transaction)]
+    return apply_postings(entries, enforce_funds)
+
+
+def get_balance(user_id, currency='AED'):
+    """قراءة واحدة بالمفتاح الفريد (user, currency) بدلاً من جمع السجل."""
+    amount = Balance.objects.filter(user_id=user_id, currency=currency).values_list('amount', flat=True).first()
+    return amount if amount is not None else Decimal('0.00')
+
+
+def expected_balances(user_ids):
+    """
+    الأرصدة المحسوبة من سجل Transaction و TransferTransaction لمجموعة مستخدمين (للمطابقة).
+    أربعة استعلامات مجمّعة: جهة صاحب المعاملة وجهة المستلم لكل جدول.
+    """
+    from .models import Transaction
+
+    counted = Transaction.objects.filter(status__in=COUNTED_STATUSES)
+    expected = defaultdict(Decimal)
+
+    owner_side = counted.filter(user_id__in=user_ids).values('user_id', 'currency_from').annotate(
+        total=models.Sum(models.Case(
+            models.When(transaction_type__in=['withdrawal', 'send_money'], then=-models.F('amount')),
+            default=models.F('amount'),
+        ))
+    )
+    for row in owner_side:
+        expected[(row['user_id'], row['currency_from'])] += row['total']
+
+    recipient_side = counted.filter(
+        recipient_id__in=user_ids, transaction_type__in=['send_money', 'receive_money']
+    ).values('recipient_id', 'currency_from').annotate(
+        total=models.Sum(models.Case(
+            models.When(transaction_type='send_money', then=models.F('amount')),
+            default=-models.F('amount'),
+        ))
+    )
+    for row in recipient_side:
+        expected[(row['recipient_id'], row['currency_from'])] += row['total']
+
+    transfers = TransferTransaction.objects.filter(status__in=COUNTED_STATUSES)
+    for side, field in (('user', 'user_id'), ('recipient', 'recipient_id')):
+        rows = transfers.filter(**{f'{field}__in': user_ids}).values(
+            field, 'transaction_type', 'currency_sent', 'currency_received'
+        ).annotate(sent=models.Sum('amount_sent'), received=models.Sum('amount_received'))
+        for row in rows:
+            pays = (row['transaction_type'] == 'send_money') == (side == 'user')
+            if pays:
+                expected[(row[field], row['currency_sent'])] -= row['sent']
+            else:
+                expected[(row[field], row['currency_received'])] += row['received']
+    return expected
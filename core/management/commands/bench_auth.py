@@ -0,0 +1,73 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core import permission_cache
+from core.authentication import ATMAuthentication, token_cache
+from core.models import User, ATMDevice
+from core.tokens import ATMRefreshToken
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = "قياس زمن كل طريقة مصادقة (JWT / رمز جهاز، مع وبدون كاش). البيانات المؤقتة تُحذف بعد القياس."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['iterations'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, iterations):
+        user = User.objects.create(username='bench-auth', email='bench-auth@example.com', status='verified')
+        _, device_key = ATMDevice.issue(user, 'bench')
+        claims_jwt = str(ATMRefreshToken.for_user(user).access_token)
+        stock_jwt = str(RefreshToken.for_user(user).access_token)
+
+        factory = APIRequestFactory()
+        atm_auth = ATMAuthentication()
+        stock_auth = JWTAuthentication()
+
+        def request(header):
+            return factory.get('/api/transactions/', HTTP_AUTHORIZATION=header)
+
+        schemes = [
+            ('simplejwt (DB user load)', stock_auth, request(f'Bearer {stock_jwt}'), False),
+            ('jwt claims, cold token cache', atm_auth, request(f'Bearer {claims_jwt}'), True),
+            ('jwt claims, warm token cache', atm_auth, request(f'Bearer {claims_jwt}'), False),
+            ('device token, cold token cache', atm_auth, request(f'Token {device_key}'), True),
+            ('device token, warm token cache', atm_auth, request(f'Token {device_key}'), False),
+        ]
+
+        self.stdout.write(f"{'scheme':<34}{'mean µs':>10}{'p50 µs':>10}{'p99 µs':>10}")
+        for name, authenticator, req, cold in schemes:
+            permission_cache.clear()
+            token_cache.clear()
+            authenticator.authenticate(req)
+
+            samples = []
+            for _ in range(iterations):
+                if cold:
+                    token_cache.clear()
+                start = time.perf_counter()
+                authenticator.authenticate(req)
+                samples.append((time.perf_counter() - start) * 1e6)
+
+            samples.sort()
+            self.stdout.write(
+                f"{name:<34}{statistics.fmean(samples):>10.1f}"
+                f"{samples[len(samples) // 2]:>10.1f}{samples[int(len(samples) * 0.99)]:>10.1f}"
+            )
@@ -0,0 +1,69 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connections, OperationalError
+
+from core.models import User, CardDetail, Transaction
+
+
+class Command(BaseCommand):
+    help = (
+        "قياس قاعدة البيانات المضبوطة حالياً (DB_ENGINE ...): "
+        "خليط متزامن من إنشاء المعاملات وقراءة صفحة السجل. انظر README."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=2000)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--write-ratio', type=float, default=0.2)
+
+    def handle(self, *args, **options):
+        User.objects.filter(email='bench-db@example.com').delete()
+        user = User.objects.create(username='bench-db', email='bench-db@example.com', status='verified')
+        card = CardDetail.objects.create(user=user, last_four='0000', expiry='12/30', cardholder_name='bench')
+        try:
+            self.run(user, card, options['operations'], options['concurrency'], options['write_ratio'])
+        finally:
+            User.objects.filter(pk=user.pk).delete()
+
+    def run(self, user, card, total, concurrency, write_ratio):
+        every = max(int(1 / write_ratio), 1) if write_ratio else 0
+
+        def operation(index):
+            is_write = every and index % every == 0
+            start = time.perf_counter()
+            try:
+                if is_write:
+                    Transaction.objects.create(
+                        user=user, card=card, transaction_type='withdrawal', amount=Decimal('10.00')
+                    )
+                else:
+                    list(Transaction.objects.filter(user=user).order_by('-timestamp', '-id')[:50])
+                error = None
+            except OperationalError as exc:
+                error = str(exc)
+            finally:
+                # كما في نهاية الطلب: يحترم CONN_MAX_AGE
+                for connection in connections.all():
+                    connection.close_if_unusable_or_obsolete()
+            return is_write, time.perf_counter() - start, error
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(operation, range(total)))
+        wall = time.perf_counter() - started
+        connections.close_all()
+
+        default = connections['default']
+        self.stdout.write(f"engine: {default.vendor}  replicas: {len(connections.all()) - 1}")
+        self.stdout.write(f"operations: {total}  concurrency: {concurrency}  wall: {wall:.2f}s  ops/s: {total / wall:.0f}")
+        for label, is_write in (('reads', False), ('writes', True)):
+            samples = sorted(elapsed for write, elapsed, error in results if bool(write) == is_write and not error)
+            errors = sum(1 for write, _, error in results if bool(write) == is_write and error)
+            if samples:
+                self.stdout.write(
+                    f"{label}: {len(samples)}  p50: {samples[len(samples) // 2] * 1000:.2f}ms  "
+                    f"p99: {samples[int(len(samples) * 0.99)] * 1000:.2f}ms  errors: {errors}"
+                )
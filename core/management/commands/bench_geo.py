@@ -0,0 +1,99 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core import geo
+from core.models import DeliveryLocation, Transaction, User
+
+
+class Rollback(Exception):
+    pass
+
+
+# الإمارات تقريباً
+LAT_RANGE = (22.6, 26.1)
+LON_RANGE = (51.5, 56.4)
+
+
+class Command(BaseCommand):
+    help = (
+        "قياس البحث بالقرب على عدد كبير من مواقع التسليم العشوائية: الفهرس الشبكي "
+        "مقابل المسح الكامل. البيانات المؤقتة تُحذف بعد القياس."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--locations', type=int, default=1_000_000)
+        parser.add_argument('--transactions', type=int, default=1000)
+        parser.add_argument('--iterations', type=int, default=30)
+        parser.add_argument('--radius-km', type=float, default=5)
+        parser.add_argument('--k', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        user = User.objects.create(username='bench-geo', email='bench-geo@example.com', status='verified')
+        transactions = Transaction.objects.bulk_create([
+            Transaction(user=user, transaction_type='withdrawal', amount=100, status=rng.choice(['pending', 'completed']))
+            for _ in range(options['transactions'])
+        ])
+        batch_size = 10000
+        total = options['locations']
+        for offset in range(0, total, batch_size):
+            DeliveryLocation.objects.bulk_create(geo.assign_cells([
+                DeliveryLocation(
+                    transaction=rng.choice(transactions), building_type='villa', address=f'bench {index}',
+                    latitude=f'{rng.uniform(*LAT_RANGE):.6f}', longitude=f'{rng.uniform(*LON_RANGE):.6f}',
+                )
+                for index in range(offset, min(offset + batch_size, total))
+            ]))
+        self.stdout.write(f"locations: {total}  insert: {time.perf_counter() - started:.1f}s  engine: {connection.vendor}")
+
+        pending = DeliveryLocation.objects.filter(transaction__status='pending')
+        points = [(rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)) for _ in range(options['iterations'])]
+        radius_km, k = options['radius_km'], options['k']
+        fields = ('transaction_id', 'address')
+
+        cases = [
+            (f'grid within {radius_km:g}km', lambda lat, lon: geo.within(pending, lat, lon, radius_km, fields)),
+            (f'grid nearest k={k}', lambda lat, lon: geo.nearest(pending, lat, lon, k, fields)),
+            (f'full scan {radius_km:g}km', lambda lat, lon: self.full_scan(pending, lat, lon, radius_km, fields)),
+        ]
+        for label, query in cases:
+            # المسح الكامل بطيء: عدد تكرارات أقل
+            samples, results = [], []
+            for lat, lon in points if 'grid' in label else points[:5]:
+                start = time.perf_counter()
+                results.append(len(query(lat, lon)))
+                samples.append(time.perf_counter() - start)
+            samples.sort()
+            self.stdout.write(
+                f"{label:<20} avg results: {statistics.mean(results):<6.1f} p50: {statistics.median(samples) * 1000:.2f}ms  "
+                f"p95: {samples[int(len(samples) * 0.95)] * 1000:.2f}ms"
+            )
+
+        # نفس النتائج بالطريقتين
+        lat, lon = points[0]
+        grid = [row['id'] for row, _ in geo.within(pending, lat, lon, radius_km)]
+        scan = [row['id'] for row, _ in self.full_scan(pending, lat, lon, radius_km)]
+        self.stdout.write(f"grid == full scan: {grid == scan}")
+
+    def full_scan(self, queryset, latitude, longitude, radius_km, fields=()):
+        matches = []
+        for row in queryset.values('id', 'latitude', 'longitude', *fields).iterator(chunk_size=10000):
+            distance = geo.haversine_km(latitude, longitude, row['latitude'], row['longitude'])
+            if distance <= radius_km:
+                matches.append((row, distance))
+        matches.sort(key=lambda match: match[1])
+        return matches
@@ -0,0 +1,87 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import async_to_sync
+from django.core.management.base import BaseCommand
+from django.db import connections
+from rest_framework.test import APIRequestFactory
+
+from core.models import User
+from core.views import LoginView
+
+
+class Command(BaseCommand):
+    help = (
+        "اختبار حمل لتسجيل الدخول: موجة طلبات متزامنة على LoginView، "
+        "مع قياس زمن طلب خفيف موازٍ لإظهار أثر التجزئة على بقية الطلبات."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=16)
+
+    def handle(self, *args, **options):
+        email = 'bench-login@example.com'
+        password = 'bench-login-password'
+        User.objects.filter(email=email).delete()
+        user = User.objects.create(username='bench-login', email=email, status='verified')
+        user.set_password(password)
+        user.save(update_fields=['password'])
+
+        try:
+            self.run(email, password, options['requests'], options['concurrency'])
+        finally:
+            User.objects.filter(pk=user.pk).delete()
+
+    def run(self, email, password, total, concurrency):
+        factory = APIRequestFactory()
+        view = LoginView.as_view()
+
+        def login(_):
+            request = factory.post('/api/login/', {'email': email, 'password': password}, format='json')
+            start = time.perf_counter()
+            # LoginView async: تحت WSGI يشغّلها Django عبر async_to_sync بنفس الطريقة
+            response = async_to_sync(view)(request)
+            elapsed = time.perf_counter() - start
+            connections.close_all()
+            return response.status_code, elapsed
+
+        # طلب خفيف موازٍ: زمنه يكشف إن كانت التجزئة تستهلك كل المعالج
+        probe_samples = []
+        stop = threading.Event()
+
+        def probe():
+            while not stop.is_set():
+                start = time.perf_counter()
+                sum(range(2000))
+                probe_samples.append(time.perf_counter() - start)
+                time.sleep(0.005)
+
+        probe_thread = threading.Thread(target=probe)
+        probe_thread.start()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(login, range(total)))
+        wall = time.perf_counter() - started
+        stop.set()
+        probe_thread.join()
+
+        ok = sorted(elapsed for code, elapsed in results if code == 200)
+        throttled = sum(1 for code, _ in results if code == 429)
+        other = len(results) - len(ok) - throttled
+        probe_samples.sort()
+
+        self.stdout.write(f"requests: {total}  concurrency: {concurrency}  wall: {wall:.2f}s")
+        self.stdout.write(f"200: {len(ok)}  429: {throttled}  other: {other}")
+        if ok:
+            self.stdout.write(
+                f"logins/s: {len(ok) / wall:.1f}  "
+                f"p50: {ok[len(ok) // 2] * 1000:.1f}ms  p99: {ok[int(len(ok) * 0.99)] * 1000:.1f}ms"
+            )
+        if probe_samples:
+            self.stdout.write(
+                f"probe p50: {statistics.median(probe_samples) * 1e6:.0f}µs  "
+                f"p99: {probe_samples[int(len(probe_samples) * 0.99)] * 1e6:.0f}µs"
+            )
@@ -0,0 +1,231 @@
+import asyncio
+import io
+import itertools
+import random
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import caches
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connection, connections
+from django.db.backends.signals import connection_created
+from django.test.utils import override_settings
+
+from core.models import CardDetail, Transaction, User
+from core.tokens import ATMRefreshToken
+
+
+class Command(BaseCommand):
+    help = (
+        "محاكاة تطبيقات الجوال والصرافات التي تستطلع GET /api/transactions/ بشكل دوري، مع تغيّر حالة "
+        "بعض المعاملات بين الجولات. يقارن: بدون كاش، كاش الحمولة، If-None-Match (304)، "
+        "واتصال SSE واحد لكل عميل على /api/transactions/events/ (push) بدلاً من الاستطلاع."
+    )
+    modes = ('uncached', 'cached', 'etag', 'push')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=200)
+        parser.add_argument('--rounds', type=int, default=10)
+        parser.add_argument('--transactions', type=int, default=20, help="معاملات لكل عميل")
+        parser.add_argument('--changes', type=int, default=10, help="معاملات تتغير حالتها في كل جولة")
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--mode', choices=self.modes + ('all',), default='all')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        User.objects.filter(email__startswith='bench-poll-').delete()
+        users = User.objects.bulk_create([
+            User(username=f'bench-poll-{index}', email=f'bench-poll-{index}@example.com', status='verified')
+            for index in range(options['clients'])
+        ])
+        cards = CardDetail.objects.bulk_create([
+            CardDetail(user=user, last_four='0000', expiry='12/30', cardholder_name='bench') for user in users
+        ])
+        Transaction.objects.bulk_create([
+            Transaction(user=user, card=card, transaction_type='withdrawal', amount=10)
+            for user, card in zip(users, cards) for _ in range(options['transactions'])
+        ])
+        tokens = [str(ATMRefreshToken.for_user(user).access_token) for user in users]
+        try:
+            for mode in self.modes if options['mode'] == 'all' else (options['mode'],):
+                # نفس التغييرات في كل وضع
+                Transaction.objects.filter(user__in=users).update(status='pending')
+                if mode == 'push':
+                    self.report_push(self.run_push(users, tokens, options))
+                else:
+                    self.report(mode, self.run(mode, users, tokens, options))
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def run(self, mode, users, tokens, options):
+        rng = random.Random(options['seed'])
+        handler = WSGIHandler()
+        # كل وضع يبدأ بكاش فارغ
+        caches['default'].clear()
+        etags = {}
+        queries = itertools.count()
+        lock = threading.Lock()
+
+        def count_queries(execute, sql, params, many, context):
+            with lock:
+                next(queries)
+            return execute(sql, params, many, context)
+
+        def poll(index):
+            environ = {
+                'REQUEST_METHOD': 'GET', 'PATH_INFO': '/api/transactions/', 'QUERY_STRING': '',
+                'SERVER_NAME': 'testserver', 'SERVER_PORT': '80', 'wsgi.url_scheme': 'http',
+                'wsgi.input': io.BytesIO(), 'HTTP_AUTHORIZATION': f'Bearer {tokens[index]}',
+            }
+            if mode == 'etag' and index in etags:
+                environ['HTTP_IF_NONE_MATCH'] = etags[index]
+            statuses = []
+            start = time.perf_counter()
+            with connection.execute_wrapper(count_queries):
+                response = handler(environ, lambda status, headers: statuses.append((status, dict(headers))))
+                size = len(b''.join(response))
+            connections.close_all()
+            status, headers = statuses[0]
+            if 'ETag' in headers:
+                etags[index] = headers['ETag']
+            return int(status.split()[0]), size, time.perf_counter() - start
+
+        with override_settings(RESPONSE_CACHE={'ENABLED': mode != 'uncached'}):
+            results = []
+            started = time.perf_counter()
+            for _ in range(options['rounds']):
+                with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+                    results.extend(executor.map(poll, range(len(users))))
+                self.change_statuses(rng, users, options)
+            wall = time.perf_counter() - started
+        return results, wall, next(queries)
+
+    def change_statuses(self, rng, users, options):
+        """تغيّر حالة بعض المعاملات (إشارات post_save تُبطل كاش أصحابها وتنشر أحداث الحالة)."""
+        changed = Transaction.objects.filter(user__in=rng.sample(users, min(options['changes'], len(users))))
+        published = {}
+        for transaction in changed.only('id', 'user_id', 'status')[:options['changes']]:
+            if transaction.status != 'completed':
+                published[transaction.id] = time.perf_counter()
+            transaction.status = 'completed'
+            transaction.save(update_fields=['status'])
+        return published
+
+    def run_push(self, users, tokens, options):
+        """
+        كل عميل يفتح تدفق SSE واحداً عبر ASGIHandler (event loop في thread منفصل)، والجولات
+        تغيّر الحالات من هذا الـ thread. تُعد استعلامات الطلبات فقط (ليس استعلامات الكاتب).
+        """
+        rng = random.Random(options['seed'])
+        handler = ASGIHandler()
+        writer = threading.current_thread()
+        queries = itertools.count()
+        lock = threading.Lock()
+        sizes = [0] * len(users)
+        statuses = {}
+        published, delivered = {}, {}
+        latencies = []
+        connected = threading.Semaphore(0)
+
+        def count_queries(execute, sql, params, many, context):
+            with lock:
+                next(queries)
+            return execute(sql, params, many, context)
+
+        def install_counter(sender, connection, **kwargs):
+            if threading.current_thread() is not writer:
+                connection.execute_wrappers.append(count_queries)
+
+        async def client(index):
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET',
+                'scheme': 'http', 'path': '/api/transactions/events/', 'raw_path': b'/api/transactions/events/',
+                'query_string': b'', 'root_path': '', 'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+                'headers': [(b'host', b'testserver'), (b'authorization', f'Bearer {tokens[index]}'.encode())],
+            }
+            requested = False
+
+            async def receive():
+                nonlocal requested
+                if not requested:
+                    requested = True
+                    return {'type': 'http.request', 'body': b'', 'more_body': False}
+                await asyncio.Future()
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses[index] = message['status']
+                    return
+                body = message.get('body', b'')
+                sizes[index] += len(body)
+                if body.startswith(b'event: snapshot'):
+                    connected.release()
+                for line in body.split(b'\n'):
+                    if line.startswith(b'data: {'):
+                        transaction_id = int(line.split(b'"id": ')[1].split(b',')[0])
+                        with lock:
+                            delivered[transaction_id] = time.perf_counter()
+
+            await handler(scope, receive, send)
+
+        async def serve(stop):
+            tasks = [asyncio.ensure_future(client(index)) for index in range(len(users))]
+            await stop.wait()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        loop = asyncio.new_event_loop()
+        stop = asyncio.Event()
+        server = threading.Thread(target=loop.run_forever, daemon=True)
+        connection_created.connect(install_counter)
+        try:
+            server.start()
+            served = asyncio.run_coroutine_threadsafe(serve(stop), loop)
+            for _ in users:
+                connected.acquire(timeout=30)
+            for _ in range(options['rounds']):
+                changes = self.change_statuses(rng, users, options)
+                published.update(changes)
+                deadline = time.perf_counter() + 5
+                while time.perf_counter() < deadline and not changes.keys() <= delivered.keys():
+                    time.sleep(0.001)
+            loop.call_soon_threadsafe(stop.set)
+            served.result(timeout=30)
+        finally:
+            loop.call_soon_threadsafe(loop.stop)
+            server.join(timeout=5)
+            loop.close()
+            connection_created.disconnect(install_counter)
+        for transaction_id, sent in published.items():
+            if transaction_id in delivered:
+                latencies.append(delivered[transaction_id] - sent)
+        return {
+            'connections': len(statuses), 'statuses': Counter(statuses.values()), 'queries': next(queries),
+            'bytes': sum(sizes), 'published': len(published), 'delivered': len(latencies),
+            'latencies': sorted(latencies),
+        }
+
+    def report(self, mode, outcome):
+        results, wall, queries = outcome
+        statuses = Counter(status for status, _, _ in results)
+        latencies = sorted(elapsed for _, _, elapsed in results)
+        self.stdout.write(
+            f"{mode:<9} requests: {len(results)}  statuses: {dict(statuses)}  db queries: {queries}  "
+            f"bytes: {sum(size for _, size, _ in results)}  req/s: {len(results) / wall:.0f}  "
+            f"p50: {latencies[len(latencies) // 2] * 1000:.2f}ms"
+        )
+
+    def report_push(self, outcome):
+        latencies = outcome['latencies'] or [0]
+        self.stdout.write(
+            f"{'push':<9} requests: {outcome['connections']}  statuses: {dict(outcome['statuses'])}  "
+            f"db queries: {outcome['queries']}  bytes: {outcome['bytes']}  "
+            f"events: {outcome['delivered']}/{outcome['published']}  "
+            f"delivery p50: {latencies[len(latencies) // 2] * 1000:.2f}ms  "
+            f"p99: {latencies[int(len(latencies) * 0.99)] * 1000:.2f}ms"
+        )
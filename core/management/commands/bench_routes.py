@@ -0,0 +1,113 @@
+import random
+import time
+from datetime import date, time as clock
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from core import geo, route_planner
+from core.models import DeliveryLocation, DeliverySchedule, Transaction, User
+
+
+class Rollback(Exception):
+    pass
+
+
+# مراكز المدن (دبي، أبوظبي، الشارقة، العين) وانتشار ~9 كم؛ والباقي عشوائي في الإمارات
+CITIES = [(25.20, 55.27), (24.45, 54.38), (25.35, 55.42), (24.21, 55.74)]
+LAT_RANGE = (22.6, 26.1)
+LON_RANGE = (51.5, 56.4)
+
+
+class Command(BaseCommand):
+    help = (
+        "قياس تخطيط مسارات يوم واحد: تحميل الجداول من قاعدة البيانات ثم التجميع وأقرب جار و 2-opt، "
+        "ومقارنة طول المسارات بالترتيب الزمني. البيانات المؤقتة تُحذف بعد القياس."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--stops', type=int, default=20000)
+        parser.add_argument('--window-minutes', type=int, default=None)
+        parser.add_argument('--max-stops', type=int, default=None)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        rng = random.Random(options['seed'])
+        day = date(2030, 1, 15)
+        total = options['stops']
+
+        started = time.perf_counter()
+        user = User.objects.create(username='bench-routes', email='bench-routes@example.com', status='verified')
+        batch_size = 5000
+        for offset in range(0, total, batch_size):
+            count = min(batch_size, total - offset)
+            transactions = Transaction.objects.bulk_create([
+                Transaction(user=user, transaction_type='withdrawal', amount=100) for _ in range(count)
+            ])
+            locations, schedules = [], []
+            for tx in transactions:
+                if rng.random() < 0.8:
+                    latitude, longitude = rng.choice(CITIES)
+                    latitude, longitude = rng.gauss(latitude, 0.08), rng.gauss(longitude, 0.08)
+                else:
+                    latitude, longitude = rng.uniform(*LAT_RANGE), rng.uniform(*LON_RANGE)
+                locations.append(DeliveryLocation(
+                    transaction=tx, building_type='villa', address=f'bench {tx.pk}',
+                    latitude=f'{latitude:.6f}', longitude=f'{longitude:.6f}',
+                ))
+                schedules.append(DeliverySchedule(
+                    transaction=tx, delivery_type='scheduled', scheduled_date=day,
+                    scheduled_time=clock(rng.randint(8, 21), rng.choice((0, 15, 30, 45))),
+                ))
+            DeliveryLocation.objects.bulk_create(geo.assign_cells(locations))
+            DeliverySchedule.objects.bulk_create(schedules)
+        self.stdout.write(f"stops: {total}  insert: {time.perf_counter() - started:.1f}s  engine: {connection.vendor}")
+
+        start = time.perf_counter()
+        stops, unplanned = route_planner.load_stops(day)
+        loaded = time.perf_counter() - start
+        self.stdout.write(f"load: {loaded * 1000:.0f}ms  ({len(stops)} stops, {len(unplanned)} unplanned)")
+
+        window, max_stops = options['window_minutes'], options['max_stops']
+        cases = [
+            ('time order', lambda: self.time_order(stops, window, max_stops)),
+            ('nearest neighbour', lambda: route_planner.plan(stops, window, max_stops, passes=0)),
+            ('nn + 2-opt', lambda: route_planner.plan(stops, window, max_stops)),
+        ]
+        for label, build in cases:
+            start = time.perf_counter()
+            routes = build()
+            elapsed = time.perf_counter() - start
+            planned = sum(len(route['stops']) for route in routes)
+            self.stdout.write(
+                f"{label:<18} plan: {elapsed * 1000:>7.0f}ms  routes: {len(routes):<5} stops: {planned:<6} "
+                f"distance: {sum(route['distance_km'] for route in routes):>9.0f} km"
+            )
+
+    def time_order(self, stops, window_minutes, max_stops):
+        """خط الأساس (التوزيع اليدوي): نفس مجموعات النافذة والمنطقة بترتيب الوقت."""
+        config = route_planner.get_config()
+        window_minutes = window_minutes or config['WINDOW_MINUTES']
+        max_stops = max_stops or config['MAX_STOPS']
+        zone_degrees = config['ZONE_DEGREES']
+        clusters = {}
+        for stop in stops:
+            key = (
+                route_planner.window_start(stop.scheduled_time, window_minutes),
+                int(stop.latitude // zone_degrees), int(stop.longitude // zone_degrees),
+            )
+            clusters.setdefault(key, []).append(stop)
+        routes = []
+        for members in clusters.values():
+            for offset in range(0, len(members), max_stops):
+                route = members[offset:offset + max_stops]
+                routes.append({'stops': route, 'distance_km': route_planner.route_length_km(route)})
+        return routes
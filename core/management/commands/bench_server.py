@@ -0,0 +1,182 @@
+import asyncio
+import io
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from core.models import User
+from core.tokens import ATMRefreshToken
+
+
+class SlowInput(io.RawIOBase):
+    """wsgi.input لعميل بطيء: كل دفعة من الجسم تصل بعد delay ثانية (يحجز thread الخادم طوال الرفع)."""
+
+    def __init__(self, body, chunk_size, delay):
+        self._body = io.BytesIO(body)
+        self._chunk_size = chunk_size
+        self._delay = delay
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        # مثل خوادم WSGI: القراءة تنتظر حتى يصل size كاملاً (أو ينتهي الجسم)
+        if size is None or size < 0:
+            size = len(self._body.getbuffer())
+        data = b''
+        while len(data) < size:
+            chunk = self._body.read(min(self._chunk_size, size - len(data)))
+            if not chunk:
+                break
+            time.sleep(self._delay)
+            data += chunk
+        return data
+
+    def readline(self, size=-1):
+        return self.read(size)
+
+
+class Command(BaseCommand):
+    help = (
+        "مقارنة WSGI و ASGI داخل العملية: طلبات متزامنة من عملاء بطيئين (جسم الطلب يصل على دفعات) "
+        "إلى delivery/signature أو login. WSGI يحجز thread طوال الطلب، و ASGI ينتظر في event loop. انظر README."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=64)
+        parser.add_argument('--wsgi-threads', type=int, default=8, help="threads خادم WSGI (مثل gunicorn --threads)")
+        parser.add_argument('--client-chunks', type=int, default=4, help="عدد دفعات جسم الطلب")
+        parser.add_argument('--client-delay-ms', type=float, default=50, help="التأخير بين الدفعات")
+        parser.add_argument('--server', choices=['wsgi', 'asgi', 'both'], default='both')
+        parser.add_argument('--endpoint', choices=['signature', 'login'], default='signature')
+        parser.add_argument('--payload-kb', type=int, default=32, help="حجم التوقيع (signature فقط)")
+
+    def handle(self, *args, **options):
+        email = 'bench-server@example.com'
+        password = 'bench-server-password'
+        User.objects.filter(email=email).delete()
+        user = User.objects.create(username='bench-server', email=email, status='verified')
+
+        if options['endpoint'] == 'login':
+            user.set_password(password)
+            user.save(update_fields=['password'])
+            path, headers = '/api/login/', []
+            body = json.dumps({'email': email, 'password': password}).encode()
+        else:
+            token = ATMRefreshToken.for_user(user).access_token
+            path, headers = '/api/delivery/signature/', [(b'authorization', f'Bearer {token}'.encode())]
+            svg = '<svg xmlns="http://www.w3.org/2000/svg">' + '<path d="M0 0 L10 10"/>' * (options['payload_kb'] * 40) + '</svg>'
+            body = json.dumps({'signature_data': svg}).encode()
+
+        chunk_size = max(len(body) // options['client_chunks'], 1)
+        delay = options['client_delay_ms'] / 1000
+        request = (path, headers, body, chunk_size, delay)
+
+        try:
+            if options['server'] in ('wsgi', 'both'):
+                self.report('WSGI', self.run_wsgi(request, options))
+            if options['server'] in ('asgi', 'both'):
+                self.report('ASGI', asyncio.run(self.run_asgi(request, options)))
+        finally:
+            User.objects.filter(pk=user.pk).delete()
+
+    def run_wsgi(self, request_spec, options):
+        path, headers, body, chunk_size, delay = request_spec
+        handler = WSGIHandler()
+        # threads الخادم (مثل gunicorn --threads): العميل ينتظر حتى يتحرر thread
+        server_threads = threading.BoundedSemaphore(options['wsgi_threads'])
+
+        def request(_):
+            environ = {
+                'REQUEST_METHOD': 'POST',
+                'PATH_INFO': path,
+                'SERVER_NAME': 'testserver',
+                'SERVER_PORT': '80',
+                'CONTENT_TYPE': 'application/json',
+                'CONTENT_LENGTH': str(len(body)),
+                'wsgi.input': SlowInput(body, chunk_size, delay),
+                'wsgi.url_scheme': 'http',
+                **{f"HTTP_{name.decode().upper()}": value.decode() for name, value in headers},
+            }
+            statuses = []
+            start = time.perf_counter()
+            with server_threads:
+                response = handler(environ, lambda status, headers: statuses.append(status))
+                b''.join(response)
+                connections.close_all()
+            return int(statuses[0].split()[0]), time.perf_counter() - start
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            results = list(executor.map(request, range(options['requests'])))
+        return results, time.perf_counter() - started
+
+    async def run_asgi(self, request_spec, options):
+        path, headers, body, chunk_size, delay = request_spec
+        handler = ASGIHandler()
+        semaphore = asyncio.Semaphore(options['concurrency'])
+
+        async def request():
+            chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'POST',
+                'scheme': 'http',
+                'path': path,
+                'raw_path': path.encode(),
+                'query_string': b'',
+                'root_path': '',
+                'headers': [
+                    (b'host', b'testserver'),
+                    (b'content-type', b'application/json'),
+                    (b'content-length', str(len(body)).encode()),
+                    *headers,
+                ],
+                'client': ('127.0.0.1', 0),
+                'server': ('testserver', 80),
+            }
+
+            async def receive():
+                if not chunks:
+                    # الطلب انتهى؛ Django ينتظر هنا حدث انقطاع الاتصال
+                    await asyncio.Event().wait()
+                await asyncio.sleep(delay)
+                chunk = chunks.pop(0)
+                return {'type': 'http.request', 'body': chunk, 'more_body': bool(chunks)}
+
+            statuses = []
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+
+            async with semaphore:
+                start = time.perf_counter()
+                await handler(scope, receive, send)
+            return statuses[0], time.perf_counter() - start
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(request() for _ in range(options['requests'])))
+        return results, time.perf_counter() - started
+
+    def report(self, label, outcome):
+        results, wall = outcome
+        ok = sorted(elapsed for code, elapsed in results if code == 200)
+        throttled = sum(1 for code, _ in results if code == 429)
+        other = len(results) - len(ok) - throttled
+        line = f"{label}: wall {wall:.2f}s  200: {len(ok)}  429: {throttled}  other: {other}"
+        if ok:
+            line += (
+                f"  req/s: {len(ok) / wall:.1f}"
+                f"  p50: {ok[len(ok) // 2] * 1000:.0f}ms  p99: {ok[int(len(ok) * 0.99)] * 1000:.0f}ms"
+            )
+        self.stdout.write(line)
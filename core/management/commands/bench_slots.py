@@ -0,0 +1,146 @@
+import statistics
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, time as clock
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.db.models import Count
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core import slots
+from core.models import DeliveryLocation, DeliverySchedule, DeliverySlot, Transaction, User
+
+
+class Command(BaseCommand):
+    help = (
+        "اختبار حمل لحجز فترات التسليم: طلبات متزامنة على نفس الفترة عبر DeliveryScheduleViewSet، "
+        "ثم التحقق من عدم تجاوز السعة، وقياس availability مقابل count(*)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--capacity', type=int, default=50)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--iterations', type=int, default=50)
+        parser.add_argument('--schedules', type=int, default=200_000, help="جداول أخرى في نفس اليوم (لقياس count(*))")
+
+    def handle(self, *args, **options):
+        User.objects.filter(email__startswith='bench-slots').delete()
+        self.day = date(2030, 1, 15)
+        self.latitude, self.longitude = '25.204800', '55.270800'
+        self.region = slots.region_for(self.latitude, self.longitude)
+        DeliverySlot.objects.filter(date=self.day, region=self.region).delete()
+
+        user = User.objects.create(username='bench-slots', email='bench-slots@example.com', status='verified')
+        other = User.objects.create(username='bench-slots-other', email='bench-slots-other@example.com')
+        try:
+            self.fill(other, options['schedules'])
+            self.run(user, options)
+        finally:
+            user.delete()
+            other.delete()
+            DeliverySlot.objects.filter(date=self.day, region=self.region).delete()
+
+    def fill(self, user, total):
+        transactions = Transaction.objects.bulk_create([
+            Transaction(user=user, transaction_type='withdrawal', amount=100) for _ in range(100)
+        ])
+        for offset in range(0, total, 10000):
+            DeliverySchedule.objects.bulk_create([
+                DeliverySchedule(
+                    transaction=transactions[index % len(transactions)], delivery_type='scheduled',
+                    scheduled_date=self.day, scheduled_time=clock(8 + index % 14, 15 * (index % 4)),
+                )
+                for index in range(offset, min(offset + 10000, total))
+            ])
+
+    def run(self, user, options):
+        # استيراد متأخر: core.views يحمّل كل الـ serializers
+        from core.views import DeliveryScheduleViewSet, DeliverySlotAvailabilityView
+
+        transactions = Transaction.objects.bulk_create([
+            Transaction(user=user, transaction_type='withdrawal', amount=100) for _ in range(options['requests'])
+        ])
+        DeliveryLocation.objects.bulk_create([
+            DeliveryLocation(
+                transaction=tx, building_type='villa', address='bench',
+                latitude=self.latitude, longitude=self.longitude,
+            )
+            for tx in transactions
+        ])
+        DeliverySlot.objects.create(date=self.day, slot=clock(10), region=self.region, capacity=options['capacity'])
+
+        factory = APIRequestFactory()
+        view = DeliveryScheduleViewSet.as_view({'post': 'create'})
+
+        def book(tx):
+            payload = {
+                'transaction_id': tx.pk, 'delivery_type': 'scheduled',
+                'scheduled_date': self.day.isoformat(), 'scheduled_time': '10:30',
+            }
+            try:
+                for attempt in range(20):
+                    request = factory.post('/api/delivery-schedules/', payload, format='json')
+                    force_authenticate(request, user=user)
+                    try:
+                        return view(request).status_code
+                    except OperationalError:
+                        time.sleep(0.01 * (attempt + 1))
+                return None
+            finally:
+                for connection in connections.all():
+                    connection.close_if_unusable_or_obsolete()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            statuses = Counter(executor.map(book, transactions))
+        wall = time.perf_counter() - started
+        self.stdout.write(
+            f"requests: {len(transactions)}  concurrency: {options['concurrency']}  wall: {wall:.2f}s  "
+            f"statuses: {dict(statuses)}"
+        )
+
+        slot = DeliverySlot.objects.get(date=self.day, slot=clock(10), region=self.region)
+        scheduled = DeliverySchedule.objects.filter(transaction__user=user).count()
+        errors = []
+        if slot.booked > slot.capacity:
+            errors.append(f"overbooked: {slot.booked} > {slot.capacity}")
+        if slot.booked != scheduled or scheduled != statuses[201]:
+            errors.append(f"counter drift: booked={slot.booked} schedules={scheduled} created={statuses[201]}")
+        if statuses[201] != min(len(transactions), slot.capacity):
+            errors.append(f"expected {min(len(transactions), slot.capacity)} bookings, got {statuses[201]}")
+        for error in errors:
+            self.stderr.write(error)
+        if errors:
+            raise CommandError(f"{len(errors)} invariant(s) violated")
+        self.stdout.write(f"ok: booked {slot.booked}/{slot.capacity}, no overbooking")
+
+        availability = DeliverySlotAvailabilityView.as_view()
+        cases = [
+            ('availability (slots)', lambda: availability(self.authenticated(
+                factory.get('/api/delivery/slots/', {'date': self.day.isoformat(), 'lat': self.latitude, 'lon': self.longitude}),
+                user,
+            ))),
+            # الطريقة السابقة: عدّ الجداول لكل فترة في اليوم
+            ('count(*) per slot', lambda: list(
+                DeliverySchedule.objects.filter(scheduled_date=self.day)
+                .values('scheduled_time').annotate(count=Count('id'))
+            )),
+        ]
+        for label, query in cases:
+            samples = []
+            for _ in range(options['iterations']):
+                start = time.perf_counter()
+                query()
+                samples.append(time.perf_counter() - start)
+            samples.sort()
+            self.stdout.write(
+                f"{label:<22} p50: {statistics.median(samples) * 1000:.2f}ms  "
+                f"p95: {samples[int(len(samples) * 0.95)] * 1000:.2f}ms"
+            )
+
+    def authenticated(self, request, user):
+        force_authenticate(request, user=user)
+        return request
@@ -0,0 +1,65 @@
+import time
+import tracemalloc
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from core import statements
+from core.models import User, CardDetail, Transaction
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "قياس تصدير كشف الحساب: الزمن وذروة الذاكرة (tracemalloc) لأحجام متزايدة. "
+        "البيانات المؤقتة تُحذف بعد القياس."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000])
+        parser.add_argument('--format', dest='output', choices=sorted(statements.CONTENT_TYPES), default='csv')
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(sorted(options['rows']), options['output'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, sizes, output):
+        user = User.objects.create(username='bench-statement', email='bench-statement@example.com', status='verified')
+        card = CardDetail.objects.create(user=user, last_four='0000', expiry='12/30', cardholder_name='bench')
+        start = timezone.now() - timedelta(days=5 * 365)
+
+        inserted = 0
+        for size in sizes:
+            Transaction.objects.bulk_create(
+                (
+                    Transaction(
+                        user=user, card=card, transaction_type='withdrawal', amount=Decimal('10.00'),
+                        timestamp=start + timedelta(minutes=index), message_to_recipient='كشف حساب',
+                    )
+                    for index in range(inserted, size)
+                ),
+                batch_size=5000,
+            )
+            inserted = size
+
+            tracemalloc.start()
+            began = time.perf_counter()
+            written = sum(len(line) for line in statements.stream(user.id, output))
+            elapsed = time.perf_counter() - began
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            self.stdout.write(
+                f"rows: {size:>9}  bytes: {written:>11}  time: {elapsed:.2f}s  "
+                f"rows/s: {size / elapsed:.0f}  peak memory: {peak / 1024:.0f} KiB"
+            )
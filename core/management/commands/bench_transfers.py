@@ -0,0 +1,140 @@
+import random
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connections
+from django.db.models import Count, Sum
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core import ledger
+from core.models import Balance, CardDetail, IdempotencyKey, Transaction, User
+
+
+class Command(BaseCommand):
+    help = (
+        "اختبار حمل للتحويلات: تحويلات متزامنة بين مجموعة صغيرة من المستخدمين مع إعادة إرسال "
+        "نفس الطلب (نفس Idempotency-Key)، ثم التحقق من عدم الصرف المزدوج أو التكرار."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=8)
+        parser.add_argument('--transfers', type=int, default=400)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--duplicates', type=int, default=1, help="عدد مرات إعادة إرسال كل تحويل")
+        parser.add_argument('--opening-balance', default='100.00')
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        opening = Decimal(options['opening_balance'])
+        User.objects.filter(email__startswith='bench-transfer-').delete()
+        users = [
+            User.objects.create(username=f'bench-transfer-{index}', email=f'bench-transfer-{index}@example.com', status='verified')
+            for index in range(options['users'])
+        ]
+        cards = {
+            user.pk: CardDetail.objects.create(user=user, last_four='0000', expiry='12/30', cardholder_name='bench')
+            for user in users
+        }
+        deposits = Transaction.objects.bulk_create([
+            Transaction(user=user, card=cards[user.pk], transaction_type='deposit', amount=opening, currency_to='AED')
+            for user in users
+        ])
+        ledger.apply(deposits)
+
+        try:
+            self.run(users, cards, opening, options)
+        finally:
+            User.objects.filter(pk__in=[user.pk for user in users]).delete()
+
+    def run(self, users, cards, opening, options):
+        # استيراد متأخر: core.views يحمّل كل الـ serializers
+        from core.views import TransactionViewSet
+
+        rng = random.Random(options['seed'])
+        factory = APIRequestFactory()
+        view = TransactionViewSet.as_view({'post': 'start'})
+
+        specs = []
+        for _ in range(options['transfers']):
+            sender, recipient = rng.sample(users, 2)
+            amount = Decimal(rng.randint(1, int(opening // 2) or 1))
+            specs.append((uuid.uuid4().hex, sender, recipient, amount))
+        # كل تحويل يُرسل 1 + duplicates مرة، بترتيب عشوائي فتتسابق النسخ المكررة
+        jobs = [spec for spec in specs for _ in range(1 + options['duplicates'])]
+        rng.shuffle(jobs)
+
+        def send(spec):
+            key, sender, recipient, amount = spec
+            payload = {
+                'transaction_type': 'send_money', 'amount': str(amount), 'currency_to': 'AED',
+                'card_id': cards[sender.pk].pk, 'recipient_id': recipient.pk, 'message_to_recipient': key,
+            }
+            try:
+                # كما يفعل الصراف: إعادة المحاولة بنفس المفتاح عند فشل الاتصال
+                for attempt in range(5):
+                    request = factory.post('/api/transactions/start/', payload, format='json', HTTP_IDEMPOTENCY_KEY=key)
+                    force_authenticate(request, user=sender)
+                    try:
+                        response = view(request)
+                        return key, response.status_code, response.has_header('Idempotent-Replayed')
+                    except OperationalError:
+                        time.sleep(0.01 * (attempt + 1))
+                return key, None, False
+            finally:
+                for connection in connections.all():
+                    connection.close_if_unusable_or_obsolete()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['concurrency']) as executor:
+            results = list(executor.map(send, jobs))
+        wall = time.perf_counter() - started
+
+        statuses = Counter(status for _, status, _ in results)
+        replayed = sum(1 for _, _, is_replay in results if is_replay)
+        accepted = {key for key, status, _ in results if status == 201}
+        self.stdout.write(
+            f"requests: {len(jobs)}  concurrency: {options['concurrency']}  wall: {wall:.2f}s  "
+            f"req/s: {len(jobs) / wall:.0f}"
+        )
+        self.stdout.write(
+            f"created: {len(accepted)}  statuses: {dict(statuses)}  replayed: {replayed}"
+        )
+
+        errors = self.verify(users, opening, accepted)
+        for error in errors:
+            self.stderr.write(error)
+        if errors:
+            raise CommandError(f"{len(errors)} invariant(s) violated")
+        self.stdout.write("ok: no double-spends, no duplicates, balances reconcile")
+
+    def verify(self, users, opening, accepted):
+        user_ids = [user.pk for user in users]
+        errors = []
+
+        balances = Balance.objects.filter(user_id__in=user_ids, currency='AED')
+        total = balances.aggregate(total=Sum('amount'))['total']
+        if total != opening * len(users):
+            errors.append(f"money not conserved: {total} != {opening * len(users)}")
+        for balance in balances.filter(amount__lt=0):
+            errors.append(f"double-spend: user={balance.user_id} balance={balance.amount}")
+
+        transfers = Transaction.objects.filter(user_id__in=user_ids, transaction_type='send_money')
+        duplicates = transfers.values('message_to_recipient').annotate(rows=Count('id')).filter(rows__gt=1)
+        for row in duplicates:
+            errors.append(f"duplicate transfer for key {row['message_to_recipient']}: {row['rows']} rows")
+        created = set(transfers.values_list('message_to_recipient', flat=True))
+        if created != accepted:
+            errors.append(f"created {len(created)} transfers but {len(accepted)} keys were accepted")
+        if IdempotencyKey.objects.filter(user_id__in=user_ids, response_status=201).count() != len(accepted):
+            errors.append("idempotency keys do not match accepted transfers")
+
+        stored = {(balance.user_id, balance.currency): balance.amount for balance in balances}
+        expected = ledger.expected_balances(user_ids)
+        for key in stored.keys() | expected.keys():
+            if stored.get(key, Decimal('0')) != expected.get(key, Decimal('0')):
+                errors.append(f"ledger drift for {key}: stored={stored.get(key)} expected={expected.get(key)}")
+        return errors
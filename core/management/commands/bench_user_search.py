@@ -0,0 +1,81 @@
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from core import user_search
+from core.models import Employee, User
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "قياس بحث الإدارة عن المستخدمين على عدد كبير من المستخدمين الوهميين "
+        "(مطابقة تامة وبحث جزئي عبر UserViewSet). البيانات المؤقتة تُحذف بعد القياس."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1_000_000)
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options['users'], options['iterations'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, total, iterations):
+        started = time.perf_counter()
+        batch_size = 10000
+        for offset in range(0, total, batch_size):
+            users = [
+                user_search.prepare(User(
+                    username=f'bench-search-{index}', email=f'bench-search-{index}@example.com',
+                    first_name='Bench', last_name=f'User{index}',
+                    emirates_id=f'784-{1950 + index % 50}-{index:07d}-{index % 10}',
+                    passport=f'N{index:08d}', phone_number=f'+971 5{index % 10} {index:07d}',
+                ))
+                for index in range(offset, min(offset + batch_size, total))
+            ]
+            User.objects.bulk_create(users)
+            user_search.index_users([(user.pk, user.search_text) for user in users])
+        self.stdout.write(f"users: {total}  insert+index: {time.perf_counter() - started:.1f}s  engine: {connection.vendor}")
+
+        admin = User.objects.create(username='bench-search-admin', email='bench-search-admin@example.com', status='verified')
+        Employee.objects.create(user=admin, role='admin')
+
+        # استيراد متأخر: core.views يحمّل كل الـ serializers
+        from core.views import UserViewSet
+
+        view = UserViewSet.as_view({'get': 'list'})
+        factory = APIRequestFactory()
+        target = total // 2
+        cases = [
+            ('emirates_id exact', {'emirates_id': f'784-{1950 + target % 50}-{target:07d}-{target % 10}'}),
+            ('phone exact', {'phone': f'+971 5{target % 10} {target:07d}'}),
+            ('passport exact', {'passport': f'n{target:08d}'}),
+            ('email exact', {'email': f'BENCH-SEARCH-{target}@example.com'}),
+            ('search partial id', {'search': f'{target:07d}'}),
+            ('search name', {'search': f'user{target}'}),
+        ]
+        for label, params in cases:
+            samples = []
+            for _ in range(iterations):
+                request = factory.get('/api/users/', params)
+                force_authenticate(request, user=admin)
+                start = time.perf_counter()
+                response = view(request)
+                samples.append(time.perf_counter() - start)
+            found = len(response.data['results'])
+            samples.sort()
+            self.stdout.write(
+                f"{label:<20} results: {found:<3} p50: {statistics.median(samples) * 1000:.2f}ms  "
+                f"p95: {samples[int(len(samples) * 0.95)] * 1000:.2f}ms"
+            )
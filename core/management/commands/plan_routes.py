@@ -0,0 +1,51 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_date
+
+from core import route_planner
+
+
+class Command(BaseCommand):
+    help = "تخطيط مسارات المناديب لجداول تسليم يوم واحد (ملخص لكل مسار، أو JSON كامل مع --json)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', required=True, help="YYYY-MM-DD")
+        parser.add_argument('--status', default='pending')
+        parser.add_argument('--window-minutes', type=int, default=None)
+        parser.add_argument('--max-stops', type=int, default=None)
+        parser.add_argument('--depot', default=None, help="lat,lon لنقطة انطلاق المناديب")
+        parser.add_argument('--json', action='store_true')
+
+    def handle(self, *args, **options):
+        date = parse_date(options['date'])
+        if date is None:
+            raise CommandError("--date يجب أن يكون بالصيغة YYYY-MM-DD")
+        depot = None
+        if options['depot']:
+            try:
+                depot = tuple(float(value) for value in options['depot'].split(','))
+            except ValueError:
+                depot = ()
+            if len(depot) != 2:
+                raise CommandError("--depot يجب أن يكون lat,lon")
+
+        stops, unplanned = route_planner.load_stops(date, options['status'])
+        routes = route_planner.plan(stops, options['window_minutes'], options['max_stops'], depot)
+
+        if options['json']:
+            self.stdout.write(json.dumps(
+                {'date': date, 'unplanned': unplanned, 'routes': route_planner.serialize(routes)},
+                cls=DjangoJSONEncoder, ensure_ascii=False,
+            ))
+            return
+        for number, route in enumerate(routes, start=1):
+            self.stdout.write(
+                f"{number:>4}  {route['window_start']}  zone {route['zone']:<10} "
+                f"stops: {len(route['stops']):<3} {route['distance_km']:.1f} km"
+            )
+        self.stdout.write(
+            f"stops={len(stops)} routes={len(routes)} unplanned={len(unplanned)} "
+            f"distance_km={sum(route['distance_km'] for route in routes):.1f}"
+        )
@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core.models import VerificationArtifact
+from core.verification import process_artifact, staging_path
+
+
+class Command(BaseCommand):
+    help = (
+        "معالجة ملفات التحقق المتبقية (بعد إعادة تشغيل الخادم أو الملفات المنقولة من User.face_scan) "
+        "وحذف جلسات الرفع المجزأ المهجورة."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--expire-hours', type=int, default=24)
+
+    def handle(self, *args, **options):
+        processed = failed = 0
+        pending = VerificationArtifact.objects.filter(status='uploaded').values_list('pk', flat=True)
+        for artifact_id in pending.iterator():
+            artifact = process_artifact(artifact_id)
+            if artifact is None:
+                continue
+            if artifact.status == 'processed':
+                processed += 1
+            else:
+                failed += 1
+
+        cutoff = timezone.now() - timedelta(hours=options['expire_hours'])
+        stale = VerificationArtifact.objects.filter(status='uploading', created_at__lt=cutoff)
+        expired = 0
+        for artifact in stale.only('pk', 'upload_id').iterator():
+            staging_path(artifact).unlink(missing_ok=True)
+            artifact.delete()
+            expired += 1
+
+        self.stdout.write(f"processed={processed} failed={failed} expired_uploads={expired}")
@@ -0,0 +1,16 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from core import idempotency
+from core.models import IdempotencyKey
+
+
+class Command(BaseCommand):
+    help = "حذف مفاتيح Idempotency-Key الأقدم من IDEMPOTENCY['TTL']."
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(seconds=idempotency.get_config()['TTL'])
+        deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+        self.stdout.write(f"deleted={deleted}")
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from core.models import SignatureBlob
+
+
+class Command(BaseCommand):
+    help = "حذف محتوى التواقيع الذي لم يعد أي توقيع يشير إليه (بعد تحديث أو حذف التواقيع)."
+
+    def handle(self, *args, **options):
+        deleted, _ = SignatureBlob.objects.filter(signatures__isnull=True).delete()
+        self.stdout.write(f"deleted={deleted}")
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core import geo
+from core.models import DeliveryLocation
+
+
+class Command(BaseCommand):
+    help = "إعادة حساب grid_cell لمواقع التسليم (بعد تغيير DELIVERY_GEO['CELL_DEGREES'] أو تحديث بـ queryset.update)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        total = geo.rebuild(DeliveryLocation, batch_size=options['batch_size'])
+        self.stdout.write(f"updated={total}")
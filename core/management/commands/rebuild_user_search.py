@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from core import user_search
+from core.models import User
+
+
+class Command(BaseCommand):
+    help = "إعادة حساب حقول بحث المستخدمين وفهرس FTS (بعد استيراد مجمّع أو تحديث بـ queryset.update)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        total = user_search.rebuild(User, batch_size=options['batch_size'])
+        self.stdout.write(f"indexed={total}")
@@ -0,0 +1,56 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+
+from core import ledger
+from core.models import Balance, User
+
+
+class Command(BaseCommand):
+    help = "مطابقة جدول Balance مع سجل Transaction على دفعات من المستخدمين (مع --fix لتصحيح الفروق)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--fix', action='store_true', help="تصحيح الأرصدة المختلفة")
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        checked = mismatched = 0
+        last_id = 0
+
+        # ترقيم بالمفتاح (id > last_id) بدلاً من OFFSET، فلا تُحمّل كل الجداول في الذاكرة
+        while True:
+            user_ids = list(
+                User.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not user_ids:
+                break
+            last_id = user_ids[-1]
+            checked += len(user_ids)
+
+            with db_transaction.atomic():
+                stored = {
+                    (balance.user_id, balance.currency): balance
+                    for balance in Balance.objects.select_for_update().filter(user_id__in=user_ids)
+                }
+                expected = ledger.expected_balances(user_ids)
+
+                diffs = []
+                for key in stored.keys() | expected.keys():
+                    actual = stored[key].amount if key in stored else Decimal('0.00')
+                    wanted = expected.get(key, Decimal('0.00'))
+                    if actual != wanted:
+                        diffs.append((key, actual, wanted))
+
+                for (user_id, currency), actual, wanted in diffs:
+                    self.stdout.write(f"user={user_id} currency={currency} stored={actual} expected={wanted}")
+                mismatched += len(diffs)
+
+                if options['fix'] and diffs:
+                    ledger.apply_postings(
+                        [(user_id, currency, wanted - actual) for (user_id, currency), actual, wanted in diffs],
+                        enforce_funds=False,
+                    )
+
+        self.stdout.write(f"users={checked} mismatched={mismatched} fixed={mismatched if options['fix'] else 0}")
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction as db_transaction
+from django.db.models import Count
+
+from core.models import DeliverySchedule, DeliverySlot
+
+
+class Command(BaseCommand):
+    help = "مطابقة عدّاد booked في DeliverySlot مع عدد الجداول المرتبطة فعلاً (مع --fix لتصحيح الفروق)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--fix', action='store_true', help="تصحيح العدادات المختلفة")
+
+    def handle(self, *args, **options):
+        checked = mismatched = 0
+        last_id = 0
+        while True:
+            with db_transaction.atomic():
+                rows = list(
+                    DeliverySlot.objects.select_for_update().filter(id__gt=last_id).order_by('id')
+                    .values_list('id', 'booked')[:options['batch_size']]
+                )
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                checked += len(rows)
+                counts = dict(
+                    DeliverySchedule.objects.filter(slot_id__in=[pk for pk, _ in rows])
+                    .values('slot_id').annotate(count=Count('id')).values_list('slot_id', 'count')
+                )
+                for pk, booked in rows:
+                    actual = counts.get(pk, 0)
+                    if actual == booked:
+                        continue
+                    mismatched += 1
+                    self.stdout.write(f"slot={pk} booked={booked} actual={actual}")
+                    if options['fix']:
+                        DeliverySlot.objects.filter(pk=pk).update(booked=actual)
+
+        self.stdout.write(f"checked={checked} mismatched={mismatched}" + (" fixed" if options['fix'] and mismatched else ""))
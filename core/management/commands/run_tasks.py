@@ -0,0 +1,57 @@
+import signal
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from core import tasks
+
+
+class Command(BaseCommand):
+    help = (
+        "worker لطابور المهام (core/tasks.py): يحجز المهام حسب الأولوية وينفذها مع إعادة المحاولة. "
+        "يمكن تشغيل عدة workers بالتوازي."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="تنفيذ المهام الجاهزة ثم الخروج")
+        parser.add_argument('--worker-id', default=None)
+        parser.add_argument('--max-tasks', type=int, default=None, help="الخروج بعد هذا العدد من المهام")
+
+    def handle(self, *args, **options):
+        worker_id = options['worker_id'] or tasks.default_worker_id()
+        if options['once']:
+            tasks.requeue_stale()
+            count = tasks.run_pending(worker_id, options['max_tasks'])
+            self.stdout.write(f"processed={count}")
+            return
+
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+
+        poll_interval = tasks.get_config()['POLL_INTERVAL']
+        processed = 0
+        idle_loops = 0
+        self.stdout.write(f"worker {worker_id} started")
+        while not self.stopping:
+            close_old_connections()
+            task = tasks.claim(worker_id)
+            if task is None:
+                # فحص المهام العالقة من حين لآخر فقط
+                if idle_loops % 60 == 0:
+                    tasks.requeue_stale()
+                idle_loops += 1
+                tasks.wait_for_work(poll_interval)
+                continue
+
+            idle_loops = 0
+            tasks.execute(task)
+            processed += 1
+            if options['max_tasks'] and processed >= options['max_tasks']:
+                break
+
+        self.stdout.write(f"worker {worker_id} stopped after {processed} tasks")
+
+    def stop(self, signum, frame):
+        # إنهاء المهمة الحالية ثم الخروج
+        self.stopping = True
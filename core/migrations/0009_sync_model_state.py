@@ -0,0 +1,197 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:26
+
+from django.conf import settings
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+def link_employee_users(apps, schema_editor):
+    # الموظفون السابقون لا يرتبطون بمستخدم: مستخدم غير معتمد لكل منهم باسمه، بدون كلمة مرور صالحة
+    Employee = apps.get_model('core', 'Employee')
+    User = apps.get_model('core', 'User')
+    for employee in Employee.objects.filter(user__isnull=True).iterator():
+        employee.user = User.objects.create(
+            username=f'employee-{employee.pk}',
+            email=f'employee-{employee.pk}@employees.invalid',
+            first_name=employee.first_name,
+            last_name=employee.last_name,
+            password='!',
+            status='pending',
+        )
+        employee.save(update_fields=['user'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_digitalsignature'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='carddetail',
+            name='card_number',
+        ),
+        migrations.RemoveField(
+            model_name='carddetail',
+            name='cvv',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='is_active',
+        ),
+        migrations.AddField(
+            model_name='carddetail',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='carddetail',
+            name='is_active',
+            field=models.BooleanField(default=True),
+        ),
+        migrations.AddField(
+            model_name='carddetail',
+            name='last_four',
+            field=models.CharField(default='0000', max_length=4),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='carddetail',
+            name='payment_method_id',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddField(
+            model_name='deliverylocation',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='deliveryschedule',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='digitalsignature',
+            name='purpose',
+            field=models.CharField(choices=[('transfer', 'Transfer'), ('delivery', 'Delivery'), ('verification', 'Verification')], default='verification', max_length=20),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='digitalsignature',
+            name='signed_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='digitalsignature',
+            name='transaction',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='core.transaction'),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        # بدون قيمة افتراضية ثابتة: لكل موظف موجود مستخدم خاص به (قيد OneToOne فريد)، ثم NOT NULL
+        migrations.AddField(
+            model_name='employee',
+            name='user',
+            field=models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='employee_profile', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(link_employee_users, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='employee',
+            name='first_name',
+        ),
+        migrations.RemoveField(
+            model_name='employee',
+            name='last_name',
+        ),
+        migrations.AlterField(
+            model_name='employee',
+            name='user',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='employee_profile', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='exchange_rate',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='message_to_recipient',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='recipient',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='received_transactions', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='transaction',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AlterField(
+            model_name='digitalsignature',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='amount',
+            field=models.DecimalField(decimal_places=2, max_digits=12),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='currency_from',
+            field=models.CharField(default='AED', max_length=3),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='currency_to',
+            field=models.CharField(default='USD', max_length=3),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed'), ('cancelled', 'Cancelled')], default='pending', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AlterField(
+            model_name='transaction',
+            name='transaction_type',
+            field=models.CharField(choices=[('withdrawal', 'Withdrawal'), ('deposit', 'Deposit'), ('send_money', 'Send Money'), ('receive_money', 'Receive Money')], max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='emirates_id',
+            field=models.CharField(blank=True, max_length=19, null=True, validators=[django.core.validators.RegexValidator(message='يجب أن يكون الهوية الإماراتية بالصيغة: 784-1995-1234567-1', regex='^\\d{3}-\\d{4}-\\d{7}-\\d{1}$')]),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='face_scan',
+            field=models.ImageField(blank=True, null=True, upload_to='face_scans/'),
+        ),
+        migrations.AlterField(
+            model_name='user',
+            name='passport',
+            field=models.CharField(blank=True, max_length=15, null=True, unique=True),
+        ),
+    ]
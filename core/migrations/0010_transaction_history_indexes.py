@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_sync_model_state'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deliverylocation',
+            index=models.Index(fields=['transaction', 'created_at'], name='core_dloc_tx_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='deliveryschedule',
+            index=models.Index(fields=['transaction', 'created_at'], name='core_dsch_tx_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'timestamp'], name='core_tx_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'status', 'timestamp'], name='core_tx_user_status_ts_idx'),
+        ),
+    ]
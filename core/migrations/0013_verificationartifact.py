@@ -0,0 +1,64 @@
+# Generated by Django 4.2.30 on 2026-10-17 22:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+import uuid
+
+
+def copy_face_scans(apps, schema_editor):
+    # نقل صور الوجه الموجودة إلى الجدول الجديد قبل حذف العمود
+    User = apps.get_model('core', 'User')
+    VerificationArtifact = apps.get_model('core', 'VerificationArtifact')
+    artifacts = []
+    for user_id, face_scan in User.objects.exclude(face_scan='').exclude(face_scan__isnull=True).values_list('id', 'face_scan'):
+        artifacts.append(VerificationArtifact(
+            user_id=user_id,
+            kind='face_scan',
+            file=face_scan,
+            size=0,
+            status='uploaded',
+        ))
+    VerificationArtifact.objects.bulk_create(artifacts, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_atmdevice'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VerificationArtifact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('face_scan', 'Face Scan')], default='face_scan', max_length=20)),
+                ('upload_id', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('content_type', models.CharField(blank=True, max_length=100)),
+                ('size', models.PositiveBigIntegerField()),
+                ('received_bytes', models.PositiveBigIntegerField(default=0)),
+                ('file', models.FileField(blank=True, upload_to='verification/original/')),
+                ('derivative', models.FileField(blank=True, upload_to='verification/derived/')),
+                ('sha256', models.CharField(blank=True, db_index=True, max_length=64)),
+                ('status', models.CharField(choices=[('uploading', 'Uploading'), ('uploaded', 'Uploaded'), ('processed', 'Processed'), ('failed', 'Failed')], default='uploading', max_length=20)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='verificationartifact',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='verification_artifacts', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='verificationartifact',
+            index=models.Index(fields=['user', 'kind', 'created_at'], name='core_artifact_user_kind_idx'),
+        ),
+        migrations.RunPython(copy_face_scans, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='user',
+            name='face_scan',
+        ),
+    ]
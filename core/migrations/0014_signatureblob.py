@@ -0,0 +1,95 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:05
+
+import base64
+import binascii
+import hashlib
+import logging
+import zlib
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+logger = logging.getLogger(__name__)
+
+MAX_MEDIA_TYPE_LENGTH = 50
+
+
+def move_signature_data(apps, schema_editor):
+    # نقل signature_data إلى SignatureBlob (نفس ترميز core/signatures.py وقت كتابة الـ migration)
+    DigitalSignature = apps.get_model('core', 'DigitalSignature')
+    SignatureBlob = apps.get_model('core', 'SignatureBlob')
+
+    for signature in DigitalSignature.objects.only('id', 'signature_data').iterator():
+        data = signature.signature_data
+        if data.startswith('data:') and ';base64,' in data:
+            header, encoded = data.split(',', 1)
+            media_type = header[len('data:'):-len(';base64')] or 'application/octet-stream'
+            try:
+                if len(media_type) > MAX_MEDIA_TYPE_LENGTH:
+                    raise ValueError("media type too long")
+                raw = base64.b64decode(encoded, validate=True)
+            except (binascii.Error, ValueError):
+                # صف قديم تالف: يُحفظ النص كما هو (يُعاد حرفياً كـ SVG) بدلاً من إيقاف الـ migration
+                logger.warning("DigitalSignature %s has a malformed data URL; stored verbatim", signature.pk)
+                raw, media_type = data.encode('utf-8'), 'image/svg+xml'
+        else:
+            raw, media_type = data.encode('utf-8'), 'image/svg+xml'
+            if not data.lstrip().startswith('<'):
+                try:
+                    raw, media_type = base64.b64decode(data, validate=True), 'application/base64'
+                except (binascii.Error, ValueError):
+                    pass
+
+        compressed = zlib.compress(raw, 9)
+        if len(compressed) < len(raw) * 0.9:
+            stored, encoding = compressed, 'zlib'
+        else:
+            stored, encoding = raw, 'identity'
+        digest = hashlib.sha256(raw).hexdigest()
+        SignatureBlob.objects.bulk_create(
+            [SignatureBlob(digest=digest, data=stored, encoding=encoding, size=len(raw))],
+            ignore_conflicts=True,
+        )
+        DigitalSignature.objects.filter(pk=signature.pk).update(blob_id=digest, media_type=media_type)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_verificationartifact'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SignatureBlob',
+            fields=[
+                ('digest', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('data', models.BinaryField()),
+                ('encoding', models.CharField(choices=[('identity', 'Identity'), ('zlib', 'zlib')], max_length=10)),
+                ('size', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='digitalsignature',
+            name='media_type',
+            field=models.CharField(default='', max_length=50),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='digitalsignature',
+            name='blob',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='signatures', to='core.signatureblob'),
+        ),
+        migrations.RunPython(move_signature_data, migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='digitalsignature',
+            name='signature_data',
+        ),
+        migrations.AlterField(
+            model_name='digitalsignature',
+            name='blob',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='signatures', to='core.signatureblob'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='transfertransaction',
+            name='recipient',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='received_transfers', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='transfertransaction',
+            name='user',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transfers', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='transfertransaction',
+            index=models.Index(fields=['user', 'created_at'], name='core_transfer_user_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transfertransaction',
+            index=models.Index(fields=['recipient', 'created_at'], name='core_transfer_recipient_ts_idx'),
+        ),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:05
+
+import re
+
+from django.db import OperationalError, migrations, models
+import django.db.models.functions.text
+
+# نسخة من core/user_search.py وقت كتابة الـ migration: لا تتغير مع الوحدة لاحقاً
+FTS_TABLE = 'core_user_fts'
+SOURCE_FIELDS = ['email', 'username', 'first_name', 'last_name', 'emirates_id', 'passport', 'phone_number']
+DERIVED_FIELDS = ['emirates_id_digits', 'passport_key', 'phone_digits', 'search_text']
+
+
+def digits(value):
+    return ''.join(ch for ch in (value or '') if ch.isdigit())
+
+
+def prepare(user):
+    user.emirates_id_digits = digits(user.emirates_id)
+    user.phone_digits = digits(user.phone_number)
+    user.passport_key = re.sub(r'[^0-9A-Z]', '', (user.passport or '').upper())
+    user.search_text = ' '.join(filter(None, [
+        (user.email or '').lower(),
+        (user.username or '').lower(),
+        ' '.join(filter(None, [user.first_name, user.last_name])).lower(),
+        user.emirates_id_digits,
+        user.passport_key.lower(),
+        user.phone_digits,
+    ]))
+
+
+def build_search_index(apps, schema_editor):
+    User = apps.get_model('core', 'User')
+    connection = schema_editor.connection
+    using = connection.alias
+
+    fts = False
+    if connection.vendor == 'postgresql':
+        schema_editor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        schema_editor.execute(
+            "CREATE INDEX IF NOT EXISTS core_user_search_trgm_idx ON core_user USING gin (search_text gin_trgm_ops)"
+        )
+    elif connection.vendor == 'sqlite':
+        # SQLite بدون FTS5/trigram (أقدم من 3.34) يبقى على LIKE
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(search_text, tokenize='trigram')")
+                cursor.execute(f"DELETE FROM {FTS_TABLE}")
+            fts = True
+        except OperationalError:
+            pass
+
+    last_id = 0
+    while True:
+        users = list(User.objects.using(using).filter(id__gt=last_id).order_by('id').only(*SOURCE_FIELDS)[:2000])
+        if not users:
+            break
+        last_id = users[-1].id
+        for user in users:
+            prepare(user)
+        User.objects.using(using).bulk_update(users, DERIVED_FIELDS)
+        if fts:
+            with connection.cursor() as cursor:
+                cursor.executemany(
+                    f"INSERT INTO {FTS_TABLE} (rowid, search_text) VALUES (%s, %s)",
+                    [(user.id, user.search_text) for user in users],
+                )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS core_user_search_trgm_idx")
+    elif connection.vendor == 'sqlite':
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0019_transfertransaction_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='emirates_id_digits',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=15),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='passport_key',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=15),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='phone_digits',
+            field=models.CharField(blank=True, db_index=True, default='', editable=False, max_length=20),
+        ),
+        migrations.AddField(
+            model_name='user',
+            name='search_text',
+            field=models.TextField(blank=True, default='', editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(django.db.models.functions.text.Lower('email'), name='core_user_email_lower_idx'),
+        ),
+        migrations.RunPython(build_search_index, drop_search_index),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:11
+
+from django.db import migrations, models
+
+from core import geo
+
+
+def fill_grid_cells(apps, schema_editor):
+    geo.rebuild(apps.get_model('core', 'DeliveryLocation'), using=schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0020_user_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='deliverylocation',
+            name='grid_cell',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='deliverylocation',
+            index=models.Index(fields=['grid_cell'], name='core_dloc_grid_cell_idx'),
+        ),
+        migrations.RunPython(fill_grid_cells, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0021_deliverylocation_grid_cell'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='deliveryschedule',
+            index=models.Index(fields=['scheduled_date', 'scheduled_time'], name='core_dsch_date_time_idx'),
+        ),
+    ]
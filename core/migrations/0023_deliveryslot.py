@@ -0,0 +1,38 @@
+# Generated by Django 4.2.30 on 2026-10-17 23:21
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_deliveryschedule_date_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DeliverySlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('slot', models.TimeField()),
+                ('region', models.CharField(blank=True, default='', max_length=20)),
+                ('capacity', models.PositiveIntegerField()),
+                ('booked', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='deliveryslot',
+            constraint=models.UniqueConstraint(fields=('date', 'region', 'slot'), name='core_dslot_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='deliveryslot',
+            constraint=models.CheckConstraint(check=models.Q(('booked__lte', models.F('capacity'))), name='core_dslot_not_overbooked'),
+        ),
+        migrations.AddField(
+            model_name='deliveryschedule',
+            name='slot',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='schedules', to='core.deliveryslot'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+from rest_framework import status
+from rest_framework.response import Response
+
+from . import response_cache
+
+
+class QuerysetOptimizationMixin:
+    """
+    يطبّق select_related و prefetch_related تلقائياً على queryset الـ ViewSet.
+
+    كل ViewSet يصرّح بالعلاقات التي يحتاجها السيريالايزر الخاص به:
+
+        select_related_fields = ('card',)
+        prefetch_related_fields = ('delivery_locations',)
+
+    يُطبّق التحسين داخل filter_queryset، فيشمل list و retrieve معاً
+    حتى لو أعاد الـ ViewSet تعريف get_queryset.
+    """
+    select_related_fields = ()
+    prefetch_related_fields = ()
+
+    def optimize_queryset(self, queryset):
+        if self.select_related_fields:
+            queryset = queryset.select_related(*self.select_related_fields)
+        if self.prefetch_related_fields:
+            queryset = queryset.prefetch_related(*self.prefetch_related_fields)
+        return queryset
+
+    def filter_queryset(self, queryset):
+        queryset = super().filter_queryset(queryset)
+        return self.optimize_queryset(queryset)
+
+
+class ConditionalListMixin:
+    """
+    list() بكاش لكل مستخدم و ETag (core/response_cache.py):
+
+      If-None-Match مطابق       -> 304 بدون استعلامات
+      حمولة مخزنة لنفس الإصدار   -> 200 بدون استعلامات
+      غير ذلك                    -> list() العادي ثم تخزين response.data
+
+    يجب أن تُبطل كل كتابة تغيّر نتيجة list() إصدار المستخدم (إشارات النماذج أو bump_on_commit).
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not response_cache.get_config()['ENABLED']:
+            return super().list(request, *args, **kwargs)
+
+        user_id = request.user.id
+        tag = response_cache.etag(
+            response_cache.get_version(user_id), request, getattr(request, 'accepted_media_type', '')
+        )
+        if response_cache.matches(request, tag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            data = response_cache.get_payload(user_id, tag)
+            if data is not None:
+                response = Response(data)
+            else:
+                response = super().list(request, *args, **kwargs)
+                if response.status_code == status.HTTP_200_OK:
+                    response_cache.set_payload(user_id, tag, response.data)
+        response['ETag'] = tag
+        # الاستجابة خاصة بالمستخدم؛ العميل يعيد التحقق في كل مرة
+        response['Cache-Control'] = 'private, no-cache'
+        return response
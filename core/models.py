@@ -1,22 +1,16 @@
-from django.db import models
-from django.contrib.auth.models import AbstractUser, Group, Permission
-from django.core.validators import RegexValidator
-from django.utils import timezone
-
-
-# --- الإمارات ID Validator ---
-UAE_ID_REGEX = r'^\d{3}-\d{4}-\d{7}-\d{1}$'
-emirates_id_validator = RegexValidator(
-    regex=UAE_ID_REGEX,
-    message="يجب أن يكون الهوية الإماراتية بالصيغة: 784-1995-1234567-1"
-)
-
+import hashlib
+import secrets
+import uuid
 
 from django.db import models
 from django.contrib.auth.models import AbstractUser, Group, Permission
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import RegexValidator
+from django.db.models.functions import Lower
 from django.utils import timezone
 
+from . import geo, user_search
+
 
 # --- الإمارات ID Validator ---
 UAE_ID_REGEX = r'^\d{3}-\d{4}-\d{7}-\d{1}$'
@@ -32,8 +26,7 @@ class User(AbstractUser):
     birth_date = models.DateField(null=True, blank=True)
     phone_number = models.CharField(max_length=20, null=True, blank=True)
 
-    # تخزين الصور (لا تُخزن كـ text)
-    face_scan = models.ImageField(upload_to='face_scans/', null=True, blank=True)
+    # صورة الوجه في VerificationArtifact (جدول منفصل) حتى لا تُحمّل مع كل مستخدم
 
     # تحسين الحقول مع التحقق من التنسيق
     emirates_id = models.CharField(
@@ -63,6 +56,12 @@ class User(AbstractUser):
         blank=True,
     )
 
+    # حقول مطبّعة لبحث الإدارة (core/user_search.py) - تُحسب عند الحفظ
+    emirates_id_digits = models.CharField(max_length=15, blank=True, default='', db_index=True, editable=False)
+    phone_digits = models.CharField(max_length=20, blank=True, default='', db_index=True, editable=False)
+    passport_key = models.CharField(max_length=15, blank=True, default='', db_index=True, editable=False)
+    search_text = models.TextField(blank=True, default='', editable=False)
+
     # التحكم في الدخول بناءً على الحالة
     @property
     def is_active(self):
@@ -71,6 +70,30 @@ class User(AbstractUser):
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
+    class Meta(AbstractUser.Meta):
+        indexes = [
+            # البحث بالبريد دون حساسية الأحرف
+            models.Index(Lower('email'), name='core_user_email_lower_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # الحالة كما قُرئت: كشف تغيّرها في pre_save بدون استعلام (core/signals.py)
+        if 'status' in instance.__dict__:
+            instance._loaded_status = instance.status
+        return instance
+
+    def save(self, *args, **kwargs):
+        # الحقول المشتقة فقط عند تغيّر مصادرها: المستخدم الخفيف (core/authentication.py)
+        # لا يُحمّل حقوله المؤجلة عند save(update_fields=['status'])
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None or user_search.SOURCE_FIELDS & set(update_fields):
+            user_search.prepare(self)
+            if update_fields is not None:
+                kwargs['update_fields'] = set(update_fields) | user_search.DERIVED_FIELDS
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.email
 
@@ -92,136 +115,82 @@ class Employee(models.Model):
         return f"{self.user.get_full_name()} - {self.role.title()}"
 
 
-# --- تفاصيل البطاقة (بدون CVV!) ---
-class CardDetail(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='cards')
-    
-    # لا تُخزن الأرقام الكاملة! فقط آخر 4 أرقام
-    last_four = models.CharField(max_length=4)  # مثلاً: "4242"
-    expiry = models.CharField(max_length=5)    # "MM/YY"
-    cardholder_name = models.CharField(max_length=100)
-    
-    # رقم داخلي من نظام الدفع (مثل Stripe ID) - لا يُستخدم في المعاملات
-    payment_method_id = models.CharField(max_length=100, blank=True, null=True)
-
-    created_at = models.DateTimeField(default=timezone.now)
-    is_active = models.BooleanField(default=True)
-
-    def __str__(self):
-        return f"Card ending in {self.last_four}"
-
-
-# --- المعاملة المالية (Transaction) ---
-class Transaction(models.Model):
-    TRANSACTION_TYPES = [
-        ('withdrawal', 'Withdrawal'),
-        ('deposit', 'Deposit'),
-        ('send_money', 'Send Money'),
-        ('receive_money', 'Receive Money'),
+# --- ملفات التحقق من الهوية (صورة الوجه) ---
+class VerificationArtifact(models.Model):
+    KIND_CHOICES = [
+        ('face_scan', 'Face Scan'),
     ]
 
     STATUS_CHOICES = [
-        ('pending', 'Pending'),
-        ('completed', 'Completed'),
+        ('uploading', 'Uploading'),
+        ('uploaded', 'Uploaded'),
+        ('processed', 'Processed'),
         ('failed', 'Failed'),
-        ('cancelled', 'Cancelled'),
     ]
 
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transactions')
-    card = models.ForeignKey(CardDetail, on_delete=models.SET_NULL, null=True, related_name='transactions')
-    
-    transaction_type = models.CharField(max_length=20, choices=TRANSACTION_TYPES)
-    amount = models.DecimalField(max_digits=12, decimal_places=2)  # دعم أرقام أكبر
-    
-    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
-    timestamp = models.DateTimeField(default=timezone.now)
-
-    currency_from = models.CharField(max_length=3, default='AED')
-    currency_to = models.CharField(max_length=3, default='USD')
-    exchange_rate = models.DecimalField(max_digits=10, decimal_places=6, null=True, blank=True)
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='verification_artifacts')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='face_scan')
 
-    # المستلم (لتحويل الأموال)
-    recipient = models.ForeignKey(
-        User,
-        on_delete=models.SET_NULL,
-        null=True,
-        blank=True,
-        related_name='received_transactions'
-    )
+    # معرّف جلسة الرفع المجزأ (قابل للاستئناف)
+    upload_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    content_type = models.CharField(max_length=100, blank=True)
+    size = models.PositiveBigIntegerField()
+    received_bytes = models.PositiveBigIntegerField(default=0)
 
-    # رسالة للمستلم
-    message_to_recipient = models.TextField(blank=True, null=True)
+    # الملف الأصلي والنسخة المصغرة المضغوطة + SHA-256 للمحتوى
+    file = models.FileField(upload_to='verification/original/', blank=True)
+    derivative = models.FileField(upload_to='verification/derived/', blank=True)
+    sha256 = models.CharField(max_length=64, blank=True, db_index=True)
 
-    # توقيت التحديث
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='uploading')
     created_at = models.DateTimeField(default=timezone.now)
-    updated_at = models.DateTimeField(auto_now=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
 
-    def __str__(self):
-        return f"{self.transaction_type} - {self.amount} {self.currency_from}"
-
-
-# --- موقع التسليم ---
-class DeliveryLocation(models.Model):
-    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='delivery_locations')
-    
-    is_current_location = models.BooleanField(default=False)
-    building_type = models.CharField(max_length=50)
-    latitude = models.DecimalField(max_digits=9, decimal_places=6)
-    longitude = models.DecimalField(max_digits=9, decimal_places=6)
-    address = models.TextField()
-
-    created_at = models.DateTimeField(default=timezone.now)
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'kind', 'created_at'], name='core_artifact_user_kind_idx'),
+        ]
 
     def __str__(self):
-        return f"Location for {self.transaction}"
+        return f"{self.kind} for {self.user_id} ({self.status})"
 
 
-# --- جدول التسليم ---
-class DeliverySchedule(models.Model):
-    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='delivery_schedules')
-    delivery_type = models.CharField(max_length=50)  # مثل: "same_day", "scheduled"
-    scheduled_date = models.DateField()
-    scheduled_time = models.TimeField()
-
-    created_at = models.DateTimeField(default=timezone.now)
+# --- إصدار رموز JWT (لإبطال الرموز عند تغيير الحالة أو الدور) ---
+class TokenVersion(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='token_version')
+    version = models.PositiveIntegerField(default=0)
 
     def __str__(self):
-        return f"{self.delivery_type} on {self.scheduled_date}"
+        return f"{self.user_id} - v{self.version}"
 
 
-# --- التوقيع الرقمي ---
-class DigitalSignature(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE)
-    transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, null=True, blank=True)
-    
-    # يمكن أن يكون صورة أو SVG أو بيانات base64
-    signature_data = models.TextField()  # SVG أو base64
-    signed_at = models.DateTimeField(default=timezone.now)
-    
-    PURPOSE_CHOICES = [
-        ('transfer', 'Transfer'),
-        ('delivery', 'Delivery'),
-        ('verification', 'Verification'),
-    ]
-    purpose = models.CharField(max_length=20, choices=PURPOSE_CHOICES)
-
-    def __str__(self):
-        return f"Signature by {self.user.email} for {self.purpose}"
-# --- موظف النظام (يرتبط بـ User) ---
-class Employee(models.Model):
-    ROLE_CHOICES = [
-        ('admin', 'Admin'),
-        ('staff', 'Staff'),
-    ]
+# --- أجهزة الصراف (رموز مصادقة معتمة) ---
+class ATMDevice(models.Model):
+    # المستخدم الذي يعمل الجهاز باسمه
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='atm_devices')
+    name = models.CharField(max_length=100)
 
-    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='employee_profile')
-    role = models.CharField(max_length=20, choices=ROLE_CHOICES)
+    # لا يُخزن الرمز نفسه! فقط SHA-256 له
+    key_hash = models.CharField(max_length=64, unique=True)
+    is_active = models.BooleanField(default=True)
 
     created_at = models.DateTimeField(default=timezone.now)
-    updated_at = models.DateTimeField(auto_now=True)
+
+    @staticmethod
+    def hash_key(raw_key):
+        return hashlib.sha256(raw_key.encode()).hexdigest()
+
+    @classmethod
+    def issue(cls, user, name):
+        """
+        ينشئ جهازاً جديداً ويُعيد (الجهاز، الرمز الخام). الرمز الخام لا يُحفظ.
+        """
+        raw_key = secrets.token_urlsafe(32)
+        device = cls.objects.create(user=user, name=name, key_hash=cls.hash_key(raw_key))
+        return device, raw_key
 
     def __str__(self):
-        return f"{self.user.get_full_name()} - {self.role.title()}"
+        return f"ATM {self.name}"
 
 
 # --- تفاصيل البطاقة (بدون CVV!) ---
@@ -288,10 +257,72 @@ class Transaction(models.Model):
     created_at = models.DateTimeField(default=timezone.now)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # فهارس مركّبة لسجل المعاملات (ترقيم بالمؤشر حسب المستخدم والوقت)
+        indexes = [
+            models.Index(fields=['user', 'timestamp'], name='core_tx_user_ts_idx'),
+            models.Index(fields=['user', 'status', 'timestamp'], name='core_tx_user_status_ts_idx'),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # الحالة كما قُرئت: إشعار تغيّرها بدون استعلام إضافي (core/status_events.py)
+        instance._loaded_status = instance.__dict__.get('status')
+        return instance
+
+    def save(self, *args, **kwargs):
+        # updated_at هو معرّف أحداث الحالة (core/status_events.py): يُحفظ مع كل تغيير للحالة
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'status' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'updated_at'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.transaction_type} - {self.amount} {self.currency_from}"
 
 
+# --- التحويل بين المستخدمين (TransferTransaction) ---
+class TransferTransaction(models.Model):
+    TRANSACTION_TYPES = [
+        ('send_money', 'Send Money'),
+        ('receive_money', 'Receive Money'),
+    ]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='transfers')
+    card = models.ForeignKey(CardDetail, on_delete=models.CASCADE)
+    transaction_type = models.CharField(max_length=20, choices=TRANSACTION_TYPES)
+
+    # المبلغ المرسل بعملة المرسل، والمستلم بعملة المستلم (حسب core/rates.py)
+    amount_sent = models.DecimalField(max_digits=10, decimal_places=2)
+    currency_sent = models.CharField(max_length=3)
+    amount_received = models.DecimalField(max_digits=10, decimal_places=2)
+    currency_received = models.CharField(max_length=3)
+
+    recipient = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='received_transfers'
+    )
+    message_to_recipient = models.TextField(blank=True, null=True)
+    location = models.ForeignKey('DeliveryLocation', on_delete=models.SET_NULL, null=True, blank=True)
+
+    status = models.CharField(max_length=20, default='pending')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # صندوق التحويلات: فرع لكل فهرس في استعلام UNION واحد (core/views.py)
+        indexes = [
+            models.Index(fields=['user', 'created_at'], name='core_transfer_user_ts_idx'),
+            models.Index(fields=['recipient', 'created_at'], name='core_transfer_recipient_ts_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.transaction_type} - {self.amount_sent} {self.currency_sent}"
+
+
 # --- موقع التسليم ---
 class DeliveryLocation(models.Model):
     transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='delivery_locations')
@@ -302,32 +333,102 @@ class DeliveryLocation(models.Model):
     longitude = models.DecimalField(max_digits=9, decimal_places=6)
     address = models.TextField()
 
+    # خلية الشبكة (core/geo.py) للبحث بالقرب؛ تُحسب عند الحفظ
+    grid_cell = models.BigIntegerField(null=True, blank=True, editable=False)
+
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['transaction', 'created_at'], name='core_dloc_tx_created_idx'),
+            models.Index(fields=['grid_cell'], name='core_dloc_grid_cell_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.grid_cell = geo.cell_for(self.latitude, self.longitude)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'latitude', 'longitude'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'grid_cell'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"Location for {self.transaction}"
 
 
 # --- جدول التسليم ---
+class DeliverySlot(models.Model):
+    """
+    سعة فترة تسليم (تاريخ، بداية الفترة، منطقة) وعدد الحجوزات فيها (core/slots.py).
+    booked يُحدّث بتعبيرات F() فقط، بشرط ألا يتجاوز capacity.
+    """
+    date = models.DateField()
+    slot = models.TimeField()
+    # منطقة core/route_planner.zone_for، أو '' إذا لم يُحدد موقع
+    region = models.CharField(max_length=20, blank=True, default='')
+    capacity = models.PositiveIntegerField()
+    booked = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['date', 'region', 'slot'], name='core_dslot_uniq'),
+            models.CheckConstraint(check=models.Q(booked__lte=models.F('capacity')), name='core_dslot_not_overbooked'),
+        ]
+
+    def __str__(self):
+        return f"{self.date} {self.slot} {self.region or '-'}: {self.booked}/{self.capacity}"
+
+
 class DeliverySchedule(models.Model):
     transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='delivery_schedules')
     delivery_type = models.CharField(max_length=50)  # مثل: "same_day", "scheduled"
     scheduled_date = models.DateField()
     scheduled_time = models.TimeField()
 
+    # الفترة المحجوزة؛ تُحرر عند الحذف أو إلغاء المعاملة
+    slot = models.ForeignKey(
+        DeliverySlot, on_delete=models.SET_NULL, null=True, blank=True, editable=False, related_name='schedules'
+    )
+
     created_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['transaction', 'created_at'], name='core_dsch_tx_created_idx'),
+            # تخطيط مسارات اليوم (core/route_planner.py)
+            models.Index(fields=['scheduled_date', 'scheduled_time'], name='core_dsch_date_time_idx'),
+        ]
+
     def __str__(self):
         return f"{self.delivery_type} on {self.scheduled_date}"
 
 
 # --- التوقيع الرقمي ---
+class SignatureBlob(models.Model):
+    """
+    محتوى التوقيع مضغوطاً، معنوناً بـ SHA-256 للمحتوى الخام (التوقيعات المتطابقة تُخزن مرة واحدة).
+    """
+    ENCODING_CHOICES = [
+        ('identity', 'Identity'),
+        ('zlib', 'zlib'),
+    ]
+
+    digest = models.CharField(max_length=64, primary_key=True)
+    data = models.BinaryField()
+    encoding = models.CharField(max_length=10, choices=ENCODING_CHOICES)
+    size = models.PositiveIntegerField()  # حجم المحتوى قبل الضغط
+    created_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.digest[:12]} ({self.size} bytes)"
+
+
 class DigitalSignature(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, null=True, blank=True)
-    
-    # يمكن أن يكون صورة أو SVG أو بيانات base64
-    signature_data = models.TextField()  # SVG أو base64
+
+    # المحتوى (صورة أو SVG) في SignatureBlob؛ هنا البيانات الوصفية والـ digest فقط
+    blob = models.ForeignKey(SignatureBlob, on_delete=models.PROTECT, related_name='signatures')
+    media_type = models.CharField(max_length=50)
     signed_at = models.DateTimeField(default=timezone.now)
     
     PURPOSE_CHOICES = [
@@ -338,4 +439,114 @@ class DigitalSignature(models.Model):
     purpose = models.CharField(max_length=20, choices=PURPOSE_CHOICES)
 
     def __str__(self):
-        return f"Signature by {self.user.email} for {self.purpose}"
\ No newline at end of file
+        return f"Signature by {self.user.email} for {self.purpose}"
+
+    @property
+    def signature_data(self):
+        # الصيغة الأصلية (SVG أو data URL) — يحمّل SignatureBlob
+        from .signatures import decode_payload
+        return decode_payload(self.blob, self.media_type)
+
+
+# --- الرصيد (core/ledger.py) ---
+class Balance(models.Model):
+    """
+    رصيد المستخدم لكل عملة، يُحدّث ضمن نفس معاملة إنشاء Transaction
+    (بدلاً من جمع كل سجل المعاملات). يُتحقق منه بـ manage.py reconcile_balances.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='balances')
+    currency = models.CharField(max_length=3)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'currency'], name='core_balance_user_currency_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.amount} {self.currency}"
+
+
+# --- مفاتيح عدم التكرار (core/idempotency.py) ---
+class IdempotencyKey(models.Model):
+    """
+    ترويسة Idempotency-Key لكل طلب كتابة مع الاستجابة المحفوظة.
+    إعادة إرسال نفس الطلب (انقطاع اتصال الصراف) تعيد الاستجابة الأولى بدل تنفيذه مرة ثانية.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+    key = models.CharField(max_length=255)
+    # بصمة (method + path + body) لرفض استخدام نفس المفتاح لطلب مختلف
+    fingerprint = models.CharField(max_length=64)
+    response_status = models.PositiveSmallIntegerField()
+    response_body = models.JSONField(null=True, encoder=DjangoJSONEncoder)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'key'], name='core_idempotency_user_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id}: {self.key}"
+
+
+# --- أسعار الصرف (core/rates.py) ---
+class ExchangeRate(models.Model):
+    """
+    لقطة لسعر زوج عملات داخل فترة زمنية (bucket). لقطة واحدة لكل زوج في كل فترة؛
+    التحديث داخل نفس الفترة يستبدلها، والفترات السابقة تبقى كسجل تاريخي.
+    """
+    base = models.CharField(max_length=3)
+    quote = models.CharField(max_length=3)
+    rate = models.DecimalField(max_digits=20, decimal_places=10)
+    bucket = models.DateTimeField()
+    source = models.CharField(max_length=50, blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['base', 'quote', 'bucket'], name='core_rate_pair_bucket_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['bucket'], name='core_rate_bucket_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.base}/{self.quote} {self.rate} @ {self.bucket:%Y-%m-%d %H:%M}"
+
+
+# --- طابور المهام الخلفية (core/tasks.py) ---
+class Task(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+
+    # المسار الكامل للدالة، مثل core.verification.process_artifact
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+
+    # الأعلى أولاً
+    priority = models.SmallIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(default=timezone.now)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_at'], name='core_task_claim_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
@@ -0,0 +1,42 @@
+from rest_framework.pagination import CursorPagination
+
+
+class UserCursorPagination(CursorPagination):
+    """
+    ترقيم بالمؤشر لقائمة المستخدمين ونتائج البحث (المفتاح الأساسي، الأحدث أولاً).
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-id',)
+
+
+class TransactionCursorPagination(CursorPagination):
+    """
+    ترقيم بالمؤشر (keyset) لسجل المعاملات.
+    يستخدم الفهرس (user, timestamp) فيبقى زمن الصفحة ثابتاً مهما كان حجم السجل.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-timestamp', '-id')
+
+
+class TransferCursorPagination(CursorPagination):
+    """
+    ترقيم بالمؤشر للتحويلات المرسلة (الفهرس user, created_at).
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-created_at', '-id')
+
+
+class DeliveryCursorPagination(CursorPagination):
+    """
+    ترقيم بالمؤشر لمواقع وجداول التسليم.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-created_at', '-id')
@@ -0,0 +1,94 @@
+"""
+كاش صلاحيات المستخدم (الحالة + دور الموظف + إصدار الرموز) حسب معرّف المستخدم.
+
+طبقتان:
+  1. كاش داخل العملية (LocalTTLCache) - بدون أي استعلام.
+  2. كاش مشترك اختياري من CACHES (مثل Redis) عبر PERMISSION_CACHE['BACKEND_ALIAS'].
+
+يُبطل الكاش عبر الإشارات في core/signals.py عند تغيير User أو Employee.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.db import router
+
+from .local_cache import LocalTTLCache
+
+DEFAULTS = {
+    # مدة الصلاحية في الكاش المشترك (بالثواني)
+    'TIMEOUT': 300,
+    # مدة الصلاحية داخل العملية؛ تُقصّر عند استخدام كاش مشترك
+    # لأن الإبطال لا يصل إلى ذاكرة العمليات الأخرى
+    'LOCAL_TIMEOUT': 300,
+    'BACKEND_ALIAS': None,
+    'KEY_PREFIX': 'perm',
+}
+
+_local = LocalTTLCache()
+
+
+def _config():
+    return {**DEFAULTS, **getattr(settings, 'PERMISSION_CACHE', {})}
+
+
+def _shared_cache():
+    alias = _config()['BACKEND_ALIAS']
+    return caches[alias] if alias else None
+
+
+def _key(user_id):
+    return f"{_config()['KEY_PREFIX']}:{user_id}"
+
+
+def _load(user_id):
+    from .models import User
+
+    # من قاعدة البيانات الرئيسية دائماً: تأخر النسخ قد يُبقي حالة محظورة قديمة في الكاش
+    row = User.objects.using(router.db_for_write(User)).filter(pk=user_id).values_list(
+        'status', 'employee_profile__role', 'token_version__version'
+    ).first()
+    if row is None:
+        return None
+    return {'status': row[0], 'role': row[1], 'rev': row[2] or 0}
+
+
+def get_principal(user_id):
+    """
+    يُعيد {'status': ..., 'role': ..., 'rev': ...} للمستخدم، أو None إذا لم يكن موجوداً.
+    """
+    config = _config()
+
+    principal = _local.get(user_id)
+    if principal is not None:
+        return principal
+
+    shared = _shared_cache()
+    principal = shared.get(_key(user_id)) if shared is not None else None
+    if principal is None:
+        principal = _load(user_id)
+        if principal is None:
+            return None
+        if shared is not None:
+            shared.set(_key(user_id), principal, config['TIMEOUT'])
+
+    _local.set(user_id, principal, config['LOCAL_TIMEOUT'])
+    return principal
+
+
+async def aget_principal(user_id):
+    # كاش العملية لا يحتاج I/O؛ عند عدم وجوده ننتقل إلى get_principal في thread
+    principal = _local.get(user_id)
+    if principal is not None:
+        return principal
+    return await sync_to_async(get_principal)(user_id)
+
+
+def invalidate(user_id):
+    _local.delete(user_id)
+    shared = _shared_cache()
+    if shared is not None:
+        shared.delete(_key(user_id))
+
+
+def clear():
+    _local.clear()
@@ -1,13 +1,34 @@
 from rest_framework.permissions import BasePermission
 
+from .permission_cache import get_principal
+
+
+def _principal(request):
+    # رموز ATMRefreshToken تحمل الحالة والدور (وتم التحقق من rev أثناء المصادقة)
+    token = request.auth
+    if token is not None and hasattr(token, 'payload') and 'rev' in token:
+        return {'status': token.get('status'), 'role': token.get('role')}
+    return get_principal(request.user.id)
+
+
 class IsAdminUser(BasePermission):
     def has_permission(self, request, view):
-        return (
-            request.user.is_authenticated and
-            hasattr(request.user, 'employee_profile') and
-            request.user.employee_profile.role == 'admin'
-        )
+        if not request.user.is_authenticated:
+            return False
+        principal = _principal(request)
+        return principal is not None and principal['role'] == 'admin'
 
 class IsApprovedUser(BasePermission):
     def has_permission(self, request, view):
-        return request.user.is_authenticated and request.user.status == 'verified'
\ No newline at end of file
+        if not request.user.is_authenticated:
+            return False
+        principal = _principal(request)
+        return principal is not None and principal['status'] == 'verified'
+
+class IsEmployee(BasePermission):
+    # موظفو التشغيل (admin أو staff)، مثل شاشة توزيع المناديب
+    def has_permission(self, request, view):
+        if not request.user.is_authenticated:
+            return False
+        principal = _principal(request)
+        return principal is not None and principal['role'] in ('admin', 'staff')
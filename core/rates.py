@@ -0,0 +1,175 @@
+"""
+أسعار الصرف: لقطات ExchangeRate في فترات زمنية (bucket) + كاش داخل العملية
+لمصفوفة الأسعار الحالية، فلا يحتاج ختم exchange_rate على المعاملات إلى قراءة من قاعدة البيانات.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Context, Decimal, ROUND_HALF_EVEN
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import response_cache
+from .local_cache import LocalTTLCache
+from .models import ExchangeRate, Transaction
+
+DEFAULTS = {
+    # طول الفترة الزمنية للقطات (لقطة واحدة لكل زوج في كل فترة)
+    'BUCKET_SECONDS': 300,
+    # صلاحية المصفوفة في كاش العملية؛ بعدها تُعاد قراءتها باستعلام واحد
+    'CACHE_TIMEOUT': 60,
+    'CACHE_MAX_ENTRIES': 1024,
+    # لقطات أقدم من هذا لا تُستخدم (سعر قديم أسوأ من عدم وجود سعر)
+    'MAX_AGE': 24 * 60 * 60,
+    # عملة وسيطة للأسعار غير المباشرة (USD/EUR عبر AED)
+    'PIVOT': 'AED',
+}
+
+# دقة Transaction.exchange_rate و Transaction.amount
+RATE_PLACES = Decimal('0.000001')
+MAX_STORED_RATE = Decimal('10000')  # max_digits=10, decimal_places=6
+AMOUNT_PLACES = Decimal('0.01')
+
+MATRIX_KEY = 'matrix'
+
+_cache = LocalTTLCache(DEFAULTS['CACHE_MAX_ENTRIES'])
+_context = Context(prec=28, rounding=ROUND_HALF_EVEN)
+
+
+class RateUnavailable(Exception):
+    pass
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'EXCHANGE_RATES', {})}
+
+
+def bucket_for(moment):
+    seconds = get_config()['BUCKET_SECONDS']
+    timestamp = int(moment.timestamp())
+    return moment - timedelta(seconds=timestamp % seconds, microseconds=moment.microsecond)
+
+
+def record_rates(rates, source='', at=None):
+    """
+    حفظ لقطة أسعار {(base, quote): Decimal} في الفترة الحالية باستعلام واحد (upsert).
+    """
+    bucket = bucket_for(at or timezone.now())
+    now = timezone.now()
+    ExchangeRate.objects.bulk_create(
+        [
+            ExchangeRate(base=base, quote=quote, rate=rate, bucket=bucket, source=source, created_at=now)
+            for (base, quote), rate in rates.items()
+        ],
+        update_conflicts=True,
+        unique_fields=['base', 'quote', 'bucket'],
+        update_fields=['rate', 'source', 'created_at'],
+    )
+    invalidate()
+    return bucket
+
+
+def _load_matrix():
+    cutoff = timezone.now() - timedelta(seconds=get_config()['MAX_AGE'])
+    matrix = {}
+    # الترتيب حسب الفترة: أحدث لقطة لكل زوج تستبدل الأقدم
+    rows = ExchangeRate.objects.filter(bucket__gte=cutoff).order_by('bucket').values_list('base', 'quote', 'rate')
+    for base, quote, rate in rows:
+        matrix[(base, quote)] = rate
+    return matrix
+
+
+def get_matrix():
+    """{(base, quote): rate} لأحدث اللقطات؛ استعلام واحد كل CACHE_TIMEOUT لكل عملية."""
+    matrix = _cache.get(MATRIX_KEY)
+    if matrix is None:
+        matrix = _load_matrix()
+        _cache.set(MATRIX_KEY, matrix, get_config()['CACHE_TIMEOUT'])
+    return matrix
+
+
+def _direct(matrix, base, quote):
+    rate = matrix.get((base, quote))
+    if rate is not None:
+        return rate
+    inverse = matrix.get((quote, base))
+    if inverse:
+        return _context.divide(Decimal(1), inverse)
+    return None
+
+
+def get_rate(base, quote):
+    """سعر base -> quote: مباشر، أو معكوس، أو عبر العملة الوسيطة. None إذا لم يتوفر."""
+    if base == quote:
+        return Decimal(1)
+    rate = _cache.get((base, quote))
+    if rate is not None:
+        return rate
+
+    matrix = get_matrix()
+    rate = _direct(matrix, base, quote)
+    pivot = get_config()['PIVOT']
+    if rate is None and pivot not in (base, quote):
+        to_pivot, from_pivot = _direct(matrix, base, pivot), _direct(matrix, pivot, quote)
+        if to_pivot is not None and from_pivot is not None:
+            rate = _context.multiply(to_pivot, from_pivot)
+    if rate is not None:
+        _cache.set((base, quote), rate, get_config()['CACHE_TIMEOUT'])
+    return rate
+
+
+def stamp(transaction):
+    """
+    تعيين exchange_rate على معاملة (قبل الحفظ) من الكاش. يعيد False إذا لم يتوفر السعر؛
+    عندها تملؤه مهمة fill_transaction_rates لاحقاً.
+    """
+    rate = get_rate(transaction.currency_from, transaction.currency_to)
+    if rate is None or rate >= MAX_STORED_RATE:
+        transaction.exchange_rate = None
+        return False
+    transaction.exchange_rate = rate.quantize(RATE_PLACES, context=_context)
+    return True
+
+
+def fill_transaction_rates(transaction_ids):
+    """مهمة خلفية: ملء exchange_rate للمعاملات التي أُنشئت قبل توفر السعر."""
+    missing = 0
+    updated_users = []
+    pending = Transaction.objects.filter(pk__in=transaction_ids, exchange_rate__isnull=True)
+    for transaction in pending.only('id', 'user_id', 'currency_from', 'currency_to'):
+        if stamp(transaction):
+            Transaction.objects.filter(pk=transaction.pk, exchange_rate__isnull=True).update(
+                exchange_rate=transaction.exchange_rate
+            )
+            updated_users.append(transaction.user_id)
+        else:
+            missing += 1
+    response_cache.bump_on_commit(updated_users)
+    if missing:
+        # يعيد طابور المهام المحاولة لاحقاً
+        raise RateUnavailable(f"{missing} transactions still have no exchange rate")
+
+
+def convert_many(amounts, pairs):
+    """
+    تحويل قائمة مبالغ (Decimal) حيث pairs[i] = (base, quote).
+    السعر يُحسب مرة واحدة لكل زوج، ثم تُضرب كل مبالغ الزوج بنفس السياق العشري.
+    يعيد [(converted, rate)] و None للأزواج غير المتوفرة.
+    """
+    groups = defaultdict(list)
+    for index, pair in enumerate(pairs):
+        groups[pair].append(index)
+
+    results = [None] * len(amounts)
+    multiply, quantize = _context.multiply, Decimal.quantize
+    for (base, quote), indexes in groups.items():
+        rate = get_rate(base, quote)
+        if rate is None:
+            continue
+        for index in indexes:
+            results[index] = (quantize(multiply(amounts[index], rate), AMOUNT_PLACES, context=_context), rate)
+    return results
+
+
+def invalidate():
+    _cache.clear()
@@ -0,0 +1,94 @@
+"""
+كاش استجابات قوائم المستخدم (البطاقات، المعاملات، مواقع وجداول التسليم) مع ETag.
+
+لكل مستخدم رقم إصدار في الكاش، يُزاد عند أي تغيير في بياناته وبعد commit (core/signals.py).
+ETag = الإصدار + بصمة الرابط، فالطلب بـ If-None-Match المطابق يُجاب بـ 304 بدون أي استعلام،
+وغير المطابق يُجاب من الحمولة المخزنة لنفس الإصدار إن وُجدت.
+
+الإصدار يُقرأ قبل الاستعلام: حمولة قديمة لا تُخزّن أبداً تحت إصدار أحدث منها.
+القيمة الأولى للإصدار عشوائية، فإذا فُقد المفتاح من الكاش لا يتطابق ETag قديم صدفة.
+"""
+import hashlib
+import random
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction as db_transaction
+
+DEFAULTS = {
+    'ENABLED': True,
+    # مدة بقاء الحمولة المخزنة (الإصدار نفسه لا ينتهي)
+    'TIMEOUT': 300,
+    # كاش مشترك بين العمليات (مثل Redis) في الإنتاج؛ 'default' هو LocMemCache ما لم يُضبط CACHES
+    'BACKEND_ALIAS': 'default',
+    'KEY_PREFIX': 'resp',
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'RESPONSE_CACHE', {})}
+
+
+def _cache():
+    return caches[get_config()['BACKEND_ALIAS']]
+
+
+def _version_key(user_id):
+    return f"{get_config()['KEY_PREFIX']}:v:{user_id}"
+
+
+def get_version(user_id):
+    cache = _cache()
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, random.getrandbits(48), None)
+        version = cache.get(key)
+    return version
+
+
+def bump(user_id):
+    cache = _cache()
+    key = _version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # غير موجود: أي قيمة عشوائية جديدة تُبطل كل ETag سابق
+        cache.set(key, random.getrandbits(48), None)
+
+
+def bump_on_commit(user_ids):
+    """
+    زيادة الإصدار الآن وبعد نجاح المعاملة: طلب متزامن قد يخزّن بيانات ما قبل commit تحت الإصدار
+    الجديد، والزيادة الثانية تُبطلها.
+    """
+    user_ids = set(filter(None, user_ids))
+    for user_id in user_ids:
+        bump(user_id)
+    if user_ids:
+        db_transaction.on_commit(lambda: [bump(user_id) for user_id in user_ids])
+
+
+def etag(version, request, media_type=''):
+    digest = hashlib.sha256(f'{request.get_full_path()}|{media_type}'.encode()).hexdigest()[:16]
+    return f'"{version:x}-{digest}"'
+
+
+def matches(request, tag):
+    header = request.META.get('HTTP_IF_NONE_MATCH', '')
+    if not header:
+        return False
+    candidates = {value.strip().removeprefix('W/') for value in header.split(',')}
+    return tag in candidates or '*' in candidates
+
+
+def _payload_key(user_id, tag):
+    return f"{get_config()['KEY_PREFIX']}:p:{user_id}:{tag}"
+
+
+def get_payload(user_id, tag):
+    return _cache().get(_payload_key(user_id, tag))
+
+
+def set_payload(user_id, tag, data):
+    _cache().set(_payload_key(user_id, tag), data, get_config()['TIMEOUT'])
@@ -0,0 +1,257 @@
+"""
+تخطيط مسارات المناديب لجداول التسليم في يوم واحد.
+
+1. تحميل الجداول مع آخر موقع لكل معاملة (استعلامان، values_list بدون كائنات نموذج).
+2. تجميع التوقفات حسب نافذة الوقت ومنطقة شبكية (ZONE_DEGREES، أكبر من خلايا core/geo.py).
+3. ترتيب كل مجموعة بأقرب جار (شبكة مؤقتة في الذاكرة بدلاً من O(n²))، ثم تقسيمها إلى
+   مسارات من MAX_STOPS توقفاً متتالياً، ثم تحسين كل مسار بـ 2-opt.
+
+المسافات أثناء التخطيط مستوية (إسقاط equirectangular بالكيلومتر)؛ طول المسار المُعاد بـ haversine.
+"""
+import math
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.db.models import Subquery
+
+from . import geo
+from .models import DeliveryLocation, DeliverySchedule
+
+DEFAULTS = {
+    'WINDOW_MINUTES': 120,
+    'MAX_STOPS': 25,
+    # ~5.5 كم: منطقة مندوب واحد في النافذة
+    'ZONE_DEGREES': 0.05,
+    'TWO_OPT_PASSES': 20,
+}
+
+Stop = namedtuple('Stop', 'schedule_id transaction_id location_id latitude longitude address scheduled_time delivery_type')
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'DELIVERY_ROUTES', {})}
+
+
+def load_stops(date, status='pending', chunk_size=5000):
+    """
+    (التوقفات، أرقام الجداول بدون موقع). الموقع المستخدم هو أحدث موقع للمعاملة.
+    """
+    schedules = DeliverySchedule.objects.filter(scheduled_date=date, transaction__status=status)
+    locations = {}
+    rows = DeliveryLocation.objects.filter(
+        transaction_id__in=Subquery(schedules.values('transaction_id'))
+    ).order_by('transaction_id', 'created_at', 'id').values_list(
+        'transaction_id', 'id', 'latitude', 'longitude', 'address'
+    )
+    for transaction_id, *location in rows.iterator(chunk_size=chunk_size):
+        locations[transaction_id] = location
+
+    stops, unplanned = [], []
+    rows = schedules.order_by('scheduled_time', 'id').values_list(
+        'id', 'transaction_id', 'scheduled_time', 'delivery_type'
+    )
+    for schedule_id, transaction_id, scheduled_time, delivery_type in rows.iterator(chunk_size=chunk_size):
+        location = locations.get(transaction_id)
+        if location is None:
+            unplanned.append(schedule_id)
+            continue
+        location_id, latitude, longitude, address = location
+        stops.append(Stop(
+            schedule_id, transaction_id, location_id, float(latitude), float(longitude),
+            address, scheduled_time, delivery_type,
+        ))
+    return stops, unplanned
+
+
+def window_start(scheduled_time, window_minutes):
+    minutes = scheduled_time.hour * 60 + scheduled_time.minute
+    return minutes - minutes % window_minutes
+
+
+def zone_for(latitude, longitude, zone_degrees=None):
+    """رمز المنطقة "صف:عمود" (أيضاً منطقة سعة الفترات في core/slots.py)."""
+    zone_degrees = zone_degrees or get_config()['ZONE_DEGREES']
+    return f'{int(float(latitude) // zone_degrees)}:{int(float(longitude) // zone_degrees)}'
+
+
+def _projector(stops, depot=None):
+    latitudes = [stop.latitude for stop in stops] + ([depot[0]] if depot else [])
+    kx = geo.KM_PER_DEGREE_LAT * math.cos(math.radians(sum(latitudes) / len(latitudes)))
+    return lambda latitude, longitude: (longitude * kx, latitude * geo.KM_PER_DEGREE_LAT)
+
+
+class _Grid:
+    """شبكة مؤقتة لنقاط لم تُزر بعد: أقرب نقطة بالبحث في حلقات الخلايا حول الموضع."""
+
+    def __init__(self, points, indices):
+        xs = [points[index][0] for index in indices]
+        ys = [points[index][1] for index in indices]
+        self.min_x, self.min_y = min(xs), min(ys)
+        area = max(max(xs) - self.min_x, 1e-6) * max(max(ys) - self.min_y, 1e-6)
+        # ~نقطتان لكل خلية
+        self.size = max(math.sqrt(2 * area / len(indices)), 1e-6)
+        self.max_x, self.max_y = self._cell(max(xs), max(ys))
+        self.points = points
+        self.built = len(indices)
+        self.cells = defaultdict(list)
+        for index in indices:
+            self.cells[self._cell(*points[index])].append(index)
+
+    def _cell(self, x, y):
+        return int((x - self.min_x) // self.size), int((y - self.min_y) // self.size)
+
+    def _ring(self, cx, cy, r):
+        """خلايا الحلقة r حول (cx, cy) الواقعة داخل الشبكة فقط."""
+        if r == 0:
+            yield cx, cy
+            return
+        left, right = max(cx - r, 0), min(cx + r, self.max_x)
+        for y in (cy - r, cy + r):
+            if 0 <= y <= self.max_y:
+                for x in range(left, right + 1):
+                    yield x, y
+        bottom, top = max(cy - r + 1, 0), min(cy + r - 1, self.max_y)
+        for x in (cx - r, cx + r):
+            if 0 <= x <= self.max_x:
+                for y in range(bottom, top + 1):
+                    yield x, y
+
+    def pop_nearest(self, x, y):
+        cx, cy = self._cell(x, y)
+        # الموضع قد يكون خارج الشبكة (المستودع): نبدأ من أول حلقة تلمسها
+        first = max(-cx, cx - self.max_x, -cy, cy - self.max_y, 0)
+        last = max(cx, self.max_x - cx, cy, self.max_y - cy, first)
+        best, best_distance, best_cell = None, math.inf, None
+        for r in range(first, last + 1):
+            for cell in self._ring(cx, cy, r):
+                for index in self.cells.get(cell, ()):
+                    px, py = self.points[index]
+                    distance = math.hypot(px - x, py - y)
+                    if distance < best_distance:
+                        best, best_distance, best_cell = index, distance, cell
+            # أي نقطة في الحلقة التالية لا تقل مسافتها عن r * size
+            if best is not None and best_distance <= r * self.size:
+                break
+        bucket = self.cells[best_cell]
+        bucket.remove(best)
+        if not bucket:
+            del self.cells[best_cell]
+        return best
+
+
+def nearest_neighbour(points, start):
+    """ترتيب أقرب جار لكل النقاط بدءاً من الموضع start (x, y)."""
+    remaining = set(range(len(points)))
+    order = []
+    grid = None
+    position = start
+    while remaining:
+        # كلما قلّت النقاط المتبقية تُبنى شبكة أخشن حتى لا تُفحص حلقات فارغة
+        if grid is None or (len(remaining) * 4 < grid.built and len(remaining) > 32):
+            grid = _Grid(points, remaining)
+        index = grid.pop_nearest(*position)
+        remaining.discard(index)
+        order.append(index)
+        position = points[index]
+    return order
+
+
+def two_opt(path, passes):
+    """
+    تحسين مسار مفتوح بـ 2-opt؛ path[0] ثابت (المستودع أو أول توقف). يُعاد ترتيب جديد لنفس النقاط.
+    """
+    path = list(path)
+    count = len(path)
+    if count < 4:
+        return path
+
+    def distance(a, b):
+        return math.hypot(a[0] - b[0], a[1] - b[1])
+
+    for _ in range(passes):
+        improved = False
+        for i in range(1, count - 1):
+            for j in range(i + 1, count):
+                before = distance(path[i - 1], path[i])
+                after = distance(path[i - 1], path[j])
+                if j + 1 < count:
+                    before += distance(path[j], path[j + 1])
+                    after += distance(path[i], path[j + 1])
+                if after < before - 1e-9:
+                    path[i:j + 1] = reversed(path[i:j + 1])
+                    improved = True
+        if not improved:
+            break
+    return path
+
+
+def route_length_km(stops, depot=None):
+    points = ([depot] if depot else []) + [(stop.latitude, stop.longitude) for stop in stops]
+    return sum(geo.haversine_km(*a, *b) for a, b in zip(points, points[1:]))
+
+
+def plan(stops, window_minutes=None, max_stops=None, depot=None, zone_degrees=None, passes=None):
+    """
+    stops: قائمة Stop. depot: (lat, lon) اختياري لنقطة انطلاق المناديب.
+    يُعيد قائمة مسارات {'window_start', 'zone', 'stops', 'distance_km'} مرتبة بالنافذة ثم المنطقة.
+    """
+    config = get_config()
+    window_minutes = window_minutes or config['WINDOW_MINUTES']
+    max_stops = max_stops or config['MAX_STOPS']
+    zone_degrees = zone_degrees or config['ZONE_DEGREES']
+    passes = config['TWO_OPT_PASSES'] if passes is None else passes
+    if not stops:
+        return []
+
+    project = _projector(stops, depot)
+    clusters = defaultdict(list)
+    for stop in stops:
+        zone = zone_for(stop.latitude, stop.longitude, zone_degrees)
+        clusters[(window_start(stop.scheduled_time, window_minutes), zone)].append(stop)
+
+    routes = []
+    for (start_minute, zone), members in sorted(clusters.items()):
+        points = [project(stop.latitude, stop.longitude) for stop in members]
+        # بدون مستودع: البداية من أبكر توقف في المجموعة (members مرتبة بالوقت)
+        origin = project(*depot) if depot else points[0]
+        order = nearest_neighbour(points, origin)
+        for offset in range(0, len(order), max_stops):
+            chunk = order[offset:offset + max_stops]
+            if depot:
+                path = two_opt([origin] + [points[index] for index in chunk], passes)[1:]
+            else:
+                path = two_opt([points[index] for index in chunk], passes)
+            by_point = defaultdict(list)
+            for index in chunk:
+                by_point[points[index]].append(members[index])
+            route = [by_point[point].pop() for point in path]
+            routes.append({
+                'window_start': f'{start_minute // 60:02d}:{start_minute % 60:02d}',
+                'zone': zone,
+                'stops': route,
+                'distance_km': route_length_km(route, depot),
+            })
+    return routes
+
+
+def serialize(routes):
+    return [
+        {
+            **route,
+            'distance_km': round(route['distance_km'], 3),
+            'stops': [
+                {
+                    'schedule_id': stop.schedule_id,
+                    'transaction_id': stop.transaction_id,
+                    'location_id': stop.location_id,
+                    'latitude': stop.latitude,
+                    'longitude': stop.longitude,
+                    'address': stop.address,
+                    'scheduled_time': stop.scheduled_time.strftime('%H:%M'),
+                    'delivery_type': stop.delivery_type,
+                }
+                for stop in route['stops']
+            ],
+        }
+        for route in routes
+    ]
@@ -1,11 +1,20 @@
 # serializers.py
 
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth import get_user_model
-from .models import User, CardDetail, Transaction, DeliveryLocation, DeliverySchedule, Employee
+from decimal import Decimal
+
+from django.db import transaction as db_transaction
+from .models import User, CardDetail, Transaction, TransferTransaction, DeliveryLocation, DeliverySchedule, Employee
+from .tokens import ATMRefreshToken
+from . import geo, ledger, rates, slots, tasks, transfers
 
 User = get_user_model()
 
+# أنواع تجعل طرفاً آخر هو الدافع، فلا يُنشئها المستخدم بنفسه
+USER_FORBIDDEN_TYPES = ('receive_money',)
+
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -26,6 +35,13 @@ class UserSerializer(serializers.ModelSerializer):
         return user
 
 
+class ATMTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    /api/token/ يُصدر نفس رموز LoginView (مع claims الحالة والدور).
+    """
+    token_class = ATMRefreshToken
+
+
 class CardDetailSerializer(serializers.ModelSerializer):
     last_four = serializers.CharField(read_only=True)
     expiry = serializers.CharField(read_only=True)
@@ -48,6 +64,21 @@ class DeliveryScheduleSerializer(serializers.ModelSerializer):
         fields = ['delivery_type', 'scheduled_date', 'scheduled_time']
 
 
+class DeliveryScheduleCreateSerializer(DeliveryScheduleSerializer):
+    """DeliveryScheduleViewSet: جدول لمعاملة موجودة (داخل TransactionSerializer تُحدد المعاملة تلقائياً)."""
+    transaction_id = serializers.PrimaryKeyRelatedField(
+        queryset=Transaction.objects.all(), source='transaction', write_only=True
+    )
+
+    class Meta(DeliveryScheduleSerializer.Meta):
+        fields = ['transaction_id'] + DeliveryScheduleSerializer.Meta.fields
+
+    def validate_transaction_id(self, transaction):
+        if transaction.user_id != self.context['request'].user.id:
+            raise serializers.ValidationError("المعاملة لا تخصك.")
+        return transaction
+
+
 class TransactionSerializer(serializers.ModelSerializer):
     delivery_locations = DeliveryLocationSerializer(many=True, required=False)
     delivery_schedules = DeliveryScheduleSerializer(many=True, required=False)
@@ -64,12 +95,21 @@ class TransactionSerializer(serializers.ModelSerializer):
             'amount',
             'currency_from',
             'currency_to',
+            'exchange_rate',
             'card_id',
             'recipient_id',
             'message_to_recipient',
             'delivery_locations',
             'delivery_schedules'
         ]
+        # يُختم من core/rates.py عند الإنشاء
+        read_only_fields = ['exchange_rate']
+
+    def validate_transaction_type(self, value):
+        # receive_money يخصم من المستلم: لا يُنشئه إلا تحويل من المرسل نفسه
+        if value in USER_FORBIDDEN_TYPES:
+            raise serializers.ValidationError("لا يمكن إنشاء معاملة استلام؛ يرسلها المرسل كـ send_money.")
+        return value
 
     def create(self, validated_data):
         # استخراج الحقول الإضافية
@@ -77,10 +117,10 @@ class TransactionSerializer(serializers.ModelSerializer):
         schedules_data = validated_data.pop('delivery_schedules', [])
         card_id = validated_data.pop('card_id')
         recipient_id = validated_data.pop('recipient_id', None)
-        user = self.context['request'].user
+        user = validated_data.pop('user', None) or self.context['request'].user
 
-        # التحقق من أن البطاقة تخص المستخدم
-        if card_id.user != user:
+        # التحقق من أن البطاقة تخص المستخدم (مقارنة المعرّف دون استعلام إضافي)
+        if card_id.user_id != user.id:
             raise serializers.ValidationError("البطاقة لا تخصك.")
 
         # التحقق من أن المستلم موجود (إذا كان نوع المعاملة تحويل)
@@ -88,25 +128,146 @@ class TransactionSerializer(serializers.ModelSerializer):
         if validated_data['transaction_type'] in ['send_money', 'receive_money']:
             if not recipient_id:
                 raise serializers.ValidationError("حقل 'recipient_id' مطلوب للتحويلات.")
-            try:
-                recipient = User.objects.get(id=recipient_id)
-            except User.DoesNotExist:
+            recipient = User.objects.only('id').filter(id=recipient_id).first()
+            if recipient is None:
                 raise serializers.ValidationError("المستخدم المستلم غير موجود.")
 
-        # إنشاء المعاملة
-        transaction = Transaction.objects.create(
-            user=user,
-            card=card_id,
-            recipient=recipient,
+        # الإنشاء كوحدة واحدة: المعاملة + صفوف التسليم بإدراج مجمّع
+        # سعر الصرف من كاش المصفوفة (بدون قراءة من قاعدة البيانات)
+        transaction = Transaction(user=user, card=card_id, recipient=recipient, **validated_data)
+        has_rate = rates.stamp(transaction)
+
+        with db_transaction.atomic():
+            # تحديث الرصيد في نفس المعاملة (قفل صفوف Balance المعنية)
+            try:
+                if transfers.is_transfer(transaction):
+                    # التحويلات: قفل المرسل والمستلم والتحقق من الرصيد قبل الإدراج
+                    transfers.execute(transaction)
+                else:
+                    transaction.save(force_insert=True)
+                    ledger.apply([transaction])
+            except ledger.InsufficientFunds:
+                raise serializers.ValidationError("الرصيد غير كافٍ.")
+            except ledger.ForeignDebit:
+                raise serializers.ValidationError("لا يمكن الخصم من رصيد مستخدم آخر.")
+            if not has_rate:
+                tasks.enqueue(rates.fill_transaction_rates, [transaction.pk], priority=tasks.PRIORITY_LOW)
+
+            # إنشاء مواقع التسليم
+            if locations_data:
+                DeliveryLocation.objects.bulk_create(geo.assign_cells([
+                    DeliveryLocation(transaction=transaction, **loc_data)
+                    for loc_data in locations_data
+                ]))
+
+            # إنشاء جداول التسليم بعد حجز فتراتها (core/slots.py)
+            if schedules_data:
+                schedules = [
+                    DeliverySchedule(transaction=transaction, **sched_data)
+                    for sched_data in schedules_data
+                ]
+                try:
+                    slots.book(schedules, slots.region_of_locations(locations_data))
+                except slots.SlotFull:
+                    raise serializers.ValidationError("لا توجد سعة متاحة في فترة التسليم المختارة.")
+                DeliverySchedule.objects.bulk_create(schedules)
+
+        return transaction
+
+
+class TransferTransactionSerializer(serializers.ModelSerializer):
+    card_id = serializers.PrimaryKeyRelatedField(
+        queryset=CardDetail.objects.all(),
+        write_only=True
+    )
+    recipient_id = serializers.IntegerField()
+    currency_sent = serializers.CharField(max_length=3, default='AED')
+    currency_received = serializers.CharField(max_length=3, required=False)
+
+    class Meta:
+        model = TransferTransaction
+        fields = [
+            'id',
+            'transaction_type',
+            'amount_sent',
+            'currency_sent',
+            'amount_received',
+            'currency_received',
+            'card_id',
+            'recipient_id',
+            'message_to_recipient',
+            'status',
+            'created_at',
+        ]
+        # amount_received يُحسب من سعر الصرف الحالي (core/rates.py)
+        read_only_fields = ['amount_received', 'status', 'created_at']
+
+    def validate_transaction_type(self, value):
+        # الدافع هو المستخدم دائماً: receive_money يجعل المستلم هو الدافع
+        if value in USER_FORBIDDEN_TYPES:
+            raise serializers.ValidationError("لا يمكن إنشاء تحويل استلام؛ يرسله المرسل كـ send_money.")
+        return value
+
+    def create(self, validated_data):
+        card = validated_data.pop('card_id')
+        recipient_id = validated_data.pop('recipient_id')
+        user = validated_data.pop('user', None) or self.context['request'].user
+
+        if card.user_id != user.id:
+            raise serializers.ValidationError("البطاقة لا تخصك.")
+        if recipient_id == user.id:
+            raise serializers.ValidationError("لا يمكن التحويل إلى نفسك.")
+        recipient = User.objects.only('id').filter(id=recipient_id).first()
+        if recipient is None:
+            raise serializers.ValidationError("المستخدم المستلم غير موجود.")
+
+        currency_sent = validated_data['currency_sent']
+        currency_received = validated_data.setdefault('currency_received', currency_sent)
+        rate = Decimal(1) if currency_sent == currency_received else rates.get_rate(currency_sent, currency_received)
+        if rate is None:
+            raise serializers.ValidationError("لا يتوفر سعر صرف لهذه العملة حالياً.")
+
+        transfer = TransferTransaction(
+            user=user, card=card, recipient=recipient,
+            amount_received=(validated_data['amount_sent'] * rate).quantize(Decimal('0.01')),
             **validated_data
         )
+        # قفل الطرفين والتحقق من الرصيد ثم الإدراج في نفس المعاملة
+        try:
+            transfers.execute(transfer)
+        except ledger.InsufficientFunds:
+            raise serializers.ValidationError("الرصيد غير كافٍ.")
+        except ledger.ForeignDebit:
+            raise serializers.ValidationError("لا يمكن الخصم من رصيد مستخدم آخر.")
+        return transfer
 
-        # إنشاء مواقع التسليم
-        for loc_data in locations_data:
-            DeliveryLocation.objects.create(transaction=transaction, **loc_data)
 
-        # إنشاء جداول التسليم
-        for sched_data in schedules_data:
-            DeliverySchedule.objects.create(transaction=transaction, **sched_data)
+class TransferInboxSerializer(TransferTransactionSerializer):
+    """
+    عنصر في صندوق التحويلات: direction = sent أو received.
+    """
+    direction = serializers.CharField(read_only=True)
+    user_id = serializers.IntegerField(read_only=True)
 
-        return transaction
+    class Meta(TransferTransactionSerializer.Meta):
+        fields = TransferTransactionSerializer.Meta.fields + ['direction', 'user_id']
+
+
+class EmployeeSerializer(serializers.ModelSerializer):
+    user_id = serializers.IntegerField(source='user.id', read_only=True)
+    first_name = serializers.CharField(source='user.first_name', read_only=True)
+    last_name = serializers.CharField(source='user.last_name', read_only=True)
+    email = serializers.EmailField(source='user.email', read_only=True)
+
+    class Meta:
+        model = Employee
+        fields = ['id', 'user_id', 'first_name', 'last_name', 'email', 'role', 'created_at', 'updated_at']
+        read_only_fields = ['created_at', 'updated_at']
+
+
+class TransactionBatchItemSerializer(TransactionSerializer):
+    """
+    عنصر واحد في دفعة المعاملات.
+    card_id رقم فقط هنا؛ التحقق من البطاقات يتم دفعة واحدة في TransactionBatch.
+    """
+    card_id = serializers.IntegerField(write_only=True)
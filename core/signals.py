@@ -0,0 +1,158 @@
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+
+from .models import User, Employee, ATMDevice, ExchangeRate, CardDetail, Transaction, DeliveryLocation, DeliverySchedule
+from . import ledger, permission_cache, rates, response_cache, slots, status_events, user_search
+from .tokens import revoke_tokens
+from .authentication import token_cache
+
+
+# --- إبطال كاش الصلاحيات ---
+@receiver(pre_save, sender=User)
+def detect_status_change(sender, instance, update_fields=None, **kwargs):
+    instance._status_changed = False
+    if instance.pk is None or (update_fields is not None and 'status' not in update_fields):
+        return
+    # الحالة المقروءة مع الكائن (User.from_db)، والاستعلام فقط لكائن بُني يدوياً
+    if hasattr(instance, '_loaded_status'):
+        previous = instance._loaded_status
+    else:
+        previous = sender.objects.filter(pk=instance.pk).values_list('status', flat=True).first()
+    instance._status_changed = previous is not None and previous != instance.status
+
+
+@receiver(post_save, sender=User)
+def invalidate_user_permissions(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is None or 'status' in update_fields:
+        instance._loaded_status = instance.status
+    if not created and getattr(instance, '_status_changed', False):
+        revoke_tokens(instance.pk)
+    else:
+        permission_cache.invalidate(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_deleted_user(sender, instance, **kwargs):
+    permission_cache.invalidate(instance.pk)
+
+
+# --- فهرس بحث المستخدمين (FTS5 على SQLite) ---
+@receiver(post_save, sender=User)
+def index_user_search(sender, instance, update_fields=None, using='default', **kwargs):
+    if update_fields is None or user_search.DERIVED_FIELDS & set(update_fields):
+        user_search.index_users([(instance.pk, instance.search_text)], using=using)
+
+
+@receiver(post_delete, sender=User)
+def unindex_user_search(sender, instance, using='default', **kwargs):
+    user_search.unindex_users([instance.pk], using=using)
+
+
+@receiver(post_save, sender=Employee)
+def invalidate_employee_permissions(sender, instance, **kwargs):
+    # تغيّر الدور يُبطل الرموز الحالية لأنها تحمل الدور القديم
+    revoke_tokens(instance.user_id)
+
+
+@receiver(post_delete, sender=Employee)
+def invalidate_deleted_employee(sender, instance, origin=None, **kwargs):
+    # عند حذف المستخدم نفسه (cascade) لا داعي لإنشاء إصدار جديد
+    if isinstance(origin, User):
+        permission_cache.invalidate(instance.user_id)
+    else:
+        revoke_tokens(instance.user_id)
+
+
+# --- إبطال كاش رموز أجهزة الصراف ---
+@receiver(post_save, sender=ATMDevice)
+@receiver(post_delete, sender=ATMDevice)
+def invalidate_device_token(sender, instance, **kwargs):
+    token_cache.delete(instance.key_hash)
+
+
+# --- إبطال كاش أسعار الصرف (تعديلات الإدارة؛ record_rates يُبطله بنفسه) ---
+@receiver(post_save, sender=ExchangeRate)
+@receiver(post_delete, sender=ExchangeRate)
+def invalidate_exchange_rates(sender, instance, **kwargs):
+    rates.invalidate()
+
+
+# --- سعة فترات التسليم (core/slots.py) ---
+@receiver(post_delete, sender=DeliverySchedule)
+def release_delivery_slot(sender, instance, **kwargs):
+    if instance.slot_id:
+        slots.release([instance.slot_id])
+
+
+@receiver(post_save, sender=Transaction)
+def release_cancelled_delivery_slots(sender, instance, created, update_fields=None, **kwargs):
+    if created or instance.status not in slots.RELEASED_STATUSES:
+        return
+    if update_fields is None or 'status' in update_fields:
+        slots.release_transaction(instance.pk)
+
+
+# --- الرصيد عند تغيّر حالة المعاملة (core/ledger.py) ---
+# قبل publish_transaction_status لأنه يحدّث _loaded_status
+@receiver(post_save, sender=Transaction)
+def apply_status_postings(sender, instance, created, update_fields=None, **kwargs):
+    if created or (update_fields is not None and 'status' not in update_fields):
+        return
+    previous = getattr(instance, '_loaded_status', None)
+    # previous = None: الحالة لم تُقرأ (only/defer) أو الكائن بُني يدوياً
+    if previous is None or (previous in ledger.COUNTED_STATUSES) == (instance.status in ledger.COUNTED_STATUSES):
+        return
+    # المعاملة دخلت أو خرجت من الحالات المحتسبة: تطبيق الفرق تحت قفل صفوف الرصيد (بلا رفض لنقص الرصيد)
+    with db_transaction.atomic():
+        ledger.apply_postings(ledger.status_postings(instance, previous), enforce_funds=False)
+
+
+# --- دفع تغيّر حالة المعاملة (core/status_events.py) ---
+@receiver(post_save, sender=Transaction)
+def publish_transaction_status(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and 'status' not in update_fields:
+        return
+    previous = getattr(instance, '_loaded_status', None)
+    instance._loaded_status = instance.status
+    if created:
+        return
+    # previous = None: الحالة لم تُقرأ (only/defer)، فلا نعرف إن تغيّرت
+    if previous != instance.status:
+        status_events.publish_on_commit(instance, previous)
+
+
+# --- إصدار كاش قوائم المستخدم (core/response_cache.py) ---
+@receiver(post_save, sender=CardDetail)
+@receiver(post_delete, sender=CardDetail)
+@receiver(post_save, sender=Transaction)
+@receiver(post_delete, sender=Transaction)
+def bump_user_responses(sender, instance, **kwargs):
+    response_cache.bump_on_commit([instance.user_id])
+
+
+@receiver(post_save, sender=DeliveryLocation)
+@receiver(post_delete, sender=DeliveryLocation)
+@receiver(post_save, sender=DeliverySchedule)
+@receiver(post_delete, sender=DeliverySchedule)
+def bump_delivery_responses(sender, instance, origin=None, **kwargs):
+    # الحذف المتتالي من المعاملة أو المستخدم: إشارة الأصل تكفي
+    if isinstance(origin, (Transaction, User)):
+        return
+    if sender.transaction.is_cached(instance):
+        user_id = instance.transaction.user_id
+    else:
+        user_id = Transaction.objects.filter(pk=instance.transaction_id).values_list('user_id', flat=True).first()
+    response_cache.bump_on_commit([user_id])
+
+
+# --- إعداد اتصالات SQLite (WAL) ---
+@receiver(connection_created)
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma, value in getattr(settings, 'SQLITE_PRAGMAS', {}).items():
+            cursor.execute(f'PRAGMA {pragma} = {value}')
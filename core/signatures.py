@@ -0,0 +1,115 @@
+import base64
+import binascii
+import hashlib
+import zlib
+
+from django.utils import timezone
+
+from .models import DigitalSignature, SignatureBlob
+
+SVG_MEDIA_TYPE = 'image/svg+xml'
+# base64 خام بدون بادئة data: (نوع المحتوى غير معروف)
+RAW_BASE64_MEDIA_TYPE = 'application/base64'
+
+MAX_MEDIA_TYPE_LENGTH = DigitalSignature._meta.get_field('media_type').max_length
+
+# الصور المضغوطة أصلاً (PNG/JPEG) لا تستفيد من zlib؛ نخزنها كما هي إن لم يصغر الحجم
+MIN_COMPRESSION_GAIN = 0.9
+
+
+class InvalidSignature(ValueError):
+    pass
+
+
+def encode_payload(signature_data):
+    """
+    تحويل ما يرسله العميل إلى (bytes, media_type).
+    data URL و base64 يُفك ترميزهما (أصغر بـ 25%)، و SVG يُخزن كنص UTF-8.
+    InvalidSignature عند data URL بترميز base64 تالف أو نوع محتوى أطول من الحقل.
+    """
+    if signature_data.startswith('data:') and ';base64,' in signature_data:
+        header, encoded = signature_data.split(',', 1)
+        media_type = header[len('data:'):-len(';base64')] or 'application/octet-stream'
+        if len(media_type) > MAX_MEDIA_TYPE_LENGTH:
+            raise InvalidSignature("نوع محتوى التوقيع طويل جداً")
+        try:
+            return base64.b64decode(encoded, validate=True), media_type
+        except (binascii.Error, ValueError):
+            raise InvalidSignature("ترميز base64 للتوقيع غير صالح")
+
+    stripped = signature_data.lstrip()
+    if not stripped.startswith('<'):
+        try:
+            return base64.b64decode(signature_data, validate=True), RAW_BASE64_MEDIA_TYPE
+        except (binascii.Error, ValueError):
+            pass
+    return signature_data.encode('utf-8'), SVG_MEDIA_TYPE
+
+
+def decode_payload(blob, media_type):
+    raw = bytes(blob.data)
+    if blob.encoding == 'zlib':
+        raw = zlib.decompress(raw)
+    if media_type == SVG_MEDIA_TYPE:
+        return raw.decode('utf-8')
+    encoded = base64.b64encode(raw).decode('ascii')
+    if media_type == RAW_BASE64_MEDIA_TYPE:
+        return encoded
+    return f'data:{media_type};base64,{encoded}'
+
+
+def build_blob(raw):
+    compressed = zlib.compress(raw, 9)
+    if len(compressed) < len(raw) * MIN_COMPRESSION_GAIN:
+        data, encoding = compressed, 'zlib'
+    else:
+        data, encoding = raw, 'identity'
+    return SignatureBlob(
+        digest=hashlib.sha256(raw).hexdigest(),
+        data=data,
+        encoding=encoding,
+        size=len(raw),
+    )
+
+
+def store_blobs(blobs):
+    # INSERT ... ON CONFLICT DO NOTHING: المحتوى الموجود لا يُقرأ ولا يُعاد كتابته
+    SignatureBlob.objects.bulk_create(blobs, ignore_conflicts=True)
+
+
+def save_signature(user, signature_data, purpose, transaction_id=None):
+    """
+    حفظ توقيع المستخدم: إدراج المحتوى (مع إزالة التكرار) ثم تحديث صف صغير واحد.
+    """
+    raw, media_type = encode_payload(signature_data)
+    blob = build_blob(raw)
+    store_blobs([blob])
+
+    fields = {
+        'blob_id': blob.digest,
+        'media_type': media_type,
+        'purpose': purpose,
+        'transaction_id': transaction_id,
+        'signed_at': timezone.now(),
+    }
+    if not DigitalSignature.objects.filter(user=user).update(**fields):
+        DigitalSignature.objects.create(user=user, **fields)
+    return blob.digest
+
+
+async def asave_signature(user, signature_data, purpose, transaction_id=None):
+    """نفس save_signature عبر ORM غير المتزامن (المحتوى idempotent فلا حاجة لمعاملة)."""
+    raw, media_type = encode_payload(signature_data)
+    blob = build_blob(raw)
+    await SignatureBlob.objects.abulk_create([blob], ignore_conflicts=True)
+
+    fields = {
+        'blob_id': blob.digest,
+        'media_type': media_type,
+        'purpose': purpose,
+        'transaction_id': transaction_id,
+        'signed_at': timezone.now(),
+    }
+    if not await DigitalSignature.objects.filter(user=user).aupdate(**fields):
+        await DigitalSignature.objects.acreate(user=user, **fields)
+    return blob.digest
@@ -0,0 +1,191 @@
+"""
+سعة فترات التسليم: جدول DeliverySlot بعدّاد لكل (تاريخ، فترة، منطقة).
+
+الحجز UPDATE مشروط واحد لكل فترة:
+    UPDATE ... SET booked = booked + n WHERE id = ? AND booked <= capacity - n
+إذا لم يُحدَّث أي صف فالفترة ممتلئة. التحقق والزيادة في نفس العبارة، فلا يتجاوز حجزان متزامنان
+السعة (PostgreSQL يعيد تقييم الشرط بعد قفل الصف، وSQLite يُسلسل الكتابات)، ولا حاجة لـ count(*).
+"""
+from collections import Counter
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.db import transaction as db_transaction
+from django.db.models import F, Q
+
+from . import route_planner
+from .models import DeliveryLocation, DeliverySchedule, DeliverySlot
+
+DEFAULTS = {
+    'SLOT_MINUTES': 60,
+    'DEFAULT_CAPACITY': 20,
+    # الفترات المعروضة في availability: من OPENING_HOUR حتى CLOSING_HOUR
+    'OPENING_HOUR': 8,
+    'CLOSING_HOUR': 22,
+}
+
+# حالات المعاملة التي تُحرر فترات جداولها
+RELEASED_STATUSES = ('cancelled', 'failed')
+
+
+class SlotFull(Exception):
+    def __init__(self, date, slot, region):
+        super().__init__(f"slot {date} {slot} {region or '-'} is full")
+        self.date = date
+        self.slot = slot
+        self.region = region
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'DELIVERY_SLOTS', {})}
+
+
+def slot_for(scheduled_time):
+    minutes = scheduled_time.hour * 60 + scheduled_time.minute
+    minutes -= minutes % get_config()['SLOT_MINUTES']
+    return time(minutes // 60, minutes % 60)
+
+
+def region_for(latitude, longitude):
+    if latitude is None or longitude is None:
+        return ''
+    return route_planner.zone_for(latitude, longitude)
+
+
+def region_of_locations(locations):
+    """منطقة أحدث موقع (آخر عنصر)، كما في route_planner.load_stops."""
+    if not locations:
+        return ''
+    location = locations[-1]
+    if isinstance(location, dict):
+        return region_for(location.get('latitude'), location.get('longitude'))
+    return region_for(location.latitude, location.longitude)
+
+
+def region_of_transaction(transaction_id):
+    location = (
+        DeliveryLocation.objects.filter(transaction_id=transaction_id)
+        .order_by('-created_at', '-id').values_list('latitude', 'longitude').first()
+    )
+    return region_for(*location) if location else ''
+
+
+def _slot_ids(keys):
+    """{(date, slot, region): id}، مع إنشاء الصفوف الناقصة بالسعة الافتراضية."""
+    capacity = get_config()['DEFAULT_CAPACITY']
+    DeliverySlot.objects.bulk_create(
+        [DeliverySlot(date=date, slot=slot, region=region, capacity=capacity) for date, slot, region in keys],
+        ignore_conflicts=True,
+    )
+    lookup = Q()
+    for date, slot, region in keys:
+        lookup |= Q(date=date, slot=slot, region=region)
+    return {
+        (date, slot, region): pk
+        for pk, date, slot, region in DeliverySlot.objects.filter(lookup).values_list('id', 'date', 'slot', 'region')
+    }
+
+
+def _reserve(slot_id, count):
+    """زيادة مشروطة: False إذا لم تعد في الفترة سعة لـ count حجوزات."""
+    return bool(
+        DeliverySlot.objects.filter(pk=slot_id, booked__lte=F('capacity') - count).update(booked=F('booked') + count)
+    )
+
+
+def admit(groups):
+    """
+    groups: [(schedules, region)] - جداول غير محفوظة لكل عنصر (مثل عناصر الدفعة).
+    يُعيد لكل مجموعة None إذا قُبلت (ويضبط schedule.slot_id) أو مفتاح الفترة الممتلئة.
+    المجموعة تُقبل كاملة أو تُرفض كاملة.
+
+    أولاً زيادة واحدة لكل فترة بمجموع حجوزات الدفعة (عدد الاستعلامات لا يكبر مع حجم الدفعة)؛
+    الفترات التي لا تتسع للمجموع فقط تُحجز مجموعةً مجموعة حتى تمتلئ.
+    """
+    keyed = [
+        [(schedule.scheduled_date, slot_for(schedule.scheduled_time), region) for schedule in schedules]
+        for schedules, region in groups
+    ]
+    totals = Counter(key for keys in keyed for key in keys)
+    results = [None] * len(groups)
+    if not totals:
+        return results
+
+    with db_transaction.atomic():
+        ids = _slot_ids(list(totals))
+        # ترتيب ثابت للأقفال بين الطلبات المتزامنة
+        granted = {key for key in sorted(totals, key=lambda key: ids[key]) if _reserve(ids[key], totals[key])}
+
+        refunds = Counter()
+        for position, keys in enumerate(keyed):
+            contended = Counter(key for key in keys if key not in granted)
+            full = None
+            if contended:
+                try:
+                    with db_transaction.atomic():
+                        for key in sorted(contended, key=lambda key: ids[key]):
+                            if not _reserve(ids[key], contended[key]):
+                                full = key
+                                raise SlotFull(*key)
+                except SlotFull:
+                    pass
+            if full is None:
+                for schedule, key in zip(groups[position][0], keys):
+                    schedule.slot_id = ids[key]
+            else:
+                results[position] = full
+                refunds.update(ids[key] for key in keys if key in granted)
+        release(refunds.elements())
+    return results
+
+
+def book(schedules, region=''):
+    """حجز فترات جداول عنصر واحد (غير محفوظة بعد)؛ SlotFull عند امتلاء أي فترة، بدون حجز جزئي."""
+    full = admit([(schedules, region)])[0]
+    if full is not None:
+        raise SlotFull(*full)
+    return schedules
+
+
+def release(slot_ids):
+    """تحرير حجز لكل عنصر في slot_ids (تكرار الرقم = عدة حجوزات)."""
+    for slot_id, count in Counter(filter(None, slot_ids)).items():
+        DeliverySlot.objects.filter(pk=slot_id, booked__gte=count).update(booked=F('booked') - count)
+
+
+def release_transaction(transaction_id):
+    """عند إلغاء المعاملة أو فشلها: تحرير فترات جداولها وفصلها عنها."""
+    with db_transaction.atomic():
+        schedules = DeliverySchedule.objects.select_for_update().filter(
+            transaction_id=transaction_id, slot__isnull=False
+        )
+        slot_ids = list(schedules.values_list('slot_id', flat=True))
+        if slot_ids:
+            schedules.update(slot=None)
+            release(slot_ids)
+
+
+def availability(date, region=''):
+    """
+    فترات اليوم في المنطقة: [{'slot', 'capacity', 'booked', 'available'}]، باستعلام واحد على الفهرس الفريد.
+    الفترات غير المحجوزة بعد تُعرض بالسعة الافتراضية.
+    """
+    config = get_config()
+    rows = {
+        row.slot: row
+        for row in DeliverySlot.objects.filter(date=date, region=region).only('slot', 'capacity', 'booked')
+    }
+    start = datetime.combine(date, time(config['OPENING_HOUR']))
+    end = datetime.combine(date, time()) + timedelta(hours=config['CLOSING_HOUR'])
+    slots = set(rows)
+    while start < end:
+        slots.add(start.time())
+        start += timedelta(minutes=config['SLOT_MINUTES'])
+
+    result = []
+    for slot in sorted(slots):
+        row = rows.get(slot)
+        capacity = row.capacity if row else config['DEFAULT_CAPACITY']
+        booked = row.booked if row else 0
+        result.append({'slot': slot, 'capacity': capacity, 'booked': booked, 'available': max(capacity - booked, 0)})
+    return result
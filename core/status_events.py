@@ -0,0 +1,241 @@
+"""
+دفع تغيّر حالة المعاملات (pending → completed/failed ...) إلى العملاء بدلاً من استطلاع قائمة المعاملات.
+
+إشارة post_save على Transaction تنشر الحدث بعد commit إلى وسيط (broker) داخل العملية:
+لكل مستخدم مجموعة اشتراكات، ولكل اشتراك asyncio.Queue في event loop الخاص به.
+النشر يأتي من thread متزامن، فيُسلَّم عبر loop.call_soon_threadsafe.
+
+GET /api/transactions/events/ (تحت ASGI) تدفق Server-Sent Events:
+- عند الاتصال: snapshot بالمعاملات المعلّقة، أو بما تغيّر بعد Last-Event-ID عند إعادة الاتصال.
+- بعدها حدث status لكل تغيّر، وتعليق keepalive كل KEEPALIVE ثانية.
+معرّف الحدث هو updated_at للمعاملة (ومعرّف snapshot وقت الاتصال)، فإعادة الاتصال
+(تلقائية في EventSource) لا تفقد أي تغيير.
+
+LocalBroker يكفي لعملية واحدة؛ مع عدة عمليات استخدم RedisBroker (Redis pub/sub) أو وسيطاً آخر
+بنفس الواجهة عبر STATUS_EVENTS['BROKER'].
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction as db_transaction
+from django.utils.dateparse import parse_datetime
+from django.utils.module_loading import import_string
+
+from .models import Transaction
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'BROKER': 'core.status_events.LocalBroker',
+    # لـ RedisBroker فقط
+    'REDIS_URL': None,
+    'CHANNEL': 'tx-status',
+    # أحداث بانتظار عميل بطيء؛ عند الامتلاء يُغلق التدفق ويعيد العميل الاتصال (snapshot)
+    'QUEUE_SIZE': 100,
+    'KEEPALIVE': 15,
+    # Django 4.2 لا يكتشف انقطاع العميل أثناء التدفق: إغلاق دوري وإعادة اتصال تلقائية
+    'MAX_AGE': 300,
+    'RETRY_MS': 3000,
+    'SNAPSHOT_LIMIT': 100,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'STATUS_EVENTS', {})}
+
+
+class Subscription:
+    def __init__(self, user_id, maxsize):
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.overflowed = False
+
+    def put(self, event):
+        # داخل event loop الاشتراك
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+
+class LocalBroker:
+    """وسيط داخل العملية: يصل الحدث فقط إلى المشتركين في نفس العملية."""
+
+    def __init__(self, config):
+        self.config = config
+        self._lock = threading.Lock()
+        self._subscribers = defaultdict(set)
+
+    def subscribe(self, user_id):
+        """من داخل event loop؛ الاشتراك قبل قراءة snapshot حتى لا يضيع تغيير بينهما."""
+        subscription = Subscription(user_id, self.config['QUEUE_SIZE'])
+        with self._lock:
+            self._subscribers[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.user_id)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[subscription.user_id]
+
+    def subscriber_count(self):
+        with self._lock:
+            return sum(len(subscribers) for subscribers in self._subscribers.values())
+
+    def publish(self, user_id, event):
+        self.deliver(user_id, event)
+
+    def deliver(self, user_id, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(user_id, ()))
+        for subscription in subscribers:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.put, event)
+            except RuntimeError:
+                # event loop أُغلق دون إلغاء الاشتراك
+                self.unsubscribe(subscription)
+
+
+class RedisBroker(LocalBroker):
+    """
+    النشر عبر Redis pub/sub، وفي كل عملية thread واحد يستمع للقناة ويسلّم محلياً.
+    بدون مكتبة redis أو REDIS_URL يعمل كـ LocalBroker.
+    """
+
+    def __init__(self, config):
+        super().__init__(config)
+        self._client = None
+        self._listener = None
+        if not config['REDIS_URL']:
+            logger.warning("STATUS_EVENTS uses RedisBroker but REDIS_URL is not set; events stay in-process")
+            return
+        try:
+            import redis
+        except ImportError:
+            logger.warning("STATUS_EVENTS uses RedisBroker but the redis package is not installed")
+            return
+        self._client = redis.Redis.from_url(config['REDIS_URL'])
+
+    def subscribe(self, user_id):
+        if self._client is not None and self._listener is None:
+            with self._lock:
+                if self._listener is None:
+                    self._listener = threading.Thread(target=self._listen, name='status-events', daemon=True)
+                    self._listener.start()
+        return super().subscribe(user_id)
+
+    def publish(self, user_id, event):
+        if self._client is None:
+            return self.deliver(user_id, event)
+        try:
+            self._client.publish(self.config['CHANNEL'], json.dumps({'user_id': user_id, 'event': event}, cls=DjangoJSONEncoder))
+        except Exception:
+            # العميل سيجد التغيير في snapshot عند إعادة الاتصال
+            logger.warning("Could not publish status event for user %s", user_id, exc_info=True)
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(self.config['CHANNEL'])
+                for message in pubsub.listen():
+                    payload = json.loads(message['data'])
+                    self.deliver(payload['user_id'], payload['event'])
+            except Exception:
+                logger.warning("Status events listener lost its Redis connection", exc_info=True)
+                time.sleep(1)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                config = get_config()
+                _broker = import_string(config['BROKER'])(config)
+    return _broker
+
+
+def event_for(transaction, previous):
+    return {
+        'id': transaction.pk,
+        'status': transaction.status,
+        'previous': previous,
+        'updated_at': transaction.updated_at,
+    }
+
+
+def publish_on_commit(transaction, previous):
+    if not get_config()['ENABLED']:
+        return
+    user_id = transaction.user_id
+    event = event_for(transaction, previous)
+    db_transaction.on_commit(lambda: get_broker().publish(user_id, event))
+
+
+def snapshot_queryset(user_id, last_event_id=None):
+    """بعد Last-Event-ID: ما تغيّر منذه؛ وإلا المعاملات المعلّقة (فهرس user, status, timestamp)."""
+    queryset = Transaction.objects.filter(user_id=user_id)
+    try:
+        since = parse_datetime(last_event_id) if last_event_id else None
+    except ValueError:
+        since = None
+    if since is not None:
+        queryset = queryset.filter(updated_at__gt=since)
+    else:
+        queryset = queryset.filter(status='pending')
+    return queryset.order_by('updated_at', 'id').values('id', 'status', 'updated_at')[:get_config()['SNAPSHOT_LIMIT']]
+
+
+def _format(name, data, event_id=None):
+    lines = [f'event: {name}']
+    if event_id:
+        lines.append(f'id: {event_id}')
+    lines.append(f'data: {json.dumps(data, cls=DjangoJSONEncoder)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def _event_id(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+async def stream(subscription, snapshot, connected_at):
+    """
+    مولّد غير متزامن لـ StreamingHttpResponse؛ يُلغي الاشتراك عند انتهائه أو إلغائه.
+    معرّف snapshot هو وقت الاشتراك: إعادة الاتصال قبل أي حدث تُعيد كل ما تغيّر بعده.
+    """
+    config = get_config()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + config['MAX_AGE']
+    try:
+        yield f"retry: {config['RETRY_MS']}\n\n"
+        yield _format('snapshot', snapshot, _event_id(connected_at))
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0 or subscription.overflowed:
+                return
+            try:
+                event = await asyncio.wait_for(subscription.queue.get(), min(config['KEEPALIVE'], remaining))
+            except asyncio.TimeoutError:
+                yield ': keepalive\n\n'
+                continue
+            if subscription.overflowed:
+                return
+            yield _format('status', event, _event_id(event['updated_at']))
+    finally:
+        get_broker().unsubscribe(subscription)
@@ -0,0 +1,186 @@
+"""
+طابور مهام خلفية مخزّن في قاعدة البيانات (جدول Task).
+
+الطلب يكتب صف المهمة داخل نفس المعاملة فقط (كتابة دائمة واحدة)، ثم ينفذها
+`manage.py run_tasks` لاحقاً مع إعادة المحاولة والأولويات.
+
+وسيط Redis اختياري (TASK_QUEUE['BROKER_URL']) لإيقاظ الـ workers فوراً بدلاً من
+الاستطلاع الدوري؛ قاعدة البيانات تبقى المصدر الوحيد للحقيقة، فلا تضيع مهمة إذا تعطل الوسيط.
+"""
+import logging
+import os
+import socket
+import time
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 10
+PRIORITY_NORMAL = 0
+PRIORITY_LOW = -10
+
+DEFAULTS = {
+    'BROKER_URL': None,
+    'BROKER_KEY': 'core:tasks',
+    # ثوانٍ بين فحص الجدول عند عدم وجود وسيط (أو مهلة انتظار الوسيط)
+    'POLL_INTERVAL': 1,
+    # مهمة "running" أقدم من هذا تعتبر worker ميتاً وتُعاد إلى الطابور
+    'VISIBILITY_TIMEOUT': 300,
+    'MAX_ATTEMPTS': 5,
+    # تأخير إعادة المحاولة: RETRY_BACKOFF * 2^(attempts-1) ثانية
+    'RETRY_BACKOFF': 5,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'TASK_QUEUE', {})}
+
+
+_broker = None
+
+
+def get_broker():
+    """عميل Redis عند ضبط BROKER_URL وتوفر مكتبة redis، وإلا None."""
+    global _broker
+    url = get_config()['BROKER_URL']
+    if not url:
+        return None
+    if _broker is None:
+        try:
+            import redis
+        except ImportError:
+            logger.warning("TASK_QUEUE BROKER_URL is set but the redis package is not installed")
+            return None
+        _broker = redis.Redis.from_url(url)
+    return _broker
+
+
+def _notify_broker(task_id):
+    broker = get_broker()
+    if broker is None:
+        return
+    try:
+        broker.lpush(get_config()['BROKER_KEY'], task_id)
+    except Exception:
+        # الـ worker سيجد المهمة بالاستطلاع
+        logger.warning("Could not notify task broker about task %s", task_id, exc_info=True)
+
+
+def enqueue(func, *args, priority=PRIORITY_NORMAL, delay=None, max_attempts=None, **kwargs):
+    """
+    إضافة مهمة إلى الطابور. تُكتب ضمن المعاملة الحالية، فلا تُنفذ إذا فشل الطلب.
+    func: دالة على مستوى الوحدة أو مسارها النصي؛ args/kwargs يجب أن تكون JSON.
+    """
+    name = func if isinstance(func, str) else f'{func.__module__}.{func.__qualname__}'
+    task = Task.objects.create(
+        name=name,
+        args=list(args),
+        kwargs=kwargs,
+        priority=priority,
+        max_attempts=max_attempts or get_config()['MAX_ATTEMPTS'],
+        run_at=timezone.now() + (delay or timedelta(0)),
+    )
+    transaction.on_commit(lambda: _notify_broker(task.pk))
+    return task
+
+
+def default_worker_id():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(worker_id):
+    """حجز أعلى مهمة جاهزة أولوية لهذا الـ worker، أو None."""
+    now = timezone.now()
+    ready = Task.objects.filter(status='queued', run_at__lte=now).order_by('-priority', 'run_at', 'id')
+
+    if connection.features.has_select_for_update_skip_locked:
+        # PostgreSQL: الـ workers يتخطون الصفوف المقفولة بدلاً من انتظارها
+        with transaction.atomic():
+            task = ready.select_for_update(skip_locked=True).first()
+            if task is None:
+                return None
+            task.status, task.locked_by, task.locked_at = 'running', worker_id, now
+            task.attempts += 1
+            task.save(update_fields=['status', 'locked_by', 'locked_at', 'attempts'])
+            return task
+
+    # SQLite: حجز متفائل؛ تحديث مشروط واحد يفوز به worker واحد فقط
+    for task_id in ready.values_list('id', flat=True)[:10]:
+        claimed = Task.objects.filter(pk=task_id, status='queued').update(
+            status='running', locked_by=worker_id, locked_at=now, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Task.objects.get(pk=task_id)
+    return None
+
+
+def execute(task):
+    """تنفيذ مهمة محجوزة وتسجيل النتيجة؛ الفشل يُعاد جدولته حتى max_attempts."""
+    try:
+        func = import_string(task.name)
+        func(*task.args, **task.kwargs)
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception("Task %s (%s) failed on attempt %s", task.pk, task.name, task.attempts)
+        fields = {'last_error': error[-4000:], 'locked_by': '', 'locked_at': None}
+        if task.attempts >= task.max_attempts:
+            fields.update(status='failed', finished_at=timezone.now())
+        else:
+            backoff = get_config()['RETRY_BACKOFF'] * 2 ** (task.attempts - 1)
+            fields.update(status='queued', run_at=timezone.now() + timedelta(seconds=backoff))
+        Task.objects.filter(pk=task.pk).update(**fields)
+        return False
+
+    Task.objects.filter(pk=task.pk).update(status='done', finished_at=timezone.now(), locked_by='', locked_at=None)
+    return True
+
+
+def requeue_stale():
+    """
+    إعادة مهام workers توقفت أثناء التنفيذ (بعد VISIBILITY_TIMEOUT). يعيد عدد المهام المعادة.
+    المهمة التي استنفدت max_attempts تُعلَّم failed: مهمة تُسقط الـ worker (نفاد الذاكرة مثلاً)
+    لا تُعاد إلى ما لا نهاية فتُسقط الـ workers واحداً بعد الآخر.
+    """
+    now = timezone.now()
+    stale = Task.objects.filter(status='running', locked_at__lt=now - timedelta(seconds=get_config()['VISIBILITY_TIMEOUT']))
+    exhausted = stale.filter(attempts__gte=F('max_attempts')).update(
+        status='failed', finished_at=now, locked_by='', locked_at=None,
+        last_error='Worker stopped during the last attempt (visibility timeout expired)',
+    )
+    if exhausted:
+        logger.warning("Marked %s stale task(s) failed after max_attempts", exhausted)
+    return stale.update(status='queued', locked_by='', locked_at=None)
+
+
+def wait_for_work(timeout):
+    broker = get_broker()
+    if broker is None:
+        time.sleep(timeout)
+        return
+    try:
+        broker.brpop(get_config()['BROKER_KEY'], timeout=max(int(timeout), 1))
+    except Exception:
+        logger.warning("Task broker unavailable, falling back to polling", exc_info=True)
+        time.sleep(timeout)
+
+
+def run_pending(worker_id=None, max_tasks=None):
+    """تنفيذ كل المهام الجاهزة ثم العودة (للاختبارات و run_tasks --once). يعيد عدد المهام."""
+    worker_id = worker_id or default_worker_id()
+    count = 0
+    while max_tasks is None or count < max_tasks:
+        task = claim(worker_id)
+        if task is None:
+            break
+        execute(task)
+        count += 1
+    return count
@@ -1,3 +1,1678 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import hashlib
+import io
+import json
+import math
+import random
+import shutil
+import tempfile
+from datetime import date, time, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync, sync_to_async
+from django.contrib.auth.hashers import identify_hasher
+from django.core import mail
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import IntegrityError, connection
+from django.test import (
+    AsyncClient, RequestFactory, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature,
+)
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from smart_atm import db_router
+from smart_atm.db_router import ReplicaRouter
+
+from .models import (
+    User, Employee, CardDetail, Transaction, DeliveryLocation, DeliverySchedule, ATMDevice,
+    VerificationArtifact, DigitalSignature, SignatureBlob, Task, ExchangeRate, Balance,
+    IdempotencyKey, TransferTransaction, DeliverySlot,
+)
+from .authentication import token_cache
+from .tokens import ATMRefreshToken
+from .hashers import ATMPBKDF2PasswordHasher
+from .hashing import HashingPool
+from . import (
+    geo, ledger, permission_cache, rates, response_cache, route_planner, slots, statements, status_events, tasks,
+    transfers, user_search,
+)
+from .permission_cache import get_principal
+
+
+class RouterQueryCountTests(TestCase):
+    """
+    اختبارات انحدار لعدد الاستعلامات في كل endpoints الـ router.
+    عدد الاستعلامات يجب أن يبقى ثابتاً مهما زاد عدد الصفوف (لا N+1).
+    """
+    ROWS = 5
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='customer', email='customer@example.com', status='verified')
+        cls.admin = User.objects.create(username='admin', email='admin@example.com', status='verified')
+        Employee.objects.create(user=cls.admin, role='admin')
+
+        cls.card = CardDetail.objects.create(
+            user=cls.user, last_four='4242', expiry='12/30', cardholder_name='Customer'
+        )
+        for i in range(cls.ROWS):
+            User.objects.create(username=f'user{i}', email=f'user{i}@example.com')
+            transaction = Transaction.objects.create(
+                user=cls.user, card=cls.card, transaction_type='withdrawal', amount=Decimal('100.00')
+            )
+            DeliveryLocation.objects.create(
+                transaction=transaction, building_type='villa',
+                latitude=Decimal('25.204849'), longitude=Decimal('55.270782'), address='Dubai'
+            )
+            DeliverySchedule.objects.create(
+                transaction=transaction, delivery_type='scheduled',
+                scheduled_date=date(2025, 1, 1), scheduled_time=time(10, 0)
+            )
+        cls.transaction = transaction
+
+    def setUp(self):
+        permission_cache.clear()
+
+    def client_for(self, user):
+        client = APIClient()
+        # إعادة التحميل حتى لا تُحسب العلاقات المخزنة مسبقاً على الكائن
+        client.force_authenticate(User.objects.get(pk=user.pk))
+        return client
+
+    def test_users_list(self):
+        client = self.client_for(self.admin)
+        # كاش الصلاحيات (بارد) + القائمة
+        with self.assertNumQueries(2):
+            response = client.get('/api/users/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_cards_list(self):
+        client = self.client_for(self.user)
+        with self.assertNumQueries(1):
+            response = client.get('/api/cards/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_transactions_list(self):
+        client = self.client_for(self.user)
+        # كاش الصلاحيات (بارد) + الصفحة + prefetch لمواقع وجداول التسليم
+        with self.assertNumQueries(4):
+            response = client.get('/api/transactions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), self.ROWS)
+
+    def test_transactions_detail(self):
+        client = self.client_for(self.user)
+        with self.assertNumQueries(4):
+            response = client.get(f'/api/transactions/{self.transaction.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['delivery_locations']), 1)
+
+    def test_delivery_locations_list(self):
+        client = self.client_for(self.user)
+        with self.assertNumQueries(1):
+            response = client.get('/api/delivery-locations/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), self.ROWS)
+
+    def test_delivery_schedules_list(self):
+        client = self.client_for(self.user)
+        with self.assertNumQueries(1):
+            response = client.get('/api/delivery-schedules/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), self.ROWS)
+
+    def test_transfers_list(self):
+        recipient = User.objects.get(username='user0')
+        for _ in range(self.ROWS):
+            TransferTransaction.objects.create(
+                user=self.user, card=self.card, recipient=recipient, transaction_type='send_money',
+                amount_sent=Decimal('10.00'), currency_sent='AED', amount_received=Decimal('10.00'), currency_received='AED',
+            )
+        client = self.client_for(self.user)
+        with self.assertNumQueries(2):
+            response = client.get('/api/transfers/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results']), self.ROWS)
+
+
+# السعة الافتراضية لفترات التسليم أقل من عدد الجداول في هذه الاختبارات
+@override_settings(DELIVERY_SLOTS={'DEFAULT_CAPACITY': 1000})
+class TransactionCreateQueryCountTests(TestCase):
+    """
+    إنشاء معاملة مع صفوف تسليم متداخلة يكلّف عدداً ثابتاً من الاستعلامات.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='customer', email='customer@example.com', status='verified')
+        cls.card = CardDetail.objects.create(
+            user=cls.user, last_four='4242', expiry='12/30', cardholder_name='Customer'
+        )
+
+    def payload(self, rows):
+        return {
+            'transaction_type': 'withdrawal',
+            'amount': '250.00',
+            'card_id': self.card.pk,
+            'delivery_locations': [{
+                'building_type': 'villa', 'latitude': '25.204849',
+                'longitude': '55.270782', 'address': 'Dubai',
+            }] * rows,
+            'delivery_schedules': [{
+                'delivery_type': 'scheduled', 'scheduled_date': '2025-01-01', 'scheduled_time': '10:00',
+            }] * rows,
+        }
+
+    def post(self, rows):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with CaptureQueriesContext(connection) as queries:
+            response = client.post('/api/transactions/start/', self.payload(rows), format='json')
+        self.assertEqual(response.status_code, 201)
+        return len(queries)
+
+    def test_nested_rows_do_not_add_queries(self):
+        self.post(1)  # تسخين كاش الصلاحيات
+        self.assertEqual(self.post(1), self.post(25))
+        self.assertEqual(DeliverySchedule.objects.count(), 27)
+
+    def test_foreign_card_is_rejected_atomically(self):
+        other = User.objects.create(username='other', email='other@example.com', status='verified')
+        client = APIClient()
+        client.force_authenticate(other)
+        response = client.post('/api/transactions/start/', self.payload(1), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Transaction.objects.exists())
+
+
+# السعة الافتراضية لفترات التسليم أقل من عدد الجداول في هذه الاختبارات
+@override_settings(DELIVERY_SLOTS={'DEFAULT_CAPACITY': 1000})
+class TransactionBatchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='atm', email='atm@example.com', status='verified')
+        cls.recipient = User.objects.create(username='recipient', email='recipient@example.com')
+        cls.card = CardDetail.objects.create(
+            user=cls.user, last_four='4242', expiry='12/30', cardholder_name='ATM'
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        # رصيد يغطي التحويلات (يُتحقق منه دائماً)
+        Balance.objects.create(user=self.user, currency='AED', amount=Decimal('1000.00'))
+
+    def item(self, **overrides):
+        item = {
+            'transaction_type': 'withdrawal',
+            'amount': '100.00',
+            'card_id': self.card.pk,
+            'delivery_schedules': [{
+                'delivery_type': 'scheduled', 'scheduled_date': '2025-01-01', 'scheduled_time': '10:00',
+            }],
+        }
+        item.update(overrides)
+        return item
+
+    def test_partial_failures_are_reported_per_item(self):
+        items = [
+            self.item(),
+            self.item(amount='not-a-number'),
+            self.item(card_id=999999),
+            self.item(transaction_type='send_money', recipient_id=self.recipient.pk),
+            self.item(transaction_type='send_money'),
+        ]
+        response = self.client.post('/api/transactions/batch/', items, format='json')
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['created', 'failed', 'failed', 'created', 'failed'],
+        )
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertEqual(DeliverySchedule.objects.count(), 2)
+
+    def test_items_cannot_debit_other_accounts(self):
+        Balance.objects.create(user=self.recipient, currency='AED', amount=Decimal('500.00'))
+        items = [self.item(transaction_type='receive_money', recipient_id=self.recipient.pk)] * 3 + [self.item()]
+        response = self.client.post('/api/transactions/batch/', items, format='json')
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']], ['failed', 'failed', 'failed', 'created'],
+        )
+        self.assertIn('transaction_type', response.data['results'][0]['errors'])
+        self.assertEqual(ledger.get_balance(self.recipient.pk), Decimal('500.00'))
+
+    def test_ndjson_body(self):
+        body = '\n'.join(json.dumps(self.item()) for _ in range(3))
+        response = self.client.post(
+            '/api/transactions/batch/', body, content_type='application/x-ndjson'
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['created'], 3)
+
+    def test_query_count_does_not_grow_with_batch_size(self):
+        def post(size):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/transactions/batch/', [self.item()] * size, format='json')
+            self.assertEqual(response.status_code, 201)
+            return len(queries)
+
+        post(1)  # تسخين كاش الصلاحيات
+        self.assertEqual(post(2), post(50))
+
+
+class PermissionCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='admin', email='admin@example.com', status='verified')
+        cls.employee = Employee.objects.create(user=cls.admin, role='admin')
+        cls.customer = User.objects.create(username='customer', email='customer@example.com')
+
+    def setUp(self):
+        permission_cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.get(pk=self.admin.pk))
+
+    def test_second_request_skips_permission_query(self):
+        self.client.get('/api/users/')
+        with self.assertNumQueries(1):
+            self.client.get('/api/users/')
+
+    def test_change_status_invalidates(self):
+        self.assertEqual(get_principal(self.customer.pk)['status'], 'pending')
+        response = self.client.post(
+            f'/api/users/{self.customer.pk}/change-status/', {'status': 'verified'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(get_principal(self.customer.pk)['status'], 'verified')
+
+    def test_employee_delete_invalidates(self):
+        self.assertEqual(self.client.get('/api/users/').status_code, 200)
+        self.employee.delete()
+        self.assertEqual(self.client.get('/api/users/').status_code, 403)
+
+
+class ClaimsTokenTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='customer', email='customer@example.com', status='verified')
+        cls.user.set_password('secret-pass')
+        cls.user.save(update_fields=['password'])
+
+    def setUp(self):
+        permission_cache.clear()
+        self.client = APIClient()
+
+    def login(self):
+        self.client.credentials()
+        response = self.client.post(
+            '/api/login/', {'email': 'customer@example.com', 'password': 'secret-pass'}, format='json'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['access']}")
+        return response
+
+    def test_authenticated_request_skips_user_lookup(self):
+        self.login()
+        # المصادقة والصلاحيات من الـ claims والكاش: استعلام الصفحة فقط
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/transactions/')
+        self.assertEqual(response.status_code, 200)
+
+    def test_status_change_revokes_token(self):
+        self.login()
+        self.user.status = 'blocked'
+        self.user.save(update_fields=['status'])
+        self.user.status = 'verified'
+        self.user.save(update_fields=['status'])
+
+        response = self.client.get('/api/transactions/')
+        self.assertEqual(response.status_code, 401)
+
+        self.login()
+        self.assertEqual(self.client.get('/api/transactions/').status_code, 200)
+
+
+class ATMAuthenticationTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='atm', email='atm@example.com', status='verified')
+
+    def setUp(self):
+        permission_cache.clear()
+        token_cache.clear()
+        self.client = APIClient()
+
+    @override_settings(RESPONSE_CACHE={'ENABLED': False})
+    def test_device_token_is_cached(self):
+        _, raw_key = ATMDevice.issue(self.user, 'Mall of the Emirates #3')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {raw_key}')
+        self.assertEqual(self.client.get('/api/cards/').status_code, 200)
+        # الجهاز والحالة من الذاكرة: استعلام القائمة فقط
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/cards/').status_code, 200)
+
+    def test_deactivated_device_is_rejected(self):
+        device, raw_key = ATMDevice.issue(self.user, 'Dubai Mall #1')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {raw_key}')
+        self.assertEqual(self.client.get('/api/cards/').status_code, 200)
+
+        device.is_active = False
+        device.save(update_fields=['is_active'])
+        self.assertEqual(self.client.get('/api/cards/').status_code, 401)
+
+    def test_unknown_token_is_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token not-a-real-key')
+        self.assertEqual(self.client.get('/api/cards/').status_code, 401)
+
+
+class LoginHashingTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='customer', email='customer@example.com', status='verified')
+        # تجزئة قديمة بكلفة أقل من الحالية
+        cls.user.password = ATMPBKDF2PasswordHasher().encode('secret-pass', 'oldsalt', iterations=1000)
+        cls.user.save(update_fields=['password'])
+
+    def login(self):
+        return APIClient().post(
+            '/api/login/', {'email': 'customer@example.com', 'password': 'secret-pass'}, format='json'
+        )
+
+    def test_login_rehashes_outdated_password(self):
+        self.assertEqual(self.login().status_code, 200)
+        self.user.refresh_from_db()
+        self.assertFalse(identify_hasher(self.user.password).must_update(self.user.password))
+        self.assertTrue(self.user.check_password('secret-pass'))
+
+    def test_saturated_hashing_pool_returns_429(self):
+        pool = HashingPool(workers=1, max_pending=0, timeout=1)
+        pool._slots.acquire()
+        with mock.patch('core.backends.get_hashing_pool', return_value=pool):
+            response = self.login()
+        self.assertEqual(response.status_code, 429)
+        self.assertIn('Retry-After', response)
+
+
+class ReplicaRouterTests(TestCase):
+
+    def setUp(self):
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+        self.user = User(id=42, email='sticky@example.com')
+        patcher = mock.patch.object(ReplicaRouter, '_replicas', return_value=['replica_1'])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.addCleanup(cache.clear)
+
+    def route(self, method):
+        request = getattr(self.factory, method)('/api/transactions/')
+        request.user = self.user
+        token = db_router._current_request.set(request)
+        try:
+            return self.router.db_for_read(Transaction)
+        finally:
+            db_router._current_request.reset(token)
+
+    def test_safe_reads_go_to_replica(self):
+        self.assertEqual(self.route('get'), 'replica_1')
+
+    def test_unsafe_requests_and_background_reads_stay_on_primary(self):
+        self.assertEqual(self.route('post'), 'default')
+        self.assertEqual(self.router.db_for_read(Transaction), 'default')
+
+    def test_reads_stick_to_primary_after_own_write(self):
+        db_router.mark_sticky(self.user.pk)
+        self.assertEqual(self.route('get'), 'default')
+
+
+class VerificationUploadTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='face', email='face@example.com', status='verified')
+
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        settings_override = override_settings(
+            MEDIA_ROOT=media_root,
+            VERIFICATION_UPLOADS={'CHUNK_SIZE': 1024},
+            ADMINS=[('Review', 'review@example.com')],
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def image_bytes(self, size=(1200, 800)):
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new('RGB', size, (120, 30, 200)).save(buffer, format='PNG')
+        return buffer.getvalue()
+
+    def put_chunk(self, upload_id, data, start, total):
+        return self.client.generic(
+            'PUT', f'/api/delivery/verify-face-id/uploads/{upload_id}/', data,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {start}-{start + len(data) - 1}/{total}',
+        )
+
+    def test_single_request_upload_is_processed_by_worker(self):
+        content = self.image_bytes()
+        upload = SimpleUploadedFile('face.png', content, content_type='image/png')
+        response = self.client.post(
+            '/api/delivery/verify-face-id/',
+            {'face_scan': upload, 'emirates_id': '784-1995-1234567-1'},
+            format='multipart',
+        )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(VerificationArtifact.objects.get(user=self.user).status, 'uploaded')
+        # المعالجة ثم إشعار المراجعة
+        self.assertEqual(tasks.run_pending(), 2)
+        self.assertEqual(len(mail.outbox), 1)
+
+        artifact = VerificationArtifact.objects.get(user=self.user)
+        self.assertEqual(artifact.status, 'processed')
+        self.assertEqual(artifact.sha256, hashlib.sha256(content).hexdigest())
+        from PIL import Image
+        with Image.open(artifact.derivative.path) as derivative:
+            self.assertEqual(derivative.format, 'JPEG')
+            self.assertEqual(max(derivative.size), 512)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.status, 'pending')
+
+    def test_chunked_upload_resumes_from_server_offset(self):
+        content = self.image_bytes()
+        total = len(content)
+        response = self.client.post(
+            '/api/delivery/verify-face-id/uploads/',
+            {'size': total, 'emirates_id': '784-1995-1234567-1'},
+            format='json',
+        )
+        self.assertEqual(response.status_code, 201)
+        upload_id = response.data['upload_id']
+
+        self.assertEqual(self.put_chunk(upload_id, content[:1000], 0, total).data['offset'], 1000)
+        # قطعة بإزاحة خاطئة تُرفض مع الإزاحة الصحيحة
+        conflict = self.put_chunk(upload_id, content[2000:3000], 2000, total)
+        self.assertEqual(conflict.status_code, 409)
+        self.assertEqual(conflict.data['offset'], 1000)
+        self.assertEqual(self.client.get(f'/api/delivery/verify-face-id/uploads/{upload_id}/').data['offset'], 1000)
+
+        response = self.put_chunk(upload_id, content[1000:], 1000, total)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['status'], 'uploaded')
+        tasks.run_pending()
+
+        artifact = VerificationArtifact.objects.get(upload_id=upload_id)
+        self.assertEqual(artifact.status, 'processed')
+        self.assertEqual(artifact.sha256, hashlib.sha256(content).hexdigest())
+        with artifact.file.open('rb') as fh:
+            self.assertEqual(fh.read(), content)
+
+    def test_invalid_image_marks_artifact_failed(self):
+        upload = SimpleUploadedFile('face.png', b'not an image', content_type='image/png')
+        self.client.post(
+            '/api/delivery/verify-face-id/',
+            {'face_scan': upload, 'emirates_id': '784-1995-1234567-1'},
+            format='multipart',
+        )
+        tasks.run_pending()
+        self.assertEqual(VerificationArtifact.objects.get(user=self.user).status, 'failed')
+        self.assertEqual(len(mail.outbox), 0)
+
+    def test_user_queries_do_not_load_artifacts(self):
+        self.assertNotIn('face_scan', [field.name for field in User._meta.concrete_fields])
+
+
+class SignatureStorageTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='signer', email='signer@example.com', status='verified')
+        cls.other = User.objects.create(username='other', email='other@example.com', status='verified')
+
+    def setUp(self):
+        permission_cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def sign(self, signature_data, user=None, **extra):
+        self.client.force_authenticate(user or self.user)
+        return self.client.post('/api/delivery/signature/', {'signature_data': signature_data, **extra}, format='json')
+
+    def test_svg_is_compressed_and_round_trips(self):
+        svg = '<svg xmlns="http://www.w3.org/2000/svg">' + '<path d="M0 0 L10 10"/>' * 200 + '</svg>'
+        response = self.sign(svg)
+
+        self.assertEqual(response.status_code, 200)
+        blob = SignatureBlob.objects.get()
+        self.assertEqual(blob.encoding, 'zlib')
+        self.assertLess(len(bytes(blob.data)), len(svg) // 10)
+        self.assertEqual(blob.digest, response.data['digest'])
+        self.assertEqual(DigitalSignature.objects.get(user=self.user).signature_data, svg)
+
+    def test_data_url_is_stored_as_binary(self):
+        data_url = 'data:image/png;base64,' + base64.b64encode(bytes(range(256)) * 4).decode()
+        self.sign(data_url)
+
+        blob = SignatureBlob.objects.get()
+        self.assertEqual(blob.size, 1024)
+        self.assertEqual(DigitalSignature.objects.get(user=self.user).signature_data, data_url)
+
+    def test_malformed_payloads_are_rejected(self):
+        for payload, extra in (
+            ('data:image/png;base64,@@not-base64@@', {}),
+            (f'data:image/{"x" * 60};base64,' + base64.b64encode(b'sig').decode(), {}),
+            (12345, {}),
+            ('<svg>ok</svg>', {'transaction_id': 'abc'}),
+        ):
+            with self.subTest(payload=payload, extra=extra):
+                self.assertEqual(self.sign(payload, **extra).status_code, 400)
+        self.assertFalse(SignatureBlob.objects.exists())
+        self.assertFalse(DigitalSignature.objects.exists())
+
+    def test_identical_payloads_share_one_blob(self):
+        self.sign('<svg>same</svg>')
+        self.sign('<svg>same</svg>', user=self.other)
+
+        self.assertEqual(SignatureBlob.objects.count(), 1)
+        self.assertEqual(DigitalSignature.objects.count(), 2)
+
+    def test_resign_is_one_insert_and_one_update(self):
+        self.sign('<svg>first</svg>')
+        with CaptureQueriesContext(connection) as queries:
+            self.sign('<svg>second</svg>', purpose='delivery')
+
+        signature = DigitalSignature.objects.get(user=self.user)
+        self.assertEqual(signature.purpose, 'delivery')
+        self.assertEqual(signature.signature_data, '<svg>second</svg>')
+        # إدراج المحتوى + تحديث الصف
+        self.assertEqual(
+            [query['sql'].split()[0] for query in queries if 'core_digitalsignature' in query['sql'] or 'core_signatureblob' in query['sql']],
+            ['INSERT', 'UPDATE'],
+        )
+
+
+class AsyncViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='async', email='async@example.com', status='verified')
+        cls.user.password = ATMPBKDF2PasswordHasher().encode('secret-pass', 'salt', iterations=1000)
+        cls.user.save(update_fields=['password'])
+
+    def test_io_bound_views_are_native_coroutines(self):
+        from .views import EmployeeListView, FaceIDVerificationView, FaceScanUploadView, LoginView, SignatureView
+
+        for view in (LoginView, FaceIDVerificationView, FaceScanUploadView, SignatureView, EmployeeListView):
+            with self.subTest(view=view.__name__):
+                self.assertTrue(asyncio.iscoroutinefunction(view.as_view()))
+
+    async def test_login_under_async_client(self):
+        response = await AsyncClient().post(
+            '/api/login/', {'email': 'async@example.com', 'password': 'secret-pass'},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access', response.json())
+
+    async def test_signature_under_async_client(self):
+        token = (await ATMRefreshToken.afor_user(self.user)).access_token
+        response = await AsyncClient().post(
+            '/api/delivery/signature/', {'signature_data': '<svg>async</svg>'},
+            content_type='application/json', headers={'Authorization': f'Bearer {token}'},
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(await DigitalSignature.objects.filter(user=self.user).aexists())
+
+
+def flaky_task(marker):
+    # تفشل في المحاولة الأولى فقط (لاختبار إعادة المحاولة)
+    if not Task.objects.filter(name__endswith='flaky_task', attempts__gte=2).exists():
+        raise RuntimeError(marker)
+
+
+def failing_task():
+    raise RuntimeError('always fails')
+
+
+class TaskQueueTests(TestCase):
+
+    def test_higher_priority_runs_first(self):
+        low = tasks.enqueue('core.tests.failing_task', priority=tasks.PRIORITY_LOW)
+        high = tasks.enqueue('core.tests.flaky_task', 'x', priority=tasks.PRIORITY_HIGH)
+        self.assertEqual(tasks.claim('worker-1').pk, high.pk)
+        self.assertEqual(tasks.claim('worker-2').pk, low.pk)
+        self.assertIsNone(tasks.claim('worker-3'))
+
+    def test_failed_task_is_retried_with_backoff(self):
+        task = tasks.enqueue(flaky_task, 'first')
+        with self.assertLogs('core.tasks', 'ERROR'):
+            self.assertEqual(tasks.run_pending(), 1)
+
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'queued')
+        self.assertIn('RuntimeError: first', task.last_error)
+        self.assertGreater(task.run_at, timezone.now())
+        # لا تُنفذ قبل موعد إعادة المحاولة
+        self.assertEqual(tasks.run_pending(), 0)
+
+        Task.objects.filter(pk=task.pk).update(run_at=timezone.now())
+        self.assertEqual(tasks.run_pending(), 1)
+        task.refresh_from_db()
+        self.assertEqual((task.status, task.attempts), ('done', 2))
+
+    def test_task_fails_after_max_attempts(self):
+        task = tasks.enqueue(failing_task, max_attempts=1)
+        with self.assertLogs('core.tasks', 'ERROR'):
+            tasks.run_pending()
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'failed')
+
+    def test_stale_running_task_is_requeued(self):
+        task = tasks.enqueue(failing_task)
+        tasks.claim('dead-worker')
+        Task.objects.filter(pk=task.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(tasks.requeue_stale(), 1)
+        self.assertEqual(tasks.claim('worker').pk, task.pk)
+
+    def test_stale_task_fails_after_max_attempts(self):
+        task = tasks.enqueue(failing_task, max_attempts=1)
+        tasks.claim('dead-worker')
+        Task.objects.filter(pk=task.pk).update(locked_at=timezone.now() - timedelta(hours=1))
+        with self.assertLogs('core.tasks', 'WARNING'):
+            self.assertEqual(tasks.requeue_stale(), 0)
+        task.refresh_from_db()
+        self.assertEqual(task.status, 'failed')
+        self.assertIsNone(tasks.claim('worker'))
+
+
+class ExchangeRateTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='fx', email='fx@example.com', status='verified')
+        cls.card = CardDetail.objects.create(user=cls.user, last_four='4242', expiry='12/30', cardholder_name='FX')
+
+    def setUp(self):
+        rates.invalidate()
+        self.addCleanup(rates.invalidate)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def start(self, **overrides):
+        payload = {'transaction_type': 'withdrawal', 'amount': '100.00', 'card_id': self.card.pk, **overrides}
+        return self.client.post('/api/transactions/start/', payload, format='json')
+
+    def test_snapshot_in_same_bucket_replaces_rate(self):
+        moment = timezone.now()
+        rates.record_rates({('AED', 'USD'): Decimal('0.2720')}, at=moment)
+        rates.record_rates({('AED', 'USD'): Decimal('0.2723')}, at=moment)
+        rates.record_rates({('AED', 'USD'): Decimal('0.2700')}, at=moment - timedelta(hours=1))
+
+        self.assertEqual(ExchangeRate.objects.count(), 2)
+        self.assertEqual(rates.get_rate('AED', 'USD'), Decimal('0.2723'))
+
+    def test_inverse_and_cross_rates(self):
+        rates.record_rates({('AED', 'USD'): Decimal('0.25'), ('AED', 'EUR'): Decimal('0.2')})
+        self.assertEqual(rates.get_rate('USD', 'AED'), Decimal('4'))
+        self.assertEqual(rates.get_rate('USD', 'EUR'), Decimal('0.8'))
+        self.assertIsNone(rates.get_rate('USD', 'JPY'))
+
+    def test_transaction_is_stamped_without_reading_rates(self):
+        rates.record_rates({('AED', 'USD'): Decimal('0.2723')})
+        self.start()  # تسخين كاش المصفوفة والصلاحيات
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.start()
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['exchange_rate'], '0.272300')
+        self.assertFalse(any('core_exchangerate' in query['sql'] for query in queries))
+
+    def test_missing_rate_is_filled_by_worker(self):
+        response = self.start(currency_to='EUR')
+        self.assertIsNone(response.data['exchange_rate'])
+
+        rates.record_rates({('AED', 'EUR'): Decimal('0.25')})
+        tasks.run_pending()
+        self.assertEqual(Transaction.objects.get().exchange_rate, Decimal('0.25'))
+
+    def test_batch_transactions_are_stamped(self):
+        rates.record_rates({('AED', 'USD'): Decimal('0.2723')})
+        item = {'transaction_type': 'withdrawal', 'amount': '10.00', 'card_id': self.card.pk}
+        response = self.client.post('/api/transactions/batch/', [item] * 3, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(set(Transaction.objects.values_list('exchange_rate', flat=True)), {Decimal('0.272300')})
+
+    def test_bulk_convert(self):
+        rates.record_rates({('AED', 'USD'): Decimal('0.2723')})
+        response = self.client.post('/api/exchange-rates/convert/', {
+            'currency_from': 'AED', 'currency_to': 'USD',
+            'items': [{'amount': '100'}, '0.05', {'amount': '1', 'currency_to': 'JPY'}],
+        }, format='json')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [result['converted'] for result in response.data['results']],
+            ['27.23', '0.01', None],
+        )
+
+    def test_bulk_convert_rejects_invalid_amounts(self):
+        response = self.client.post('/api/exchange-rates/convert/', {
+            'currency_from': 'AED', 'currency_to': 'USD', 'items': ['1', 'abc'],
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(list(response.data['errors']), [1])
+
+
+class BalanceLedgerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='ledger', email='ledger@example.com', status='verified')
+        cls.other = User.objects.create(username='payee', email='payee@example.com', status='verified')
+        cls.card = CardDetail.objects.create(user=cls.user, last_four='4242', expiry='12/30', cardholder_name='Ledger')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def start(self, **overrides):
+        payload = {'transaction_type': 'deposit', 'amount': '100.00', 'card_id': self.card.pk, **overrides}
+        return self.client.post('/api/transactions/start/', payload, format='json')
+
+    def test_balance_follows_transactions(self):
+        self.start()
+        self.start(transaction_type='withdrawal', amount='30.00')
+        self.start(transaction_type='send_money', amount='20.00', recipient_id=self.other.pk)
+
+        self.assertEqual(ledger.get_balance(self.user.pk), Decimal('50.00'))
+        self.assertEqual(ledger.get_balance(self.other.pk), Decimal('20.00'))
+
+    def test_batch_updates_balance_in_constant_queries(self):
+        item = {'transaction_type': 'deposit', 'amount': '10.00', 'card_id': self.card.pk}
+
+        def post(count):
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.post('/api/transactions/batch/', [item] * count, format='json')
+            self.assertEqual(response.status_code, 201)
+            return len(queries)
+
+        post(1)  # تسخين الكاش
+        self.assertEqual(post(1), post(50))
+        self.assertEqual(ledger.get_balance(self.user.pk), Decimal('520.00'))
+
+    def test_update_and_delete_adjust_balance(self):
+        self.start()
+        pk = Transaction.objects.get().pk
+        self.client.patch(f'/api/transactions/{pk}/', {'transaction_type': 'withdrawal', 'amount': '40.00'}, format='json')
+        self.assertEqual(ledger.get_balance(self.user.pk), Decimal('-40.00'))
+
+        self.client.delete(f'/api/transactions/{pk}/')
+        self.assertEqual(ledger.get_balance(self.user.pk), Decimal('0.00'))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_receive_money_never_debits_the_recipient(self):
+        Balance.objects.create(user=self.other, currency='AED', amount=Decimal('500.00'))
+        response = self.start(transaction_type='receive_money', amount='400.00', recipient_id=self.other.pk)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('transaction_type', response.data)
+        self.assertFalse(Transaction.objects.exists())
+        self.assertEqual(ledger.get_balance(self.other.pk), Decimal('500.00'))
+        self.assertEqual(ledger.get_balance(self.user.pk), Decimal('0.00'))
+
+    def test_posted_transfer_cannot_be_changed_or_deleted(self):
+        self.start()
+        self.start(transaction_type='send_money', amount='100.00', recipient_id=self.other.pk)
+        transfer = Transaction.objects.get(transaction_type='send_money')
+
+        self.assertEqual(self.client.delete(f'/api/transactions/{transfer.pk}/').status_code, 400)
+        response = self.client.patch(f'/api/transactions/{transfer.pk}/', {'amount': '1.00'}, format='json')
+        self.assertEqual(response.status_code, 400)
+        # ولا يصبح إيداع أو سحب تحويلاً إلى حساب آخر بالتعديل
+        deposit = Transaction.objects.get(transaction_type='deposit')
+        response = self.client.patch(
+            f'/api/transactions/{deposit.pk}/',
+            {'transaction_type': 'send_money', 'recipient_id': self.other.pk}, format='json',
+        )
+        self.assertEqual(response.status_code, 400)
+
+        transfer.refresh_from_db()
+        self.assertEqual(transfer.amount, Decimal('100.00'))
+        self.assertEqual(ledger.get_balance(self.other.pk), Decimal('100.00'))
+        self.assertEqual(ledger.get_balance(self.user.pk), Decimal('0.00'))
+
+    @override_settings(LEDGER={'ENFORCE_FUNDS': True})
+    def test_enforced_funds_reject_overdraft(self):
+        self.start(amount='10.00')
+        response = self.start(transaction_type='withdrawal', amount='25.00')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertEqual(ledger.get_balance(self.user.pk), Decimal('10.00'))
+
+    def test_failed_transaction_releases_its_postings(self):
+        self.start()
+        self.start(transaction_type='withdrawal', amount='30.00')
+        withdrawal = Transaction.objects.get(transaction_type='withdrawal')
+        self.assertEqual(ledger.get_balance(self.user.pk), Decimal('70.00'))
+
+        withdrawal.status = 'failed'
+        withdrawal.save(update_fields=['status'])
+        self.assertEqual(ledger.get_balance(self.user.pk), Decimal('100.00'))
+        out = io.StringIO()
+        call_command('reconcile_balances', stdout=out)
+        self.assertIn('mismatched=0', out.getvalue())
+
+        # حفظ آخر بنفس الحالة لا يعيد المبلغ مرة ثانية
+        withdrawal.save()
+        self.assertEqual(ledger.get_balance(self.user.pk), Decimal('100.00'))
+
+    def test_reconcile_detects_and_fixes_drift(self):
+        self.start()
+        self.start(transaction_type='send_money', amount='40.00', recipient_id=self.other.pk)
+        Balance.objects.filter(user=self.user).update(amount=Decimal('999.00'))
+
+        out = io.StringIO()
+        call_command('reconcile_balances', '--batch-size', '1', stdout=out)
+        self.assertIn('mismatched=1', out.getvalue())
+
+        call_command('reconcile_balances', '--fix', stdout=io.StringIO())
+        self.assertEqual(ledger.get_balance(self.user.pk), Decimal('60.00'))
+        out = io.StringIO()
+        call_command('reconcile_balances', stdout=out)
+        self.assertIn('mismatched=0', out.getvalue())
+
+
+class TransferIdempotencyTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='sender', email='sender@example.com', status='verified')
+        cls.other = User.objects.create(username='receiver', email='receiver@example.com', status='verified')
+        cls.card = CardDetail.objects.create(user=cls.user, last_four='4242', expiry='12/30', cardholder_name='Sender')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def start(self, key=None, **overrides):
+        payload = {
+            'transaction_type': 'send_money', 'amount': '40.00', 'card_id': self.card.pk,
+            'recipient_id': self.other.pk, **overrides,
+        }
+        headers = {'HTTP_IDEMPOTENCY_KEY': key} if key else {}
+        return self.client.post('/api/transactions/start/', payload, format='json', **headers)
+
+    def deposit(self):
+        payload = {'transaction_type': 'deposit', 'amount': '100.00', 'card_id': self.card.pk}
+        self.assertEqual(self.client.post('/api/transactions/start/', payload, format='json').status_code, 201)
+
+    def test_retry_with_same_key_replays_response(self):
+        self.deposit()
+        first = self.start(key='atm-1')
+        second = self.start(key='atm-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(second.status_code, 201)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(Transaction.objects.filter(transaction_type='send_money').count(), 1)
+        self.assertEqual(ledger.get_balance(self.user.pk), Decimal('60.00'))
+
+    def test_same_key_with_different_body_is_rejected(self):
+        self.deposit()
+        self.start(key='atm-2')
+        response = self.start(key='atm-2', amount='41.00')
+        self.assertEqual(response.status_code, 422)
+
+    def test_transfers_always_check_funds(self):
+        response = self.start(key='atm-3')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Transaction.objects.exists())
+        # الخطأ لا يُحفظ: نفس المفتاح يعمل بعد الإيداع
+        self.assertFalse(IdempotencyKey.objects.exists())
+
+        self.deposit()
+        self.assertEqual(self.start(key='atm-3').status_code, 201)
+
+    def test_receive_money_is_rejected_before_the_key_is_stored(self):
+        Balance.objects.create(user=self.other, currency='AED', amount=Decimal('100.00'))
+        for _ in range(2):
+            self.assertEqual(self.start(key='atm-4', transaction_type='receive_money').status_code, 400)
+        self.assertFalse(IdempotencyKey.objects.exists())
+        self.assertEqual(ledger.get_balance(self.other.pk), Decimal('100.00'))
+
+        transaction = Transaction(
+            user=self.user, card=self.card, recipient=self.other, transaction_type='receive_money', amount=10,
+        )
+        with self.assertRaises(ledger.ForeignDebit):
+            transfers.execute(transaction)
+        self.assertEqual(ledger.get_balance(self.other.pk), Decimal('100.00'))
+
+    def test_key_released_by_a_failed_concurrent_request_is_a_conflict(self):
+        # المفتاح محجوز لحظة الإنشاء ثم اختفى (الطلب الأول أُلغي): لا 500
+        self.deposit()
+        with mock.patch.object(IdempotencyKey.objects, 'create', side_effect=IntegrityError):
+            response = self.start(key='atm-5')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.start(key='atm-5').status_code, 201)
+
+    def test_batch_rejects_uncovered_transfers_per_item(self):
+        self.deposit()
+        item = {'transaction_type': 'send_money', 'amount': '60.00', 'card_id': self.card.pk, 'recipient_id': self.other.pk}
+        response = self.client.post('/api/transactions/batch/', [item, item], format='json')
+
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([result['status'] for result in response.data['results']], ['created', 'failed'])
+        self.assertEqual(ledger.get_balance(self.user.pk), Decimal('40.00'))
+
+
+class TransferLoadTests(TransactionTestCase):
+
+    # بدون كتّاب متزامنين وأقفال صفوف (SQLite) لا يختبر هذا شيئاً: يعمل على PostgreSQL فقط
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_transfers_have_no_double_spends_or_duplicates(self):
+        out = io.StringIO()
+        call_command(
+            'bench_transfers', '--users', '4', '--transfers', '60', '--duplicates', '2',
+            '--concurrency', '8', '--seed', '1', stdout=out, stderr=io.StringIO(),
+        )
+        self.assertIn('ok:', out.getvalue())
+
+
+class TransferTransactionTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='alice', email='alice@example.com', status='verified')
+        cls.other = User.objects.create(username='bob', email='bob@example.com', status='verified')
+        cls.card = CardDetail.objects.create(user=cls.user, last_four='4242', expiry='12/30', cardholder_name='Alice')
+        cls.other_card = CardDetail.objects.create(user=cls.other, last_four='1111', expiry='12/30', cardholder_name='Bob')
+
+    def setUp(self):
+        rates.invalidate()
+        self.addCleanup(rates.invalidate)
+        Balance.objects.create(user=self.user, currency='AED', amount=Decimal('100.00'))
+        Balance.objects.create(user=self.other, currency='AED', amount=Decimal('100.00'))
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def send(self, client=None, **overrides):
+        payload = {
+            'transaction_type': 'send_money', 'amount_sent': '40.00', 'card_id': self.card.pk,
+            'recipient_id': self.other.pk, **overrides,
+        }
+        return (client or self.client).post('/api/transfers/', payload, format='json')
+
+    def test_transfer_moves_converted_amount(self):
+        rates.record_rates({('AED', 'USD'): Decimal('0.25')})
+        response = self.send(currency_received='USD')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['amount_received'], '10.00')
+        self.assertEqual(ledger.get_balance(self.user.pk), Decimal('60.00'))
+        self.assertEqual(ledger.get_balance(self.other.pk, 'USD'), Decimal('10.00'))
+
+        # المطابقة تحتسب التحويلات أيضاً (الأرصدة الافتتاحية هنا بلا سجل)
+        expected = ledger.expected_balances([self.user.pk, self.other.pk])
+        self.assertEqual(expected[(self.user.pk, 'AED')], Decimal('-40.00'))
+        self.assertEqual(expected[(self.other.pk, 'USD')], Decimal('10.00'))
+
+    def test_transfer_requires_funds_and_rate(self):
+        self.assertEqual(self.send(amount_sent='150.00').status_code, 400)
+        self.assertEqual(self.send(currency_received='JPY').status_code, 400)
+        self.assertEqual(self.send(recipient_id=self.user.pk).status_code, 400)
+        self.assertFalse(TransferTransaction.objects.exists())
+
+    def test_receive_money_cannot_drain_the_recipient(self):
+        response = self.send(transaction_type='receive_money', amount_sent='100.00')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('transaction_type', response.data)
+        self.assertFalse(TransferTransaction.objects.exists())
+        self.assertEqual(ledger.get_balance(self.other.pk), Decimal('100.00'))
+        self.assertEqual(ledger.get_balance(self.user.pk), Decimal('100.00'))
+
+    def test_transfers_are_immutable(self):
+        pk = self.send().data['id']
+        self.assertEqual(self.client.delete(f'/api/transfers/{pk}/').status_code, 405)
+
+    def test_inbox_merges_sent_and_received_with_one_query(self):
+        other_client = APIClient()
+        other_client.force_authenticate(self.other)
+        for index in range(3):
+            self.send(amount_sent=f'{index + 1}.00')
+            self.send(client=other_client, card_id=self.other_card.pk, recipient_id=self.user.pk, amount_sent=f'{index + 10}.00')
+        self.client.get('/api/transfers/inbox/')  # تسخين كاش الصلاحيات
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/transfers/inbox/', {'page_size': 4})
+        self.assertEqual(len(queries), 1)
+        self.assertIn('UNION', queries[0]['sql'])
+
+        results = response.data['results']
+        self.assertEqual([row['direction'] for row in results], ['received', 'sent', 'received', 'sent'])
+        self.assertEqual([row['amount_sent'] for row in results], ['12.00', '3.00', '11.00', '2.00'])
+
+        response = self.client.get(response.data['next'])
+        self.assertEqual([row['amount_sent'] for row in response.data['results']], ['10.00', '1.00'])
+        self.assertIsNone(response.data['next'])
+
+    def test_inbox_rejects_bad_cursor(self):
+        self.assertEqual(self.client.get('/api/transfers/inbox/', {'before': 'nope'}).status_code, 400)
+        # صيغة صحيحة وتاريخ غير موجود
+        self.assertEqual(self.client.get('/api/transfers/inbox/', {'before': '2024-13-01T00:00:00~5'}).status_code, 400)
+
+
+class StatementExportTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='statement', email='statement@example.com', status='verified')
+        other = User.objects.create(username='stranger', email='stranger@example.com', status='verified')
+        card = CardDetail.objects.create(user=cls.user, last_four='4242', expiry='12/30', cardholder_name='Statement')
+        for day, amount in ((1, '10.50'), (15, '20.00'), (31, '30.00')):
+            Transaction.objects.create(
+                user=cls.user, card=card, transaction_type='deposit', amount=Decimal(amount),
+                timestamp=timezone.make_aware(timezone.datetime(2024, 1, day, 12)),
+            )
+        Transaction.objects.create(user=other, card=card, transaction_type='deposit', amount=Decimal('99.00'))
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def export(self, **params):
+        response = self.client.get('/api/transactions/statement/', params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode('utf-8-sig')
+
+    def test_csv_export_filters_by_date_range(self):
+        response, body = self.export(**{'from': '2024-01-01', 'to': '2024-01-15'})
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+
+        rows = list(csv.DictReader(io.StringIO(body)))
+        self.assertEqual([row['amount'] for row in rows], ['10.50', '20.00'])
+        self.assertEqual(list(rows[0]), list(statements.COLUMNS))
+
+    def test_ndjson_export(self):
+        _, body = self.export(**{'as': 'ndjson'})
+        records = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual([record['amount'] for record in records], ['10.50', '20.00', '30.00'])
+        self.assertIsNone(records[0]['recipient_id'])
+
+    def test_invalid_parameters(self):
+        for params in ({'as': 'xml'}, {'from': '2024-02-30'}, {'from': '2024-02-01', 'to': '2024-01-01'}):
+            self.assertEqual(self.client.get('/api/transactions/statement/', params).status_code, 400)
+
+    def test_generator_follows_the_request_handler(self):
+        # إعداد SERVER_MODE لا يغيّر شيئاً: WSGI مولّد متزامن و ASGI مولّد غير متزامن
+        with override_settings(SERVER_MODE='asgi'):
+            response, _ = self.export()
+        self.assertFalse(response.is_async)
+
+        async def fetch():
+            token = (await ATMRefreshToken.afor_user(self.user)).access_token
+            response = await AsyncClient().get(
+                '/api/transactions/statement/', headers={'Authorization': f'Bearer {token}'},
+            )
+            return response, b''.join([chunk async for chunk in response.streaming_content])
+
+        with override_settings(SERVER_MODE='wsgi'):
+            response, body = async_to_sync(fetch)()
+        self.assertTrue(response.is_async)
+        self.assertEqual(body.decode('utf-8-sig').count('\n'), 4)
+
+    def test_async_stream_matches_sync_stream(self):
+        async def collect():
+            return [line async for line in statements.astream(self.user.id, 'csv')]
+
+        self.assertEqual(async_to_sync(collect)(), list(statements.stream(self.user.id, 'csv')))
+
+
+class UserSearchTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create(username='backoffice', email='backoffice@example.com', status='verified')
+        Employee.objects.create(user=cls.admin, role='admin')
+        cls.customer = User.objects.create(
+            username='fatima', email='Fatima.Ali@Example.com', first_name='Fatima', last_name='Ali',
+            emirates_id='784-1995-1234567-1', passport='n1234567', phone_number='+971 50 123 4567',
+        )
+        User.objects.create(username='omar', email='omar@example.com', phone_number='050-765-4321')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+
+    def ids(self, **params):
+        response = self.client.get('/api/users/', params)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.data['results']]
+
+    def test_exact_lookups_accept_any_formatting(self):
+        self.assertEqual(self.ids(emirates_id='784199512345671'), [self.customer.pk])
+        self.assertEqual(self.ids(emirates_id='784-1995-1234567-1'), [self.customer.pk])
+        self.assertEqual(self.ids(phone='971501234567'), [self.customer.pk])
+        self.assertEqual(self.ids(passport='N1234567'), [self.customer.pk])
+        self.assertEqual(self.ids(email='fatima.ali@example.com'), [self.customer.pk])
+        self.assertEqual(self.ids(emirates_id='784199500000000'), [])
+
+    def test_status_save_on_light_user_loads_nothing(self):
+        from .authentication import _light_user
+
+        user = _light_user(self.customer.pk, self.customer.email, 'pending')
+        user.status = 'verified'
+        with CaptureQueriesContext(connection) as queries:
+            user.save(update_fields=['status'])
+        # لا تحميل للحقول المؤجلة ولا قراءة للحالة السابقة؛ فقط التحديث وإبطال الرموز
+        self.assertFalse([query for query in queries if query['sql'].startswith('SELECT') and 'core_user' in query['sql']])
+        self.assertTrue(user._status_changed)
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.status, 'verified')
+        self.assertEqual(self.ids(passport='N1234567'), [self.customer.pk])
+
+    def test_partial_search(self):
+        self.assertEqual(self.ids(search='1995-1234'), [self.customer.pk])
+        self.assertEqual(self.ids(search='fatima ali'), [self.customer.pk])
+        self.assertEqual(self.ids(search='765 4321'), [User.objects.get(username='omar').pk])
+
+        with CaptureQueriesContext(connection) as queries:
+            self.ids(search='example.com')
+        if connection.vendor == 'sqlite' and user_search.fts_enabled():
+            self.assertTrue(any(user_search.FTS_TABLE in query['sql'] for query in queries))
+
+    def test_index_follows_updates_and_deletes(self):
+        self.customer.phone_number = '+971 55 999 0000'
+        self.customer.save(update_fields=['phone_number'])
+        self.assertEqual(self.ids(search='5599900'), [self.customer.pk])
+        self.assertEqual(self.ids(search='501234567'), [])
+
+        self.customer.delete()
+        self.assertEqual(self.ids(search='fatima'), [])
+
+    def test_short_search_is_rejected(self):
+        self.assertEqual(self.client.get('/api/users/', {'search': 'ab'}).status_code, 400)
+
+    def test_rebuild_command(self):
+        User.objects.filter(pk=self.customer.pk).update(phone_number='0501112222', phone_digits='', search_text='')
+        call_command('rebuild_user_search', stdout=io.StringIO())
+        self.assertEqual(self.ids(phone='0501112222'), [self.customer.pk])
+        self.assertEqual(self.ids(search='1112222'), [self.customer.pk])
+
+
+class DeliveryGeoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dispatcher = User.objects.create(username='dispatch', email='dispatch@example.com', status='verified')
+        Employee.objects.create(user=cls.dispatcher, role='staff')
+        cls.customer = User.objects.create(username='geo-customer', email='geo-customer@example.com', status='verified')
+        cls.pending = Transaction.objects.create(user=cls.customer, transaction_type='withdrawal', amount=100)
+        completed = Transaction.objects.create(user=cls.customer, transaction_type='withdrawal', amount=100, status='completed')
+        # حول دبي: ~0 و ~1.1 و ~3.3 و ~22 كم من نقطة البحث
+        cls.points = {
+            'here': (cls.pending, '25.204800', '55.270800'),
+            'near': (cls.pending, '25.214800', '55.270800'),
+            'mid': (cls.pending, '25.234800', '55.270800'),
+            'far': (cls.pending, '25.404800', '55.270800'),
+            'done': (completed, '25.204900', '55.270900'),
+        }
+        cls.locations = {
+            name: DeliveryLocation.objects.create(
+                transaction=tx, building_type='villa', address=name, latitude=lat, longitude=lon,
+            )
+            for name, (tx, lat, lon) in cls.points.items()
+        }
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.dispatcher)
+
+    def addresses(self, path, **params):
+        response = self.client.get(path, {'lat': '25.2048', 'lon': '55.2708', **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['address'] for row in response.data['results']]
+
+    def test_grid_cell_maintained_on_save(self):
+        location = self.locations['near']
+        self.assertEqual(location.grid_cell, geo.cell_for(location.latitude, location.longitude))
+
+        location.latitude = Decimal('-33.868800')
+        location.save(update_fields=['latitude'])
+        location.refresh_from_db()
+        self.assertEqual(location.grid_cell, geo.cell_for('-33.868800', location.longitude))
+
+    def test_grid_cell_assigned_by_bulk_paths(self):
+        card = CardDetail.objects.create(user=self.customer, last_four='4242', expiry='12/30', cardholder_name='Geo')
+        self.client.force_authenticate(self.customer)
+        response = self.client.post('/api/transactions/', {
+            'transaction_type': 'withdrawal', 'amount': '50.00', 'currency_to': 'AED', 'card_id': card.pk,
+            'delivery_locations': [{'building_type': 'office', 'address': 'bulk', 'latitude': '24.453900', 'longitude': '54.377300'}],
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        location = DeliveryLocation.objects.get(address='bulk')
+        self.assertEqual(location.grid_cell, geo.cell_for('24.453900', '54.377300'))
+
+    def test_nearby_radius(self):
+        self.assertEqual(self.addresses('/api/delivery/nearby/'), ['here', 'near', 'mid'])
+        self.assertEqual(self.addresses('/api/delivery/nearby/', radius_km=2), ['here', 'near'])
+        self.assertEqual(self.addresses('/api/delivery/nearby/', radius_km=2, status='completed'), ['done'])
+
+    def test_nearest_order(self):
+        self.assertEqual(self.addresses('/api/delivery/nearest/', k=2), ['here', 'near'])
+        self.assertEqual(self.addresses('/api/delivery/nearest/', k=4), ['here', 'near', 'mid', 'far'])
+
+        response = self.client.get('/api/delivery/nearest/', {'lat': '25.2048', 'lon': '55.2708', 'k': 2})
+        self.assertEqual(response.data['results'][1]['transaction_id'], self.pending.pk)
+        self.assertAlmostEqual(response.data['results'][1]['distance_km'], 1.112, places=2)
+
+    def test_cell_ranges_wrap_at_antimeridian(self):
+        box = geo.bounding_box(0, 179.999, 5)
+        self.assertLess(box[2], 180)
+        self.assertGreater(box[3], 180)
+        location = DeliveryLocation.objects.create(
+            transaction=self.pending, building_type='ship', address='wrap', latitude='0', longitude='-179.999000',
+        )
+        self.assertEqual([row['id'] for row, _ in geo.within(DeliveryLocation.objects.all(), 0, 179.999, 5)], [location.pk])
+
+    def test_invalid_parameters_and_permissions(self):
+        for params in ({'lat': '91', 'lon': '0'}, {'lat': 'x', 'lon': '0'}, {'lat': '0', 'lon': '0', 'radius_km': '1000'},
+                       {'lat': '0', 'lon': '0', 'status': 'lost'}):
+            self.assertEqual(self.client.get('/api/delivery/nearby/', params).status_code, 400)
+        self.assertEqual(self.client.get('/api/delivery/nearest/', {'lat': '0', 'lon': '0', 'k': '0'}).status_code, 400)
+
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/delivery/nearby/', {'lat': '0', 'lon': '0'}).status_code, 403)
+
+
+class RoutePlannerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.dispatcher = User.objects.create(username='routes', email='routes@example.com', status='verified')
+        Employee.objects.create(user=cls.dispatcher, role='admin')
+        cls.customer = User.objects.create(username='routes-customer', email='routes-customer@example.com')
+        cls.day = date(2030, 1, 15)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.dispatcher)
+
+    def schedule(self, latitude, longitude, at, status='pending', day=None):
+        tx = Transaction.objects.create(user=self.customer, transaction_type='withdrawal', amount=100, status=status)
+        DeliveryLocation.objects.create(
+            transaction=tx, building_type='villa', address=f'{latitude},{longitude}',
+            latitude=latitude, longitude=longitude,
+        )
+        return DeliverySchedule.objects.create(
+            transaction=tx, delivery_type='scheduled', scheduled_date=day or self.day, scheduled_time=at,
+        )
+
+    def test_nearest_neighbour_matches_brute_force(self):
+        rng = random.Random(7)
+        points = [(rng.uniform(0, 40), rng.uniform(0, 40)) for _ in range(300)]
+        order = route_planner.nearest_neighbour(points, (-50, -50))
+
+        remaining, position, expected = set(range(len(points))), (-50, -50), []
+        while remaining:
+            index = min(remaining, key=lambda i: math.dist(points[i], position))
+            remaining.remove(index)
+            expected.append(index)
+            position = points[index]
+        self.assertEqual(order, expected)
+
+    def test_two_opt_removes_crossing(self):
+        crossed = [(0, 0), (0, 1), (1, 0), (1, 1)]
+        self.assertEqual(route_planner.two_opt(crossed, passes=5), [(0, 0), (0, 1), (1, 1), (1, 0)])
+
+    def test_load_and_plan(self):
+        # نفس النافذة والمنطقة، بترتيب زمني معاكس للمكان
+        far = self.schedule('25.211000', '55.270000', time(9, 0))
+        near = self.schedule('25.212000', '55.270000', time(9, 30))
+        middle = self.schedule('25.226000', '55.270000', time(9, 45))
+        later = self.schedule('25.212000', '55.270000', time(14, 0))
+        self.schedule('25.210000', '55.270000', time(9, 0), status='completed')
+        self.schedule('25.210000', '55.270000', time(9, 0), day=date(2030, 1, 16))
+        orphan = DeliverySchedule.objects.create(
+            transaction=Transaction.objects.create(user=self.customer, transaction_type='withdrawal', amount=1),
+            delivery_type='scheduled', scheduled_date=self.day, scheduled_time=time(9, 0),
+        )
+        # أحدث موقع للمعاملة هو المستخدم
+        DeliveryLocation.objects.create(
+            transaction=far.transaction, building_type='villa', address='moved', latitude='25.242000', longitude='55.270000',
+        )
+
+        stops, unplanned = route_planner.load_stops(self.day)
+        self.assertEqual(unplanned, [orphan.pk])
+        self.assertEqual(len(stops), 4)
+
+        routes = route_planner.plan(stops, window_minutes=120, depot=(25.19, 55.27))
+        self.assertEqual([route['window_start'] for route in routes], ['08:00', '14:00'])
+        self.assertEqual([stop.schedule_id for stop in routes[0]['stops']], [near.pk, middle.pk, far.pk])
+        self.assertEqual([stop.schedule_id for stop in routes[1]['stops']], [later.pk])
+        self.assertAlmostEqual(routes[0]['distance_km'], 5.79, places=1)
+
+        split = route_planner.plan(stops, window_minutes=120, max_stops=2)
+        self.assertEqual([len(route['stops']) for route in split], [2, 1, 1])
+
+    def test_routes_endpoint(self):
+        self.schedule('25.210000', '55.270000', time(9, 0))
+        response = self.client.get('/api/delivery/routes/', {'date': '2030-01-15', 'depot_lat': '25.2', 'depot_lon': '55.27'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['stops'], 1)
+        self.assertEqual(response.data['routes'][0]['stops'][0]['scheduled_time'], '09:00')
+
+        for params in ({}, {'date': '2030-02-30'}, {'date': '2030-01-15', 'max_stops': '0'},
+                       {'date': '2030-01-15', 'depot_lat': '25.2'}):
+            self.assertEqual(self.client.get('/api/delivery/routes/', params).status_code, 400)
+
+        self.client.force_authenticate(self.customer)
+        self.assertEqual(self.client.get('/api/delivery/routes/', {'date': '2030-01-15'}).status_code, 403)
+
+    def test_plan_routes_command(self):
+        self.schedule('25.210000', '55.270000', time(9, 0))
+        out = io.StringIO()
+        call_command('plan_routes', '--date', '2030-01-15', '--json', stdout=out)
+        self.assertEqual(len(json.loads(out.getvalue())['routes']), 1)
+
+
+@override_settings(DELIVERY_SLOTS={'DEFAULT_CAPACITY': 2})
+class DeliverySlotTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='slots', email='slots@example.com', status='verified')
+        cls.card = CardDetail.objects.create(user=cls.user, last_four='4242', expiry='12/30', cardholder_name='Slots')
+        cls.region = slots.region_for('25.204800', '55.270800')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def item(self, at='10:15', day='2030-01-15'):
+        return {
+            'transaction_type': 'withdrawal', 'amount': '10.00', 'card_id': self.card.pk,
+            'delivery_locations': [{'building_type': 'villa', 'latitude': '25.204800', 'longitude': '55.270800', 'address': 'Dubai'}],
+            'delivery_schedules': [{'delivery_type': 'scheduled', 'scheduled_date': day, 'scheduled_time': at}],
+        }
+
+    def booked(self, at=time(10), day=date(2030, 1, 15)):
+        return DeliverySlot.objects.get(date=day, slot=at, region=self.region).booked
+
+    def test_full_slot_rejects_transaction_atomically(self):
+        for _ in range(2):
+            self.assertEqual(self.client.post('/api/transactions/start/', self.item(), format='json').status_code, 201)
+        response = self.client.post('/api/transactions/start/', self.item('10:45'), format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Transaction.objects.count(), 2)
+        self.assertEqual(self.booked(), 2)
+        # فترة أخرى ما زالت متاحة
+        self.assertEqual(self.client.post('/api/transactions/start/', self.item('11:00'), format='json').status_code, 201)
+
+    def test_batch_rejects_only_items_over_capacity(self):
+        items = [self.item(), self.item('11:00'), self.item('10:30'), self.item('10:59')]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post('/api/transactions/batch/', items, format='json')
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual([result['status'] for result in response.data['results']], ['created', 'created', 'created', 'failed'])
+        self.assertIn('delivery_schedules', response.data['results'][3]['errors'])
+        self.assertEqual((self.booked(), self.booked(time(11))), (2, 1))
+        self.assertEqual(DeliverySchedule.objects.filter(slot__isnull=False).count(), 3)
+        self.assertFalse(any('count(' in query['sql'].lower() for query in queries))
+
+    def test_schedule_viewset_books_moves_and_releases(self):
+        tx = Transaction.objects.create(user=self.user, transaction_type='withdrawal', amount=10)
+        DeliveryLocation.objects.create(transaction=tx, building_type='villa', address='Dubai', latitude='25.204800', longitude='55.270800')
+        payload = {'transaction_id': tx.pk, 'delivery_type': 'scheduled', 'scheduled_date': '2030-01-15', 'scheduled_time': '10:00'}
+        for _ in range(2):
+            self.assertEqual(self.client.post('/api/delivery-schedules/', payload, format='json').status_code, 201)
+        self.assertEqual(self.client.post('/api/delivery-schedules/', payload, format='json').status_code, 400)
+
+        schedule = DeliverySchedule.objects.filter(transaction=tx).first()
+        response = self.client.patch(f'/api/delivery-schedules/{schedule.pk}/', {'scheduled_time': '12:30'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((self.booked(), self.booked(time(12))), (1, 1))
+
+        self.client.delete(f'/api/delivery-schedules/{schedule.pk}/')
+        self.assertEqual(self.booked(time(12)), 0)
+
+        other = User.objects.create(username='slots-other', email='slots-other@example.com')
+        foreign = Transaction.objects.create(user=other, transaction_type='withdrawal', amount=10)
+        response = self.client.post('/api/delivery-schedules/', {**payload, 'transaction_id': foreign.pk}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_cancelled_transaction_releases_slot(self):
+        self.client.post('/api/transactions/start/', self.item(), format='json')
+        tx = Transaction.objects.get()
+        tx.status = 'cancelled'
+        tx.save(update_fields=['status'])
+        self.assertEqual(self.booked(), 0)
+        self.assertIsNone(DeliverySchedule.objects.get().slot_id)
+
+        self.client.post('/api/transactions/start/', self.item(), format='json')
+        Transaction.objects.exclude(pk=tx.pk).delete()
+        self.assertEqual(self.booked(), 0)
+
+    def test_availability(self):
+        self.client.post('/api/transactions/start/', self.item(), format='json')
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/delivery/slots/', {'date': '2030-01-15', 'lat': '25.2048', 'lon': '55.2708'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        self.assertEqual(response.data['region'], self.region)
+        by_slot = {row['slot']: row for row in response.data['slots']}
+        self.assertEqual(by_slot['10:00'], {'slot': '10:00', 'capacity': 2, 'booked': 1, 'available': 1})
+        self.assertEqual(by_slot['08:00']['available'], 2)
+        self.assertEqual(len(by_slot), 14)
+        self.assertEqual(self.client.get('/api/delivery/slots/', {'date': 'x'}).status_code, 400)
+
+    def test_reconcile_command(self):
+        self.client.post('/api/transactions/start/', self.item(), format='json')
+        DeliverySlot.objects.update(booked=0)
+        out = io.StringIO()
+        call_command('reconcile_delivery_slots', '--fix', stdout=out)
+        self.assertIn('mismatched=1', out.getvalue())
+        self.assertEqual(self.booked(), 1)
+
+
+class DeliverySlotLoadTests(TransactionTestCase):
+
+    # بدون كتّاب متزامنين (SQLite) لا يتسابق أي حجزين: يعمل على PostgreSQL فقط
+    @skipUnlessDBFeature('has_select_for_update')
+    def test_concurrent_bookings_never_overbook(self):
+        out = io.StringIO()
+        call_command(
+            'bench_slots', '--requests', '30', '--capacity', '10', '--schedules', '100', '--iterations', '2',
+            '--concurrency', '8', stdout=out, stderr=io.StringIO(),
+        )
+        self.assertIn('ok:', out.getvalue())
+
+
+class ResponseCacheTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='poller', email='poller@example.com', status='verified')
+        cls.card = CardDetail.objects.create(user=cls.user, last_four='4242', expiry='12/30', cardholder_name='Poller')
+        cls.tx = Transaction.objects.create(user=cls.user, card=cls.card, transaction_type='withdrawal', amount=10)
+
+    def setUp(self):
+        permission_cache.clear()
+        self.client = APIClient()
+        token = ATMRefreshToken.for_user(self.user).access_token
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def get(self, path, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get(path, **headers)
+
+    def test_unchanged_poll_is_304_without_queries(self):
+        for path in ('/api/cards/', '/api/transactions/', '/api/delivery-locations/', '/api/delivery-schedules/'):
+            first = self.get(path)
+            self.assertEqual(first.status_code, 200)
+            with self.assertNumQueries(0):
+                response = self.get(path, first['ETag'])
+            self.assertEqual(response.status_code, 304)
+            self.assertEqual(response['ETag'], first['ETag'])
+            # بدون If-None-Match: نفس الحمولة من الكاش
+            with self.assertNumQueries(0):
+                self.assertEqual(self.get(path).data, first.data)
+
+    def test_writes_change_the_etag(self):
+        etag = self.get('/api/transactions/')['ETag']
+        self.client.patch(f'/api/transactions/{self.tx.pk}/', {'amount': '25.00'}, format='json')
+        response = self.get('/api/transactions/', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'][0]['amount'], '25.00')
+
+        etag = response['ETag']
+        DeliveryLocation.objects.create(
+            transaction=self.tx, building_type='villa', address='Dubai', latitude='25.2', longitude='55.27',
+        )
+        response = self.get('/api/transactions/', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.data['results'][0]['delivery_locations']), 1)
+
+        etag = self.get('/api/cards/')['ETag']
+        self.card.delete()
+        self.assertEqual(self.get('/api/cards/', etag).data, [])
+
+    def test_bulk_paths_change_the_etag(self):
+        etag = self.get('/api/transactions/')['ETag']
+        self.client.post('/api/transactions/batch/', [{
+            'transaction_type': 'deposit', 'amount': '5.00', 'card_id': self.card.pk, 'currency_to': 'AED',
+        }], format='json')
+        self.assertEqual(len(self.get('/api/transactions/', etag).data['results']), 2)
+
+        etag = self.get('/api/transactions/')['ETag']
+        Transaction.objects.filter(pk=self.tx.pk).update(exchange_rate=None, currency_from='AED', currency_to='USD')
+        rates.record_rates({('AED', 'USD'): Decimal('0.2723')})
+        rates.fill_transaction_rates([self.tx.pk])
+        self.assertEqual(self.get('/api/transactions/', etag).status_code, 200)
+
+    def test_etag_is_per_user_and_per_url(self):
+        etag = self.get('/api/transactions/')['ETag']
+        self.assertNotEqual(self.get('/api/transactions/?status=pending')['ETag'], etag)
+
+        other = User.objects.create(username='other-poller', email='other-poller@example.com', status='verified')
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {ATMRefreshToken.for_user(other).access_token}')
+        response = self.get('/api/transactions/', etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
+
+
+class TransactionStatusEventsTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='watcher', email='watcher@example.com', status='verified')
+        cls.tx = Transaction.objects.create(user=cls.user, transaction_type='withdrawal', amount=10)
+        cls.done = Transaction.objects.create(
+            user=cls.user, transaction_type='deposit', amount=5, status='completed',
+        )
+
+    def complete(self, pk):
+        with self.captureOnCommitCallbacks(execute=True):
+            transaction = Transaction.objects.only('id', 'user_id', 'status').get(pk=pk)
+            transaction.status = 'completed'
+            transaction.save(update_fields=['status'])
+        return transaction
+
+    def test_status_change_is_published_after_commit_without_extra_queries(self):
+        broker = mock.Mock()
+        with mock.patch.object(status_events, 'get_broker', return_value=broker):
+            transaction = Transaction.objects.only('id', 'user_id', 'status').get(pk=self.tx.pk)
+            transaction.status = 'completed'
+            with self.captureOnCommitCallbacks() as callbacks, self.assertNumQueries(1):
+                transaction.save(update_fields=['status'])
+            broker.publish.assert_not_called()
+            for callback in callbacks:
+                callback()
+
+        user_id, event = broker.publish.call_args.args
+        self.assertEqual(user_id, self.user.pk)
+        self.assertEqual((event['id'], event['status'], event['previous']), (self.tx.pk, 'completed', 'pending'))
+        # updated_at يُحفظ مع الحالة: هو معرّف الحدث وشرط snapshot بعد إعادة الاتصال
+        self.tx.refresh_from_db()
+        self.assertEqual(self.tx.updated_at, event['updated_at'])
+
+    def test_unchanged_status_and_creates_are_not_published(self):
+        broker = mock.Mock()
+        with mock.patch.object(status_events, 'get_broker', return_value=broker):
+            self.complete(self.done.pk)
+            with self.captureOnCommitCallbacks(execute=True):
+                Transaction.objects.create(user=self.user, transaction_type='deposit', amount=1)
+                transaction = Transaction.objects.get(pk=self.tx.pk)
+                transaction.amount = 20
+                transaction.save(update_fields=['amount'])
+        broker.publish.assert_not_called()
+
+    def test_snapshot_after_last_event_id(self):
+        before = timezone.now()
+        self.complete(self.tx.pk)
+        rows = list(status_events.snapshot_queryset(self.user.pk, before.isoformat()))
+        self.assertEqual([(row['id'], row['status']) for row in rows], [(self.tx.pk, 'completed')])
+        self.assertEqual(list(status_events.snapshot_queryset(self.user.pk, 'garbage')), [])
+
+    def test_wsgi_request_is_rejected(self):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {ATMRefreshToken.for_user(self.user).access_token}')
+        self.assertEqual(client.get('/api/transactions/events/').status_code, 501)
+
+    async def test_event_stream_under_async_client(self):
+        token = (await ATMRefreshToken.afor_user(self.user)).access_token
+        response = await AsyncClient().get('/api/transactions/events/', headers={'Authorization': f'Bearer {token}'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = response.streaming_content.__aiter__()
+        self.assertEqual(await events.__anext__(), b'retry: 3000\n\n')
+
+        snapshot = (await events.__anext__()).decode()
+        self.assertTrue(snapshot.startswith('event: snapshot\nid: '))
+        self.assertEqual(
+            [row['id'] for row in json.loads(snapshot.split('data: ', 1)[1])], [self.tx.pk],
+        )
+
+        await sync_to_async(self.complete)(self.tx.pk)
+        event = (await asyncio.wait_for(events.__anext__(), 5)).decode()
+        self.assertTrue(event.startswith('event: status\n'))
+        self.assertEqual(json.loads(event.split('data: ', 1)[1])['status'], 'completed')
+        await events.aclose()
+
+    @override_settings(STATUS_EVENTS={'QUEUE_SIZE': 1, 'KEEPALIVE': 0.01})
+    async def test_stream_keepalive_overflow_and_unsubscribe(self):
+        broker = status_events.LocalBroker(status_events.get_config())
+        subscription = broker.subscribe(self.user.pk)
+        with mock.patch.object(status_events, 'get_broker', return_value=broker):
+            stream = status_events.stream(subscription, [], timezone.now())
+            self.assertEqual([await stream.__anext__() for _ in range(3)][2], ': keepalive\n\n')
+
+            event = {'id': self.tx.pk, 'status': 'completed', 'previous': 'pending', 'updated_at': timezone.now()}
+            broker.publish(self.user.pk, event)
+            broker.publish(self.user.pk, event)
+            await asyncio.sleep(0)
+            # عميل متأخر: يُغلق التدفق ليعيد الاتصال ويأخذ snapshot
+            self.assertEqual([chunk async for chunk in stream], [])
+        self.assertEqual(broker.subscriber_count(), 0)
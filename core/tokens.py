@@ -0,0 +1,39 @@
+from django.db.models import F
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import TokenVersion
+from .permission_cache import aget_principal, get_principal, invalidate
+
+
+class ATMRefreshToken(RefreshToken):
+    """
+    رمز JWT يحمل حالة المستخدم ودوره وإصدار الإبطال (rev).
+    تنتقل هذه الـ claims إلى access token، فلا يحتاج التحقق إلى تحميل المستخدم.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        return cls._with_claims(super().for_user(user), user, get_principal(user.id))
+
+    @classmethod
+    async def afor_user(cls, user):
+        return cls._with_claims(super().for_user(user), user, await aget_principal(user.id))
+
+    @staticmethod
+    def _with_claims(token, user, principal):
+        principal = principal or {}
+        token['email'] = user.email
+        token['status'] = user.status
+        token['role'] = principal.get('role')
+        token['rev'] = principal.get('rev', 0)
+        return token
+
+
+def revoke_tokens(user_id):
+    """
+    يزيد إصدار رموز المستخدم، فتُرفض كل الرموز الصادرة قبل ذلك.
+    """
+    updated = TokenVersion.objects.filter(user_id=user_id).update(version=F('version') + 1)
+    if not updated:
+        TokenVersion.objects.get_or_create(user_id=user_id, defaults={'version': 1})
+    invalidate(user_id)
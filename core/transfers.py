@@ -0,0 +1,74 @@
+"""
+تنفيذ التحويلات بين المستخدمين.
+
+كل تحويل يقفل صفوف رصيد المرسل والمستلم (Balance) بترتيب ثابت (user_id ثم العملة)،
+فلا يحدث deadlock بين تحويلين متعاكسين، ثم يتحقق من الرصيد دائماً (بغض النظر عن
+LEDGER['ENFORCE_FUNDS'])، ويكتب المعاملة في نفس المعاملة. طلبان متزامنان من نفس المرسل
+يُنفّذان تباعاً، فلا يمكن صرف نفس الرصيد مرتين.
+"""
+from django.db import connections, models, transaction as db_transaction
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from . import ledger
+from .models import TransferTransaction
+
+TRANSFER_TYPES = ('send_money', 'receive_money')
+
+
+def is_transfer(transaction):
+    return transaction.transaction_type in TRANSFER_TYPES
+
+
+def execute(transaction):
+    """
+    قفل الأرصدة والتحقق منها ثم إدراج المعاملة (Transaction أو TransferTransaction). يرفع ledger.InsufficientFunds
+    ويلغي كل شيء إذا لم يكفِ رصيد الطرف المدين، و ledger.ForeignDebit إذا لم يكن الدافع صاحب المعاملة.
+    """
+    ledger.check_payer(transaction)
+    with db_transaction.atomic():
+        ledger.apply([transaction], enforce_funds=True)
+        transaction.save(force_insert=True)
+    return transaction
+
+
+def _direction(value):
+    return models.Value(value, output_field=models.CharField())
+
+
+def inbox(user_id, before=None, limit=50):
+    """
+    التحويلات المرسلة والمستلمة معاً، الأحدث أولاً، في استعلام UNION واحد:
+    كل فرع يمشي على فهرسه ((user, created_at) أو (recipient, created_at)) بدلاً من مسح الجدول بـ OR.
+    before: (created_at, id) آخر عنصر في الصفحة السابقة.
+    """
+    sent = TransferTransaction.objects.filter(user_id=user_id).annotate(direction=_direction('sent'))
+    received = TransferTransaction.objects.filter(recipient_id=user_id).exclude(user_id=user_id).annotate(
+        direction=_direction('received')
+    )
+    if before is not None:
+        created_at, pk = before
+        after_cursor = Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        sent, received = sent.filter(after_cursor), received.filter(after_cursor)
+
+    ordering = ('-created_at', '-id')
+    if connections[sent.db].features.supports_slicing_ordering_in_compound:
+        # PostgreSQL: أعلى limit من كل فرع ثم الدمج
+        sent, received = sent.order_by(*ordering)[:limit], received.order_by(*ordering)[:limit]
+    return list(sent.union(received, all=True).order_by(*ordering)[:limit])
+
+
+def cursor_for(transfer):
+    return f"{transfer.created_at.isoformat()}~{transfer.pk}"
+
+
+def parse_cursor(value):
+    created_at, _, pk = value.rpartition('~')
+    try:
+        created_at = parse_datetime(created_at) if created_at else None
+    except ValueError:
+        # صيغة صحيحة وتاريخ غير موجود (الشهر 13 مثلاً)
+        return None
+    if created_at is None or not pk.isdigit():
+        return None
+    return created_at, int(pk)
@@ -4,21 +4,30 @@ from .views import *
 
 router = DefaultRouter()
 router.register(r'users', UserViewSet)
-router.register(r'cards', CardDetailViewSet)
-router.register(r'transactions', TransactionViewSet)
-router.register(r'transfers', TransferTransactionViewSet)
-router.register(r'delivery-locations', DeliveryLocationViewSet)
-router.register(r'delivery-schedules', DeliveryScheduleViewSet)
+router.register(r'cards', CardDetailViewSet, basename='carddetail')
+router.register(r'transactions', TransactionViewSet, basename='transaction')
+router.register(r'transfers', TransferTransactionViewSet, basename='transfertransaction')
+router.register(r'delivery-locations', DeliveryLocationViewSet, basename='deliverylocation')
+router.register(r'delivery-schedules', DeliveryScheduleViewSet, basename='deliveryschedule')
 
 
 urlpatterns = [
+    # قبل الـ router حتى لا يُطابق transactions/<pk>/
+    path('transactions/events/', TransactionEventsView.as_view(), name='transaction-events'),
     path('', include(router.urls)),
     path('login/', LoginView.as_view(), name='login'),
     path('employees/create/', EmployeeCreateView.as_view(), name='employee-create'),
     path('employees/update/<int:pk>/', EmployeeUpdateView.as_view(), name='employee-update'),
     path('employees/all/', EmployeeListView.as_view(), name='employee-list'),
     path('employees/delete/<int:pk>/', EmployeeDeleteView.as_view(), name='employee-delete'),
-    path('delivery/payment/', PaymentView.as_view(), name='payment'),
     path('delivery/verify-face-id/', FaceIDVerificationView.as_view(), name='verify-face-id'),
+    path('delivery/verify-face-id/uploads/', FaceScanUploadView.as_view(), name='face-scan-upload'),
+    path('delivery/verify-face-id/uploads/<uuid:upload_id>/', FaceScanUploadChunkView.as_view(), name='face-scan-upload-chunk'),
+    path('delivery/nearby/', DeliveryNearbyView.as_view(), name='delivery-nearby'),
+    path('delivery/nearest/', DeliveryNearestView.as_view(), name='delivery-nearest'),
+    path('delivery/routes/', DeliveryRoutesView.as_view(), name='delivery-routes'),
+    path('delivery/slots/', DeliverySlotAvailabilityView.as_view(), name='delivery-slots'),
     path('delivery/signature/', SignatureView.as_view(), name='digital-signature'),
+    path('exchange-rates/', ExchangeRateView.as_view(), name='exchange-rates'),
+    path('exchange-rates/convert/', ExchangeRateConvertView.as_view(), name='exchange-rates-convert'),
 ]
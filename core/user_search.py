@@ -0,0 +1,127 @@
+"""
+بحث الإدارة عن المستخدمين بالبريد والهوية الإماراتية والجواز والهاتف.
+
+- حقول مطبّعة على User (أرقام فقط للهوية والهاتف، أحرف كبيرة للجواز) بفهارس btree للمطابقة التامة.
+- search_text: نص واحد يجمع الحقول، للبحث الجزئي:
+    PostgreSQL -> فهرس GIN بـ pg_trgm (LIKE '%...%' يستخدم الفهرس)
+    SQLite     -> جدول FTS5 بمقسّم trigram (core_user_fts)، يُحدّث من core/signals.py
+    غير ذلك    -> LIKE عادي (مسح كامل)
+
+هذه الوحدة لا تستورد النماذج (core/models.py يستوردها لحساب الحقول عند الحفظ).
+"""
+import re
+
+from django.db import connections
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'core_user_fts'
+MIN_TERM_LENGTH = 3
+
+# الحقول التي يُشتق منها الفهرس، والحقول المشتقة
+SOURCE_FIELDS = frozenset({'email', 'username', 'first_name', 'last_name', 'emirates_id', 'passport', 'phone_number'})
+DERIVED_FIELDS = frozenset({'emirates_id_digits', 'phone_digits', 'passport_key', 'search_text'})
+
+_NUMBER_RE = re.compile(r'^[\d\s()+-]+$')
+_fts_enabled = {}
+
+
+def digits(value):
+    return ''.join(ch for ch in (value or '') if ch.isdigit())
+
+
+def passport_key(value):
+    return re.sub(r'[^0-9A-Z]', '', (value or '').upper())
+
+
+def normalize_term(term):
+    """أرقام بفواصل (784-1995-..., +971 50 ...) تصبح أرقاماً فقط، وغير ذلك بأحرف صغيرة."""
+    term = term.strip()
+    if _NUMBER_RE.match(term):
+        return digits(term)
+    return term.lower()
+
+
+def prepare(user):
+    """حساب الحقول المشتقة على الكائن (قبل save أو bulk_create)."""
+    user.emirates_id_digits = digits(user.emirates_id)
+    user.phone_digits = digits(user.phone_number)
+    user.passport_key = passport_key(user.passport)
+    user.search_text = ' '.join(filter(None, [
+        (user.email or '').lower(),
+        (user.username or '').lower(),
+        ' '.join(filter(None, [user.first_name, user.last_name])).lower(),
+        user.emirates_id_digits,
+        user.passport_key.lower(),
+        user.phone_digits,
+    ]))
+    return user
+
+
+def fts_enabled(using='default'):
+    """هل جدول FTS5 موجود على هذا الاتصال (SQLite فقط)؛ يُحسب مرة لكل اتصال."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    if using not in _fts_enabled:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+            _fts_enabled[using] = cursor.fetchone() is not None
+    return _fts_enabled[using]
+
+
+def index_users(rows, using='default'):
+    """rows: [(user_id, search_text)]. تحديث صفوف FTS (حذف ثم إدراج)."""
+    if not rows or not fts_enabled(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(user_id,) for user_id, _ in rows])
+        cursor.executemany(f"INSERT INTO {FTS_TABLE} (rowid, search_text) VALUES (%s, %s)", rows)
+
+
+def unindex_users(user_ids, using='default'):
+    if not user_ids or not fts_enabled(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {FTS_TABLE} WHERE rowid = %s", [(user_id,) for user_id in user_ids])
+
+
+def rebuild(User, using='default', batch_size=2000):
+    """
+    إعادة حساب الحقول المشتقة وفهرس FTS لكل المستخدمين (بعد استيراد مجمّع أو queryset.update).
+    User: النموذج الحالي أو النموذج التاريخي داخل migration.
+    """
+    _fts_enabled.pop(using, None)
+    if fts_enabled(using):
+        with connections[using].cursor() as cursor:
+            cursor.execute(f"DELETE FROM {FTS_TABLE}")
+
+    total = 0
+    last_id = 0
+    while True:
+        users = list(
+            User.objects.using(using).filter(id__gt=last_id).order_by('id').only(*SOURCE_FIELDS)[:batch_size]
+        )
+        if not users:
+            break
+        last_id = users[-1].id
+        for user in users:
+            prepare(user)
+        User.objects.using(using).bulk_update(users, sorted(DERIVED_FIELDS))
+        if fts_enabled(using):
+            with connections[using].cursor() as cursor:
+                cursor.executemany(
+                    f"INSERT INTO {FTS_TABLE} (rowid, search_text) VALUES (%s, %s)",
+                    [(user.id, user.search_text) for user in users],
+                )
+        total += len(users)
+    return total
+
+
+def search(queryset, term):
+    """تصفية queryset بالبحث الجزئي. term مطبّع وطوله >= MIN_TERM_LENGTH."""
+    using = queryset.db
+    if fts_enabled(using):
+        # عبارة FTS5 بين علامتي تنصيص (مع مضاعفة أي علامة تنصيص داخلها)
+        phrase = '"' + term.replace('"', '""') + '"'
+        return queryset.filter(id__in=RawSQL(f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [phrase]))
+    return queryset.filter(search_text__contains=term)
@@ -0,0 +1,189 @@
+import hashlib
+import io
+import os
+from pathlib import Path
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.base import ContentFile
+from django.core.mail import mail_admins
+from django.db import transaction
+from django.utils import timezone
+
+from . import tasks
+from .models import VerificationArtifact
+
+DEFAULTS = {
+    # أقصى حجم لصورة التحقق بالبايت
+    'MAX_SIZE': 10 * 1024 * 1024,
+    # حجم القطعة التي تُقرأ من الطلب وتُكتب على القرص في كل مرة
+    'CHUNK_SIZE': 64 * 1024,
+    # أبعاد ونسبة ضغط النسخة المصغرة
+    'DERIVATIVE_MAX_SIDE': 512,
+    'DERIVATIVE_QUALITY': 80,
+}
+
+
+class UploadOffsetMismatch(Exception):
+    def __init__(self, offset):
+        super().__init__(offset)
+        self.offset = offset
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'VERIFICATION_UPLOADS', {})}
+
+
+def staging_path(artifact):
+    return Path(settings.MEDIA_ROOT) / 'uploads-staging' / f'{artifact.upload_id}.part'
+
+
+def write_chunk(artifact, stream, start, length):
+    """
+    كتابة قطعة من الطلب إلى ملف الرفع المؤقت بدءاً من start، دون تحميلها كاملة في الذاكرة.
+
+    يُستدعى والصف مقفول (select_for_update). يعيد عدد البايتات المكتوبة فعلاً؛
+    إذا انقطع الاتصال قبل اكتمال القطعة يبقى ما وصل محفوظاً ويستأنف العميل منه.
+    """
+    if start != artifact.received_bytes:
+        raise UploadOffsetMismatch(artifact.received_bytes)
+    if start + length > artifact.size:
+        raise UploadTooLarge
+
+    path = staging_path(artifact)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    chunk_size = get_config()['CHUNK_SIZE']
+
+    written = 0
+    with open(path, 'r+b' if path.exists() else 'wb') as fh:
+        fh.seek(start)
+        fh.truncate()
+        while written < length:
+            data = stream.read(min(chunk_size, length - written)) if stream is not None else b''
+            if not data:
+                break
+            fh.write(data)
+            written += len(data)
+
+    artifact.received_bytes = start + written
+    fields = ['received_bytes']
+    if artifact.received_bytes == artifact.size:
+        artifact.status = 'uploaded'
+        fields.append('status')
+    artifact.save(update_fields=fields)
+    if artifact.status == 'uploaded':
+        schedule_processing(artifact)
+    return written
+
+
+def store_upload(user, uploaded_file, kind='face_scan'):
+    """رفع كامل في طلب واحد: يُنسخ الملف على دفعات إلى ملف مؤقت ثم يُعالج في الخلفية."""
+    artifact = VerificationArtifact.objects.create(
+        user=user,
+        kind=kind,
+        size=uploaded_file.size,
+        content_type=getattr(uploaded_file, 'content_type', '') or '',
+    )
+    path = staging_path(artifact)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, 'wb') as fh:
+        for chunk in uploaded_file.chunks(get_config()['CHUNK_SIZE']):
+            fh.write(chunk)
+
+    artifact.received_bytes = artifact.size
+    artifact.status = 'uploaded'
+    artifact.save(update_fields=['received_bytes', 'status'])
+    schedule_processing(artifact)
+    return artifact
+
+
+def schedule_processing(artifact):
+    # صف في طابور المهام ضمن نفس المعاملة؛ ينفذه run_tasks
+    tasks.enqueue(process_artifact, artifact.pk, priority=tasks.PRIORITY_HIGH)
+
+
+def _hash_file(fh, chunk_size):
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: fh.read(chunk_size), b''):
+        digest.update(chunk)
+    fh.seek(0)
+    return digest.hexdigest()
+
+
+def _make_derivative(fh, config):
+    from PIL import Image, ImageOps
+
+    with Image.open(fh) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGB')
+        side = config['DERIVATIVE_MAX_SIDE']
+        image.thumbnail((side, side))
+        buffer = io.BytesIO()
+        image.save(buffer, format='JPEG', quality=config['DERIVATIVE_QUALITY'], optimize=True)
+    return buffer.getvalue()
+
+
+def process_artifact(artifact_id):
+    """
+    نقل الملف المؤقت إلى التخزين، حساب SHA-256 وإنشاء نسخة JPEG مصغرة.
+    آمنة لإعادة التشغيل: تتجاهل أي ملف ليس في حالة uploaded.
+    """
+    config = get_config()
+    with transaction.atomic():
+        artifact = (
+            VerificationArtifact.objects.select_for_update()
+            .filter(pk=artifact_id, status='uploaded')
+            .first()
+        )
+        if artifact is None:
+            return None
+
+        path = staging_path(artifact)
+        try:
+            if path.exists():
+                source = open(path, 'rb')
+            else:
+                # ملفات قديمة منقولة من User.face_scan موجودة في التخزين مسبقاً
+                source = artifact.file.open('rb')
+                artifact.size = artifact.received_bytes = artifact.file.size
+            with source as fh:
+                artifact.sha256 = _hash_file(fh, config['CHUNK_SIZE'])
+                if not artifact.file:
+                    artifact.file.save(f'{artifact.upload_id}', File(fh), save=False)
+                    fh.seek(0)
+                artifact.derivative.save(
+                    f'{artifact.upload_id}.jpg',
+                    ContentFile(_make_derivative(fh, config)),
+                    save=False,
+                )
+            artifact.status = 'processed'
+        except (OSError, ValueError, SyntaxError):
+            # Pillow يرفع UnidentifiedImageError (OSError) للملفات غير الصالحة
+            artifact.status = 'failed'
+
+        artifact.processed_at = timezone.now()
+        artifact.save(update_fields=['file', 'derivative', 'sha256', 'size', 'received_bytes', 'status', 'processed_at'])
+
+    if path.exists():
+        os.remove(path)
+    if artifact.status == 'processed':
+        tasks.enqueue(notify_verification_review, artifact.pk, priority=tasks.PRIORITY_LOW)
+    return artifact
+
+
+def notify_verification_review(artifact_id):
+    """إشعار الإدارة (ADMINS) بوجود طلب تحقق جاهز للمراجعة."""
+    artifact = VerificationArtifact.objects.select_related('user').only(
+        'id', 'upload_id', 'sha256', 'user__email', 'user__emirates_id'
+    ).get(pk=artifact_id)
+    mail_admins(
+        f"Verification pending review: {artifact.user.email}",
+        f"User: {artifact.user.email}\n"
+        f"Emirates ID: {artifact.user.emirates_id}\n"
+        f"Upload: {artifact.upload_id}\n"
+        f"SHA-256: {artifact.sha256}\n",
+    )
@@ -1,16 +1,27 @@
 # views.py
 
+import re
+from decimal import Decimal, InvalidOperation
+
 from rest_framework import viewsets, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework.decorators import action
 from rest_framework.permissions import IsAuthenticated
-from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework.parsers import JSONParser
+from rest_framework.exceptions import NotFound, Throttled, ValidationError
+from rest_framework.utils.urls import replace_query_param
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.db.models.functions import Lower
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.db import transaction as db_transaction
 
 # --- النماذج ---
-from .models import User, CardDetail, Transaction, DeliveryLocation, DeliverySchedule, DigitalSignature, Employee
+from .models import User, CardDetail, Transaction, TransferTransaction, DeliveryLocation, DeliverySchedule, DigitalSignature, Employee, VerificationArtifact
 
 # --- السيريالايزر ---
 from .serializers import (
@@ -18,25 +29,63 @@ from .serializers import (
     CardDetailSerializer,
     TransactionSerializer,
     TransferTransactionSerializer,
+    TransferInboxSerializer,
     DeliveryLocationSerializer,
     DeliveryScheduleSerializer,
+    DeliveryScheduleCreateSerializer,
     EmployeeSerializer,
 )
 
+# --- المصادقة و JWT ---
+from .backends import aauthenticate
+from .tokens import ATMRefreshToken
+from .hashing import HashingPoolSaturated
+
 # --- الصلاحيات المخصصة ---
-from .permissions import IsAdminUser, IsApprovedUser
+from .permissions import IsAdminUser, IsApprovedUser, IsEmployee
+
+# --- views غير متزامنة (ASGI) ---
+from .async_views import AsyncAPIView
+
+# --- الترقيم ---
+from .pagination import UserCursorPagination, TransactionCursorPagination, TransferCursorPagination, DeliveryCursorPagination
+
+# --- تحسين الاستعلامات ---
+from .mixins import ConditionalListMixin, QuerysetOptimizationMixin
+
+# --- الإدخال المجمّع ---
+from .parsers import NDJSONParser
+from .batch import TransactionBatch
+from .idempotency import idempotent
+
+# --- ملفات التحقق والتواقيع وكشوف الحساب ---
+from . import signatures, statements, verification
+
+# --- أسعار الصرف والأرصدة والتحويلات ---
+from . import ledger, rates, transfers
+
+# --- بحث المستخدمين ومواقع التسليم ومسارات المناديب وسعة الفترات ---
+from . import geo, route_planner, slots, user_search
+
+# --- دفع تغيّر حالة المعاملات (SSE) ---
+from . import status_events
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+CURRENCY_RE = re.compile(r'^[A-Z]{3}$')
 
 
 # ================================
 # 1. تسجيل الدخول
 # ================================
-class LoginView(APIView):
+class LoginView(AsyncAPIView):
     """
     تسجيل الدخول وإصدار JWT tokens.
+    async: انتظار التجزئة في HashingPool لا يحجز thread من خادم ASGI.
     """
-    def post(self, request):
-        email = request.data.get("email")
-        password = request.data.get("password")
+    async def post(self, request):
+        data = await self.aload_data(request)
+        email = data.get("email")
+        password = data.get("password")
 
         if not email or not password:
             return Response(
@@ -44,14 +93,19 @@ class LoginView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        user = authenticate(email=email, password=password)
+        try:
+            user = await aauthenticate(request, email=email, password=password)
+        except (HashingPoolSaturated, TimeoutError):
+            # ذروة تسجيل الدخول: رفض سريع بدلاً من تكديس الطلبات على المعالج
+            raise Throttled(wait=1)
         if not user:
             return Response(
                 {"error": "البريد الإلكتروني أو كلمة المرور غير صحيحة"},
                 status=status.HTTP_401_UNAUTHORIZED
             )
 
-        refresh = RefreshToken.for_user(user)
+        # الرمز يحمل status و role و rev حتى لا تحتاج المصادقة لاحقاً إلى قاعدة البيانات
+        refresh = await ATMRefreshToken.afor_user(user)
         return Response({
             'access': str(refresh.access_token),
             'refresh': str(refresh),
@@ -59,7 +113,7 @@ class LoginView(APIView):
                 'id': user.id,
                 'email': user.email,
                 'status': user.status,
-                'is_approved': user.is_approved,
+                'is_approved': user.status == 'verified',
                 'full_name': user.get_full_name() or user.username
             }
         })
@@ -68,7 +122,7 @@ class LoginView(APIView):
 # ================================
 # 2. إدارة المستخدمين (للإدارة فقط)
 # ================================
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+class UserViewSet(QuerysetOptimizationMixin, viewsets.ReadOnlyModelViewSet):
     """
     عرض المستخدمين (فقط للمدراء).
     لا يُعرض أي حقل حساس (مثل كلمة المرور).
@@ -76,15 +130,45 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = User.objects.all()
     serializer_class = UserSerializer
     permission_classes = [IsAdminUser]
-    http_method_names = ['get', 'head', 'options']
+    # post فقط لإجراء change-status (لا يوجد إنشاء في ReadOnlyModelViewSet)
+    http_method_names = ['get', 'post', 'head', 'options']
+
+    pagination_class = UserCursorPagination
+
+    # مطابقة تامة على الحقول المطبّعة (فهارس btree)
+    exact_filters = {
+        'emirates_id': ('emirates_id_digits', user_search.digits),
+        'phone': ('phone_digits', user_search.digits),
+        'passport': ('passport_key', user_search.passport_key),
+    }
 
     def get_queryset(self):
         # فقط الحقول العامة
         return User.objects.only(
-            'id', 'first_name', 'last_name', 'email', 'status',
+            'id', 'first_name', 'last_name', 'username', 'email', 'status',
             'phone_number', 'emirates_id', 'passport', 'birth_date'
         )
 
+    def filter_queryset(self, queryset):
+        """
+        ?email= ?emirates_id= ?phone= ?passport= ?status= مطابقة تامة (بأي تنسيق للأرقام)،
+        ?search= بحث جزئي في كل الحقول (3 أحرف على الأقل).
+        """
+        params = self.request.query_params
+        for param, (field, normalize) in self.exact_filters.items():
+            if params.get(param):
+                queryset = queryset.filter(**{field: normalize(params[param])})
+        if params.get('email'):
+            queryset = queryset.alias(email_lower=Lower('email')).filter(email_lower=params['email'].strip().lower())
+        if params.get('status'):
+            queryset = queryset.filter(status=params['status'])
+        if 'search' in params:
+            term = user_search.normalize_term(params['search'])
+            if len(term) < user_search.MIN_TERM_LENGTH:
+                raise ValidationError({'search': [f"يجب أن يكون {user_search.MIN_TERM_LENGTH} أحرف على الأقل."]})
+            queryset = user_search.search(queryset, term)
+        return super().filter_queryset(queryset)
+
     @action(detail=True, methods=['post'], url_path='change-status')
     def change_status(self, request, pk=None):
         user = self.get_object()
@@ -104,7 +188,7 @@ class UserViewSet(viewsets.ReadOnlyModelViewSet):
 # ================================
 # 3. إدارة البطاقات
 # ================================
-class CardDetailViewSet(viewsets.ModelViewSet):
+class CardDetailViewSet(ConditionalListMixin, QuerysetOptimizationMixin, viewsets.ModelViewSet):
     """
     إدارة بطاقات المستخدم (عرض فقط، لا إنشاء).
     """
@@ -122,40 +206,217 @@ class CardDetailViewSet(viewsets.ModelViewSet):
 # ================================
 # 4. المعاملات
 # ================================
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(ConditionalListMixin, QuerysetOptimizationMixin, viewsets.ModelViewSet):
     """
     إدارة المعاملات (سحب، إيداع، تحويل).
     """
     serializer_class = TransactionSerializer
     permission_classes = [IsApprovedUser]
+    pagination_class = TransactionCursorPagination
+    prefetch_related_fields = ('delivery_locations', 'delivery_schedules')
+    batch_max_size = 1000
 
     def get_queryset(self):
-        return Transaction.objects.filter(user=self.request.user)
+        queryset = Transaction.objects.filter(user=self.request.user)
+
+        # تصفية اختيارية حسب الحالة (تستخدم الفهرس user, status, timestamp)
+        status_filter = self.request.query_params.get('status')
+        if status_filter:
+            queryset = queryset.filter(status=status_filter)
+        return queryset
+
+    @staticmethod
+    def _check_own_postings(*transactions):
+        # تحويل مُرحّل مسّ رصيد مستخدم آخر: لا يُعدّل ولا يُحذف من طرف واحد
+        if any(ledger.other_accounts(transaction) for transaction in transactions):
+            raise ValidationError("لا يمكن تعديل أو حذف تحويل بعد ترحيله.")
+
+    def perform_update(self, serializer):
+        # قفل المعاملة ثم تطبيق الفرق بين القيود القديمة والجديدة على رصيد صاحبها فقط
+        with db_transaction.atomic():
+            previous = Transaction.objects.select_for_update().get(pk=serializer.instance.pk)
+            self._check_own_postings(previous)
+            transaction = serializer.save()
+            self._check_own_postings(transaction)
+            try:
+                ledger.apply_postings(
+                    [(user_id, currency, -delta) for user_id, currency, delta in ledger.postings(previous)]
+                    + ledger.postings(transaction)
+                )
+            except ledger.InsufficientFunds:
+                raise ValidationError("الرصيد غير كافٍ.")
+
+    def perform_destroy(self, instance):
+        with db_transaction.atomic():
+            previous = Transaction.objects.select_for_update().get(pk=instance.pk)
+            self._check_own_postings(previous)
+            try:
+                ledger.revert([previous])
+            except ledger.InsufficientFunds:
+                raise ValidationError("الرصيد غير كافٍ.")
+            instance.delete()
+
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
 
     @action(detail=False, methods=['post'])
+    @idempotent
     def start(self, request):
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
         transaction = serializer.save(user=request.user)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
+    @action(detail=False, methods=['get'])
+    def statement(self, request):
+        """
+        كشف حساب كامل كتدفق: ?as=csv|ndjson&from=YYYY-MM-DD&to=YYYY-MM-DD (تاريخان شاملان).
+        بدون ترقيم وبدون serializer؛ الذاكرة ثابتة مهما طالت الفترة.
+        """
+        output = request.query_params.get('as', 'csv')
+        if output not in statements.CONTENT_TYPES:
+            return Response({"error": "الصيغة يجب أن تكون csv أو ndjson"}, status=status.HTTP_400_BAD_REQUEST)
+        start = _parse_date(request.query_params.get('from'))
+        end = _parse_date(request.query_params.get('to'))
+        if start is False or end is False or (start and end and start > end):
+            return Response({"error": "نطاق التاريخ غير صالح"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # تحت ASGI مولّد غير متزامن، وإلا يُحمّل Django التدفق كاملاً في الذاكرة
+        # (نوع الطلب نفسه، لا إعداد SERVER_MODE: إعداد خاطئ يعيد نوع المولّد الخطأ)
+        stream = statements.astream if isinstance(request._request, ASGIRequest) else statements.stream
+        response = StreamingHttpResponse(
+            stream(request.user.id, output, start, end),
+            content_type=statements.CONTENT_TYPES[output],
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="statement-{start or "all"}-{end or "all"}.{output}"'
+        )
+        return response
+
+    @action(detail=False, methods=['post'], parser_classes=[JSONParser, NDJSONParser])
+    @idempotent
+    def batch(self, request):
+        """
+        إدخال دفعة من المعاملات (مصفوفة JSON أو NDJSON) في وحدة ذرية واحدة.
+        تُعاد نتيجة كل عنصر بترتيبه، مع أخطاء العناصر المرفوضة.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            return Response(
+                {"error": "يجب إرسال مصفوفة من المعاملات"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not items or len(items) > self.batch_max_size:
+            return Response(
+                {"error": f"عدد المعاملات يجب أن يكون بين 1 و {self.batch_max_size}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = TransactionBatch(items, request.user).save()
+        created = sum(1 for result in results if result['status'] == 'created')
+        failed = len(results) - created
+
+        return Response({
+            'created': created,
+            'failed': failed,
+            'results': results,
+        }, status=status.HTTP_201_CREATED if not failed else status.HTTP_207_MULTI_STATUS)
+
+
+class TransactionEventsView(AsyncAPIView):
+    """
+    تدفق Server-Sent Events بتغيّر حالة معاملات المستخدم، بدلاً من استطلاع /api/transactions/.
+    اتصال واحد مفتوح لكل عميل؛ يعمل تحت ASGI فقط.
+    """
+    permission_classes = [IsApprovedUser]
+
+    async def get(self, request):
+        # تحت WSGI يشغل التدفق المفتوح thread كاملاً (ويحمّله Django في الذاكرة)
+        if not isinstance(request._request, ASGIRequest):
+            return Response(
+                {"error": "هذا المسار يتطلب خادم ASGI (SERVER_MODE=asgi)"},
+                status=status.HTTP_501_NOT_IMPLEMENTED
+            )
+
+        broker = status_events.get_broker()
+        subscription = broker.subscribe(request.user.id)
+        connected_at = timezone.now()
+        try:
+            snapshot = [
+                row async for row in status_events.snapshot_queryset(
+                    request.user.id, request.META.get('HTTP_LAST_EVENT_ID')
+                )
+            ]
+        except BaseException:
+            broker.unsubscribe(subscription)
+            raise
+
+        response = StreamingHttpResponse(
+            status_events.stream(subscription, snapshot, connected_at),
+            content_type='text/event-stream',
+        )
+        response['Cache-Control'] = 'no-cache'
+        # nginx: بدون تخزين مؤقت للتدفق
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
 
 # ================================
 # 5. التحويلات بين المستخدمين
 # ================================
-class TransferTransactionViewSet(viewsets.ModelViewSet):
+class TransferTransactionViewSet(QuerysetOptimizationMixin, viewsets.ModelViewSet):
     """
     تحويل الأموال بين المستخدمين.
     """
     serializer_class = TransferTransactionSerializer
     permission_classes = [IsApprovedUser]
+    pagination_class = TransferCursorPagination
+    # التحويل المنفّذ لا يُعدّل ولا يُحذف (الرصيد تحرّك فعلاً)
+    http_method_names = ['get', 'post', 'head', 'options']
+    inbox_max_page_size = 200
 
     def get_queryset(self):
         return TransferTransaction.objects.filter(user=self.request.user)
 
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        return super().create(request, *args, **kwargs)
+
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
 
+    @action(detail=False, methods=['get'])
+    def inbox(self, request):
+        """
+        التحويلات المرسلة والمستلمة معاً (الأحدث أولاً) في استعلام UNION واحد.
+        الصفحة التالية: ?before=<cursor> من حقل next.
+        """
+        try:
+            page_size = min(int(request.query_params.get('page_size', 50)), self.inbox_max_page_size)
+        except ValueError:
+            page_size = 0
+        if page_size < 1:
+            return Response({"error": "page_size غير صالح"}, status=status.HTTP_400_BAD_REQUEST)
+
+        before = None
+        if 'before' in request.query_params:
+            before = transfers.parse_cursor(request.query_params['before'])
+            if before is None:
+                return Response({"error": "المؤشر غير صالح"}, status=status.HTTP_400_BAD_REQUEST)
+
+        rows = transfers.inbox(request.user.id, before=before, limit=page_size + 1)
+        next_url = None
+        if len(rows) > page_size:
+            rows = rows[:page_size]
+            next_url = replace_query_param(
+                request.build_absolute_uri(), 'before', transfers.cursor_for(rows[-1])
+            )
+        return Response({
+            'next': next_url,
+            'results': TransferInboxSerializer(rows, many=True).data,
+        })
+
 
 # ================================
 # 6. إدارة الموظفين (فقط للمدراء)
@@ -183,12 +444,14 @@ class EmployeeCreateView(APIView):
         if hasattr(user, 'employee_profile'):
             return Response({"error": "هذا المستخدم موظف بالفعل"}, status=400)
 
-        employee = Employee.objects.create(
-            user=user,
-            first_name=first_name,
-            last_name=last_name,
-            role=role
-        )
+        if role not in dict(Employee.ROLE_CHOICES):
+            return Response({"error": "الدور غير صالح"}, status=status.HTTP_400_BAD_REQUEST)
+
+        # الاسم محفوظ على المستخدم نفسه
+        user.first_name = first_name
+        user.last_name = last_name
+        user.save(update_fields=['first_name', 'last_name'])
+        employee = Employee.objects.create(user=user, role=role)
         return Response({
             "message": "تم إنشاء الموظف بنجاح",
             "data": EmployeeSerializer(employee).data
@@ -210,11 +473,11 @@ class EmployeeUpdateView(APIView):
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
-class EmployeeListView(APIView):
+class EmployeeListView(AsyncAPIView):
     permission_classes = [IsAdminUser]
 
-    def get(self, request):
-        employees = Employee.objects.select_related('user').all()
+    async def get(self, request):
+        employees = [employee async for employee in Employee.objects.select_related('user')]
         serializer = EmployeeSerializer(employees, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
@@ -234,65 +497,508 @@ class EmployeeDeleteView(APIView):
 # ================================
 # 7. التحقق من الهوية (وجه + هوية)
 # ================================
-class FaceIDVerificationView(APIView):
+class FaceIDVerificationView(AsyncAPIView):
+    """
+    رفع صورة الوجه في طلب واحد. الصورة تُحفظ في VerificationArtifact وتُعالج في الخلفية.
+    للملفات الكبيرة أو الشبكات الضعيفة استخدم الرفع المجزأ (FaceScanUploadView).
+    """
     permission_classes = [IsAuthenticated]
 
-    def post(self, request):
-        face_scan = request.data.get("face_scan")
-        emirates_id = request.data.get("emirates_id")
+    async def post(self, request):
+        data = await self.aload_data(request)
+        face_scan = request.FILES.get("face_scan")
+        emirates_id = data.get("emirates_id")
 
         if not face_scan or not emirates_id:
             return Response(
                 {"error": "الرجاء رفع صورة الوجه وهوية الإمارات"},
                 status=status.HTTP_400_BAD_REQUEST
             )
+        if face_scan.size > verification.get_config()['MAX_SIZE']:
+            return Response(
+                {"error": "حجم الصورة أكبر من المسموح"},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
 
-        user = request.user
-        user.face_scan = face_scan
-        user.emirates_id = emirates_id
-        user.status = 'pending'  # الانتظار للمراجعة
-        user.save(update_fields=['face_scan', 'emirates_id', 'status'])
-
+        artifact = await sync_to_async(self.store)(request.user, face_scan, emirates_id)
         return Response({
-            "message": "تم رفع بيانات التحقق. سيتم مراجعتها من قبل الإدارة."
+            "message": "تم رفع بيانات التحقق. سيتم مراجعتها من قبل الإدارة.",
+            "upload_id": artifact.upload_id,
         }, status=status.HTTP_200_OK)
 
+    def store(self, user, face_scan, emirates_id):
+        with db_transaction.atomic():
+            artifact = verification.store_upload(user, face_scan)
+            user.emirates_id = emirates_id
+            user.status = 'pending'  # الانتظار للمراجعة
+            user.save(update_fields=['emirates_id', 'status'])
+        return artifact
+
+
+class FaceScanUploadView(AsyncAPIView):
+    """
+    بدء جلسة رفع مجزأ قابلة للاستئناف لصورة الوجه.
+    body: {"size": <bytes>, "emirates_id": "...", "content_type": "image/jpeg"}
+    """
+    permission_classes = [IsAuthenticated]
+
+    async def post(self, request):
+        data = await self.aload_data(request)
+        emirates_id = data.get("emirates_id")
+        try:
+            size = int(data.get("size"))
+        except (TypeError, ValueError):
+            size = 0
+
+        if size <= 0 or not emirates_id:
+            return Response(
+                {"error": "الرجاء إرسال حجم الملف وهوية الإمارات"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if size > verification.get_config()['MAX_SIZE']:
+            return Response(
+                {"error": "حجم الصورة أكبر من المسموح"},
+                status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+            )
+
+        artifact = await sync_to_async(self.create_session)(
+            request.user, size, data.get("content_type", ""), emirates_id
+        )
+        return Response({
+            "upload_id": artifact.upload_id,
+            "offset": 0,
+            "size": size,
+            "chunk_size": verification.get_config()['CHUNK_SIZE'],
+        }, status=status.HTTP_201_CREATED)
+
+    def create_session(self, user, size, content_type, emirates_id):
+        with db_transaction.atomic():
+            artifact = VerificationArtifact.objects.create(user=user, size=size, content_type=content_type)
+            user.emirates_id = emirates_id
+            user.save(update_fields=['emirates_id'])
+        return artifact
+
+
+class FaceScanUploadChunkView(AsyncAPIView):
+    """
+    GET: الإزاحة الحالية للجلسة (للاستئناف بعد انقطاع).
+    PUT: قطعة خام (application/octet-stream) مع Content-Range: bytes <start>-<end>/<total>.
+    """
+    permission_classes = [IsAuthenticated]
+
+    async def get(self, request, upload_id):
+        artifact = await VerificationArtifact.objects.filter(
+            user_id=request.user.pk, upload_id=upload_id
+        ).afirst()
+        if artifact is None:
+            raise NotFound
+        return Response({
+            "upload_id": artifact.upload_id,
+            "offset": artifact.received_bytes,
+            "size": artifact.size,
+            "status": artifact.status,
+        })
+
+    async def put(self, request, upload_id):
+        match = CONTENT_RANGE_RE.match(request.headers.get("Content-Range", ""))
+        if not match:
+            return Response(
+                {"error": "Content-Range مطلوب بالصيغة bytes start-end/total"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        start, end, total = (int(value) for value in match.groups())
+        # الكتابة على القرص مع قفل الصف تتم في thread؛ استقبال الجسم نفسه تم دون حجز thread
+        return await sync_to_async(self.receive_chunk)(request, upload_id, start, end, total)
+
+    def receive_chunk(self, request, upload_id, start, end, total):
+        with db_transaction.atomic():
+            artifact = get_object_or_404(
+                VerificationArtifact.objects.select_for_update().filter(user_id=request.user.pk),
+                upload_id=upload_id,
+            )
+            if artifact.status != 'uploading':
+                return Response(
+                    {"error": "اكتمل رفع هذا الملف", "offset": artifact.received_bytes},
+                    status=status.HTTP_409_CONFLICT
+                )
+            if end < start or total != artifact.size:
+                return Response(
+                    {"error": "Content-Range غير صالح"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            try:
+                # request.stream يقرأ جسم الطلب على دفعات دون تحميله كاملاً في الذاكرة
+                written = verification.write_chunk(artifact, request.stream, start, end - start + 1)
+            except verification.UploadOffsetMismatch as exc:
+                return Response(
+                    {"error": "الإزاحة لا تطابق ما تم استلامه", "offset": exc.offset},
+                    status=status.HTTP_409_CONFLICT
+                )
+            except verification.UploadTooLarge:
+                return Response(
+                    {"error": "القطعة تتجاوز حجم الملف"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+
+            if artifact.status == 'uploaded':
+                request.user.status = 'pending'  # الانتظار للمراجعة
+                request.user.save(update_fields=['status'])
+
+        response_status = status.HTTP_200_OK
+        if written < end - start + 1:
+            # انقطع الاتصال قبل اكتمال القطعة: ما وصل محفوظ ويستأنف العميل من offset
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({
+            "upload_id": artifact.upload_id,
+            "offset": artifact.received_bytes,
+            "size": artifact.size,
+            "status": artifact.status,
+        }, status=response_status)
+
 
 # ================================
 # 8. التوقيع الرقمي
 # ================================
-class SignatureView(APIView):
+class SignatureView(AsyncAPIView):
     permission_classes = [IsApprovedUser]
 
-    def post(self, request):
-        signature_data = request.data.get("signature_data")
-        if not signature_data:
+    async def post(self, request):
+        data = await self.aload_data(request)
+        signature_data = data.get("signature_data")
+        if not signature_data or not isinstance(signature_data, str):
             return Response(
                 {"error": "الرجاء إرسال بيانات التوقيع"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        DigitalSignature.objects.update_or_create(
-            user=request.user,
-            defaults={"signature_data": signature_data}
+        purpose = data.get("purpose", "verification")
+        if purpose not in dict(DigitalSignature.PURPOSE_CHOICES):
+            return Response(
+                {"error": "غرض التوقيع غير صالح"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        transaction_id = data.get("transaction_id")
+        if transaction_id is not None:
+            try:
+                transaction_id = int(transaction_id)
+            except (TypeError, ValueError):
+                return Response(
+                    {"error": "رقم المعاملة غير صالح"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            if not await Transaction.objects.filter(pk=transaction_id, user_id=request.user.pk).aexists():
+                return Response(
+                    {"error": "المعاملة غير موجودة"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+        try:
+            digest = await signatures.asave_signature(request.user, signature_data, purpose, transaction_id)
+        except signatures.InvalidSignature as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(
+            {"message": "تم حفظ التوقيع الرقمي بنجاح", "digest": digest},
+            status=status.HTTP_200_OK
         )
-        return Response({"message": "تم حفظ التوقيع الرقمي بنجاح"}, status=status.HTTP_200_OK)
 
 
 # ================================
 # 9. التسليم والموقع (Delivery)
 # ================================
-class DeliveryLocationViewSet(viewsets.ModelViewSet):
+class DeliveryLocationViewSet(ConditionalListMixin, QuerysetOptimizationMixin, viewsets.ModelViewSet):
     serializer_class = DeliveryLocationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = DeliveryCursorPagination
 
     def get_queryset(self):
         return DeliveryLocation.objects.filter(transaction__user=self.request.user)
 
 
-class DeliveryScheduleViewSet(viewsets.ModelViewSet):
+class DeliveryScheduleViewSet(ConditionalListMixin, QuerysetOptimizationMixin, viewsets.ModelViewSet):
+    """
+    الإنشاء وتغيير الموعد يحجزان فترة من core/slots.py (400 عند امتلائها)؛ الحذف يحررها (core/signals.py).
+    """
     serializer_class = DeliveryScheduleSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = DeliveryCursorPagination
 
     def get_queryset(self):
-        return DeliverySchedule.objects.filter(transaction__user=self.request.user)
\ No newline at end of file
+        return DeliverySchedule.objects.filter(transaction__user=self.request.user)
+
+    def get_serializer_class(self):
+        if self.action == 'create':
+            return DeliveryScheduleCreateSerializer
+        return DeliveryScheduleSerializer
+
+    def book(self, serializer, transaction_id):
+        data = serializer.validated_data
+        schedule = DeliverySchedule(scheduled_date=data['scheduled_date'], scheduled_time=data['scheduled_time'])
+        try:
+            slots.book([schedule], slots.region_of_transaction(transaction_id))
+        except slots.SlotFull:
+            raise ValidationError({"error": "لا توجد سعة متاحة في فترة التسليم المختارة."})
+        return schedule.slot_id
+
+    def perform_create(self, serializer):
+        with db_transaction.atomic():
+            slot_id = self.book(serializer, serializer.validated_data['transaction'].pk)
+            serializer.save(slot_id=slot_id)
+
+    def perform_update(self, serializer):
+        instance = serializer.instance
+        data = {
+            'scheduled_date': instance.scheduled_date, 'scheduled_time': instance.scheduled_time,
+            **serializer.validated_data,
+        }
+        moved = (
+            data['scheduled_date'] != instance.scheduled_date
+            or slots.slot_for(data['scheduled_time']) != slots.slot_for(instance.scheduled_time)
+        )
+        if not moved:
+            serializer.save()
+            return
+        with db_transaction.atomic():
+            serializer.validated_data.update(data)
+            slot_id = self.book(serializer, instance.transaction_id)
+            slots.release([instance.slot_id])
+            serializer.save(slot_id=slot_id)
+
+
+class DeliverySlotAvailabilityView(APIView):
+    """
+    GET ?date=YYYY-MM-DD&lat=&lon= (أو region=): سعة فترات اليوم في منطقة الموقع.
+    صفوف العدادات فقط (الفهرس الفريد date, region, slot)، بدون عدّ الجداول.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        params = request.query_params
+        date = _parse_date(params.get('date'))
+        if not date:
+            raise ValidationError({"error": "الرجاء إرسال date بالصيغة YYYY-MM-DD"})
+        if 'lat' in params or 'lon' in params:
+            latitude, longitude = _parse_decimal(params.get('lat')), _parse_decimal(params.get('lon'))
+            if latitude is None or longitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                raise ValidationError({"error": "الرجاء إرسال lat و lon صالحين"})
+            region = slots.region_for(latitude, longitude)
+        else:
+            region = params.get('region', '')
+
+        return Response({
+            "date": date,
+            "region": region,
+            "slots": [
+                {**row, 'slot': row['slot'].strftime('%H:%M')}
+                for row in slots.availability(date, region)
+            ],
+        })
+
+
+class DeliveryNearbyBaseView(APIView):
+    """
+    بحث المناديب عن التسليمات القريبة (core/geo.py): فهرس grid_cell ثم مسافة haversine.
+    lat/lon إلزاميان، status حالة المعاملة (pending افتراضياً).
+    """
+    permission_classes = [IsEmployee]
+    fields = ('transaction_id', 'address', 'building_type')
+
+    def parse_point(self, request):
+        latitude = _parse_decimal(request.query_params.get('lat'))
+        longitude = _parse_decimal(request.query_params.get('lon'))
+        if latitude is None or longitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise ValidationError({"error": "الرجاء إرسال lat و lon صالحين"})
+        transaction_status = request.query_params.get('status', 'pending')
+        if transaction_status not in dict(Transaction.STATUS_CHOICES):
+            raise ValidationError({"error": f"حالة غير صالحة: {transaction_status}"})
+        queryset = DeliveryLocation.objects.filter(transaction__status=transaction_status)
+        return queryset, float(latitude), float(longitude)
+
+    def respond(self, matches):
+        results = [
+            {**row, 'distance_km': round(distance, 3)}
+            for row, distance in matches
+        ]
+        return Response({"count": len(results), "results": results})
+
+
+class DeliveryNearbyView(DeliveryNearbyBaseView):
+    """GET ?lat=&lon=&radius_km=5&status=pending: كل التسليمات داخل الدائرة، الأقرب أولاً."""
+
+    def get(self, request):
+        queryset, latitude, longitude = self.parse_point(request)
+        radius_km = _parse_decimal(request.query_params.get('radius_km', 5))
+        max_radius = geo.get_config()['MAX_RADIUS_KM']
+        if radius_km is None or not 0 < radius_km <= max_radius:
+            raise ValidationError({"error": f"radius_km يجب أن يكون بين 0 و {max_radius}"})
+        return self.respond(geo.within(queryset, latitude, longitude, float(radius_km), self.fields))
+
+
+class DeliveryNearestView(DeliveryNearbyBaseView):
+    """GET ?lat=&lon=&k=10&status=pending: أقرب k تسليمات (ضمن MAX_RADIUS_KM)."""
+
+    def get(self, request):
+        queryset, latitude, longitude = self.parse_point(request)
+        max_nearest = geo.get_config()['MAX_NEAREST']
+        try:
+            k = int(request.query_params.get('k', 10))
+        except ValueError:
+            k = 0
+        if not 0 < k <= max_nearest:
+            raise ValidationError({"error": f"k يجب أن يكون بين 1 و {max_nearest}"})
+        return self.respond(geo.nearest(queryset, latitude, longitude, k, self.fields))
+
+
+class DeliveryRoutesView(APIView):
+    """
+    GET ?date=YYYY-MM-DD[&window_minutes=120&max_stops=25&depot_lat=&depot_lon=&status=pending]
+    مسارات المناديب لجداول اليوم (core/route_planner.py): مجموعات حسب النافذة والمنطقة، مرتبة بأقرب جار و 2-opt.
+    """
+    permission_classes = [IsEmployee]
+    max_window_minutes = 24 * 60
+    max_stops = 500
+
+    def get(self, request):
+        params = request.query_params
+        date = _parse_date(params.get('date'))
+        if not date:
+            raise ValidationError({"error": "الرجاء إرسال date بالصيغة YYYY-MM-DD"})
+        transaction_status = params.get('status', 'pending')
+        if transaction_status not in dict(Transaction.STATUS_CHOICES):
+            raise ValidationError({"error": f"حالة غير صالحة: {transaction_status}"})
+
+        config = route_planner.get_config()
+        try:
+            window_minutes = int(params.get('window_minutes', config['WINDOW_MINUTES']))
+            max_stops = int(params.get('max_stops', config['MAX_STOPS']))
+        except ValueError:
+            window_minutes = max_stops = 0
+        if not (0 < window_minutes <= self.max_window_minutes and 0 < max_stops <= self.max_stops):
+            raise ValidationError({
+                "error": f"window_minutes بين 1 و {self.max_window_minutes}، max_stops بين 1 و {self.max_stops}"
+            })
+
+        depot = None
+        if 'depot_lat' in params or 'depot_lon' in params:
+            latitude, longitude = _parse_decimal(params.get('depot_lat')), _parse_decimal(params.get('depot_lon'))
+            if latitude is None or longitude is None or not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                raise ValidationError({"error": "depot_lat و depot_lon غير صالحين"})
+            depot = (float(latitude), float(longitude))
+
+        stops, unplanned = route_planner.load_stops(date, transaction_status)
+        routes = route_planner.plan(stops, window_minutes, max_stops, depot)
+        return Response({
+            "date": date,
+            "stops": len(stops),
+            "unplanned": unplanned,
+            "routes": route_planner.serialize(routes),
+        })
+
+# ================================
+# 10. أسعار الصرف
+# ================================
+class ExchangeRateView(APIView):
+    """
+    GET: مصفوفة الأسعار الحالية (من الكاش).
+    POST (للإدارة): تسجيل لقطة أسعار {"rates": {"AED/USD": "0.2723", ...}, "source": "..."}.
+    """
+
+    def get_permissions(self):
+        if self.request.method == 'POST':
+            return [IsAdminUser()]
+        return [IsAuthenticated()]
+
+    def get(self, request):
+        matrix = rates.get_matrix()
+        return Response({
+            "rates": [
+                {"base": base, "quote": quote, "rate": str(rate)}
+                for (base, quote), rate in sorted(matrix.items())
+            ]
+        })
+
+    def post(self, request):
+        raw_rates = request.data.get("rates")
+        if not isinstance(raw_rates, dict) or not raw_rates:
+            return Response(
+                {"error": "الرجاء إرسال الأسعار بالصيغة {\"AED/USD\": \"0.2723\"}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        parsed = {}
+        for pair, value in raw_rates.items():
+            base, _, quote = str(pair).upper().partition('/')
+            rate = _parse_decimal(value)
+            if not (CURRENCY_RE.match(base) and CURRENCY_RE.match(quote)) or rate is None or rate <= 0:
+                return Response(
+                    {"error": f"سعر غير صالح: {pair}"},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            parsed[(base, quote)] = rate
+
+        bucket = rates.record_rates(parsed, source=str(request.data.get("source", ""))[:50])
+        return Response({"recorded": len(parsed), "bucket": bucket}, status=status.HTTP_201_CREATED)
+
+
+class ExchangeRateConvertView(APIView):
+    """
+    تحويل عدة مبالغ في طلب واحد:
+    {"currency_from": "AED", "currency_to": "USD", "items": [{"amount": "100"}, {"amount": "5", "currency_to": "EUR"}]}
+    السعر يُحسب مرة لكل زوج عملات، وليس لكل مبلغ.
+    """
+    permission_classes = [IsAuthenticated]
+    max_items = 10000
+
+    def post(self, request):
+        items = request.data.get("items")
+        if not isinstance(items, list) or not items or len(items) > self.max_items:
+            return Response(
+                {"error": f"عدد المبالغ يجب أن يكون بين 1 و {self.max_items}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        default_from = str(request.data.get("currency_from", "")).upper()
+        default_to = str(request.data.get("currency_to", "")).upper()
+        amounts, pairs, errors = [], [], {}
+        for index, item in enumerate(items):
+            if not isinstance(item, dict):
+                item = {"amount": item}
+            amount = _parse_decimal(item.get("amount"))
+            pair = (
+                str(item.get("currency_from", default_from)).upper(),
+                str(item.get("currency_to", default_to)).upper(),
+            )
+            if amount is None or not all(CURRENCY_RE.match(code) for code in pair):
+                errors[index] = "مبلغ أو عملة غير صالحة"
+            amounts.append(amount)
+            pairs.append(pair)
+        if errors:
+            return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = []
+        for (base, quote), amount, converted in zip(pairs, amounts, rates.convert_many(amounts, pairs)):
+            result = {"amount": str(amount), "currency_from": base, "currency_to": quote}
+            if converted is None:
+                result.update(converted=None, rate=None)
+            else:
+                result.update(converted=str(converted[0]), rate=str(converted[1]))
+            results.append(result)
+        return Response({"results": results})
+
+
+def _parse_decimal(value):
+    try:
+        number = Decimal(str(value))
+    except (InvalidOperation, TypeError, ValueError):
+        return None
+    return number if number.is_finite() else None
+
+
+def _parse_date(value):
+    """None إذا لم يُرسل، False إذا كان غير صالح."""
+    if not value:
+        return None
+    try:
+        return parse_date(value) or False
+    except ValueError:
+        return False
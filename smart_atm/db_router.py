@@ -0,0 +1,122 @@
+import random
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.functional import LazyObject, empty
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# الطلب الحالي (يعمل مع WSGI و ASGI)
+_current_request = ContextVar('db_router_request', default=None)
+
+
+def _sticky_cache():
+    return caches[getattr(settings, 'DATABASE_REPLICA_CACHE_ALIAS', 'default')]
+
+
+def _sticky_key(user_id):
+    return f'replica-sticky:{user_id}'
+
+
+def mark_sticky(user_id):
+    """
+    قراءات هذا المستخدم تذهب إلى default لمدة DATABASE_REPLICA_STICKY_SECONDS
+    حتى يرى كتاباته (read-your-writes) رغم تأخر النسخ.
+    """
+    _sticky_cache().set(_sticky_key(user_id), True, getattr(settings, 'DATABASE_REPLICA_STICKY_SECONDS', 10))
+
+
+async def amark_sticky(user_id):
+    await _sticky_cache().aset(_sticky_key(user_id), True, getattr(settings, 'DATABASE_REPLICA_STICKY_SECONDS', 10))
+
+
+def _request_user(request):
+    user = getattr(request, 'user', None)
+    # لا نُقيّم المستخدم الكسول هنا (تقييمه يستعلم قاعدة البيانات من داخل الـ router)
+    if isinstance(user, LazyObject) and user._wrapped is empty:
+        return None
+    return user
+
+
+class ReplicaRouter:
+    """
+    القراءات إلى نسخ القراءة (replica_*) فقط داخل طلبات GET/HEAD/OPTIONS،
+    ما لم يكن المستخدم قد كتب مؤخراً (انظر mark_sticky).
+    كل ما عدا ذلك (الكتابة، الطلبات غير الآمنة، الأوامر والمهام) إلى default.
+    """
+
+    def _replicas(self):
+        return [alias for alias in settings.DATABASES if alias.startswith('replica_')]
+
+    def db_for_read(self, model, **hints):
+        replicas = self._replicas()
+        request = _current_request.get()
+        if not replicas or request is None or request.method not in SAFE_METHODS:
+            return 'default'
+
+        user = _request_user(request)
+        if user is not None and user.is_authenticated and _sticky_cache().get(_sticky_key(user.pk)):
+            return 'default'
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # كل النسخ تحمل نفس البيانات
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaRoutingMiddleware:
+    """
+    يربط الطلب الحالي بـ ReplicaRouter، ويُفعّل الالتصاق بـ default
+    بعد كل كتابة ناجحة من المستخدم (مثل transactions/start و transfers).
+    يدعم sync و async حتى لا يضيف Django تحويلاً بين threads تحت ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        token = _current_request.set(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current_request.reset(token)
+
+        user = self._sticky_user(request, response)
+        if user is not None:
+            mark_sticky(user.pk)
+        return response
+
+    async def __acall__(self, request):
+        token = _current_request.set(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current_request.reset(token)
+
+        user = self._sticky_user(request, response)
+        if user is not None:
+            await amark_sticky(user.pk)
+        return response
+
+    def _sticky_user(self, request, response):
+        if request.method in SAFE_METHODS or response.status_code >= 400:
+            return None
+        user = _request_user(request)
+        if user is not None and user.is_authenticated:
+            return user
+        return None
@@ -9,9 +9,13 @@ https://docs.djangoproject.com/en/5.0/topics/settings/
 For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
+import os
 from datetime import timedelta
+from importlib.util import find_spec
 from pathlib import Path
 
+import django
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -48,6 +52,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'smart_atm.db_router.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -71,18 +76,71 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'smart_atm.wsgi.application'
+ASGI_APPLICATION = 'smart_atm.asgi.application'
+
+# SERVER_MODE=asgi عند التشغيل عبر uvicorn/daphne (انظر README):
+# views الـ async لا تعيد استخدام الاتصالات الدائمة، لذلك CONN_MAX_AGE=0 افتراضياً
+SERVER_MODE = os.environ.get('SERVER_MODE', 'wsgi')
 
 
 # Database
 # https://docs.djangoproject.com/en/5.0/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+#
+# يُختار الملف الشخصي من متغيرات البيئة (انظر README):
+#   DB_ENGINE=sqlite (افتراضي)  -> SQLite مع WAL و busy timeout للأجهزة المحلية/الطرفية
+#   DB_ENGINE=postgres          -> PostgreSQL مع اتصالات دائمة (و pool مدمج في Django 5.1+)
+#   DB_REPLICA_HOSTS=h1,h2      -> نسخ قراءة فقط (postgres) باسم replica_1, replica_2 ...
+
+DB_ENGINE = os.environ.get('DB_ENGINE', 'sqlite')
+
+if DB_ENGINE == 'postgres':
+    _postgres = {
+        'ENGINE': 'django.db.backends.postgresql',
+        'NAME': os.environ.get('DB_NAME', 'smart_atm'),
+        'USER': os.environ.get('DB_USER', 'smart_atm'),
+        'PASSWORD': os.environ.get('DB_PASSWORD', ''),
+        'HOST': os.environ.get('DB_HOST', 'localhost'),
+        'PORT': os.environ.get('DB_PORT', '5432'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '0' if SERVER_MODE == 'asgi' else '60')),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
     }
+    if django.VERSION >= (5, 1) and os.environ.get('DB_POOL', '1') == '1':
+        # pool مدمج (psycopg 3) - لا يُستخدم مع CONN_MAX_AGE
+        _postgres['CONN_MAX_AGE'] = 0
+        _postgres['OPTIONS']['pool'] = {
+            'min_size': int(os.environ.get('DB_POOL_MIN', '2')),
+            'max_size': int(os.environ.get('DB_POOL_MAX', '10')),
+        }
+
+    DATABASES = {'default': _postgres}
+    for _index, _host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), start=1):
+        DATABASES[f'replica_{_index}'] = {**_postgres, 'HOST': _host.strip(), 'TEST': {'MIRROR': 'default'}}
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+            'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', '0')),
+            'OPTIONS': {
+                # ثوانٍ انتظار القفل قبل "database is locked"
+                'timeout': float(os.environ.get('DB_BUSY_TIMEOUT', '20')),
+            },
+        }
+    }
+
+# تُطبّق عند فتح كل اتصال SQLite (core/signals.py)
+SQLITE_PRAGMAS = {
+    'journal_mode': os.environ.get('SQLITE_JOURNAL_MODE', 'wal'),
+    'synchronous': 'normal',
 }
 
+DATABASE_ROUTERS = ['smart_atm.db_router.ReplicaRouter']
+
+# بعد أي كتابة، قراءات المستخدم تبقى على default هذه المدة (أكبر من تأخر النسخ)
+DATABASE_REPLICA_STICKY_SECONDS = 10
+DATABASE_REPLICA_CACHE_ALIAS = 'default'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
@@ -103,6 +161,41 @@ AUTH_PASSWORD_VALIDATORS = [
 ]
 
 
+AUTHENTICATION_BACKENDS = [
+    'core.backends.EmailBackend',
+]
+
+
+# Password hashing
+# argon2 (argon2-cffi) أو bcrypt عند توفرهما، وإلا PBKDF2.
+# كلمات المرور القديمة يُعاد تجزئها تلقائياً عند تسجيل الدخول.
+
+PASSWORD_HASHERS = []
+if find_spec('argon2'):
+    PASSWORD_HASHERS.append('core.hashers.ATMArgon2PasswordHasher')
+if find_spec('bcrypt'):
+    PASSWORD_HASHERS.append('core.hashers.ATMBCryptSHA256PasswordHasher')
+PASSWORD_HASHERS += [
+    'core.hashers.ATMPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+]
+
+PASSWORD_HASHING_COST = {
+    "ARGON2_TIME_COST": 2,
+    "ARGON2_MEMORY_COST": 65536,
+    "ARGON2_PARALLELISM": 1,
+    "BCRYPT_ROUNDS": 12,
+    "PBKDF2_ITERATIONS": 600000,
+}
+
+# تجزئة كلمات المرور في مجموعة threads محدودة (core/hashing.py)
+PASSWORD_HASHING_POOL = {
+    "WORKERS": 2,
+    "MAX_PENDING": 32,
+    "TIMEOUT": 10,
+}
+
+
 # Internationalization
 # https://docs.djangoproject.com/en/5.0/topics/i18n/
 
@@ -120,6 +213,9 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -127,13 +223,20 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 
 REST_FRAMEWORK = {
+    # مصادِق واحد لرموز JWT ورموز أجهزة الصراف
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-        'core.authentication.ApprovedUserTokenAuthentication',
+        'core.authentication.ATMAuthentication',
     )
 }
 
 
+# كاش (رمز -> هوية) في core/authentication.py
+ATM_AUTH = {
+    "TOKEN_CACHE_TTL": 60,
+    "TOKEN_CACHE_MAX_ENTRIES": 10000,
+}
+
+
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
@@ -142,4 +245,106 @@ SIMPLE_JWT = {
     "ALGORITHM": "HS256",
     "SIGNING_KEY": SECRET_KEY,
     "AUTH_HEADER_TYPES": ("Bearer",),
-}
\ No newline at end of file
+    "TOKEN_OBTAIN_SERIALIZER": "core.serializers.ATMTokenObtainPairSerializer",
+}
+
+# الكاش الافتراضي (core/response_cache.py): داخل العملية، أو Redis مشترك بين العمليات عبر CACHE_REDIS_URL
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        # إصدار + حمولة لكل مستخدم نشط (الافتراضي 300 فقط)
+        'OPTIONS': {'MAX_ENTRIES': int(os.environ.get('CACHE_MAX_ENTRIES', '50000'))},
+    }
+}
+if os.environ.get('CACHE_REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['CACHE_REDIS_URL'],
+    }
+
+# كاش صلاحيات المستخدم (core/permission_cache.py)
+# BACKEND_ALIAS: اسم كاش مشترك من CACHES (اختياري). عند تفعيله يُفضّل تقصير LOCAL_TIMEOUT.
+PERMISSION_CACHE = {
+    "TIMEOUT": 300,
+    "LOCAL_TIMEOUT": 300,
+    "BACKEND_ALIAS": None,
+}
+
+# رفع صور التحقق (core/verification.py)
+VERIFICATION_UPLOADS = {
+    "MAX_SIZE": 10 * 1024 * 1024,
+    "CHUNK_SIZE": 64 * 1024,
+    "DERIVATIVE_MAX_SIDE": 512,
+    "DERIVATIVE_QUALITY": 80,
+}
+
+# طابور المهام الخلفية (core/tasks.py، manage.py run_tasks)
+# TASK_BROKER_URL=redis://localhost:6379/0 يوقظ الـ workers فوراً بدلاً من الاستطلاع
+TASK_QUEUE = {
+    "BROKER_URL": os.environ.get('TASK_BROKER_URL'),
+    "POLL_INTERVAL": 1,
+    "VISIBILITY_TIMEOUT": 300,
+    "MAX_ATTEMPTS": 5,
+    "RETRY_BACKOFF": 5,
+}
+
+# أسعار الصرف (core/rates.py)
+EXCHANGE_RATES = {
+    "BUCKET_SECONDS": 300,
+    "CACHE_TIMEOUT": 60,
+    "MAX_AGE": 24 * 60 * 60,
+    "PIVOT": "AED",
+}
+
+# أرصدة المستخدمين (core/ledger.py، manage.py reconcile_balances)
+LEDGER = {
+    "ENFORCE_FUNDS": False,
+}
+
+# مفاتيح Idempotency-Key (core/idempotency.py، manage.py prune_idempotency_keys)
+IDEMPOTENCY = {
+    "TTL": 24 * 60 * 60,
+}
+
+# تصدير كشوف الحساب (core/statements.py)
+STATEMENTS = {
+    "CHUNK_SIZE": 2000,
+}
+
+# البحث عن التسليمات القريبة (core/geo.py، manage.py rebuild_delivery_cells)
+DELIVERY_GEO = {
+    "CELL_DEGREES": 0.01,
+    "MAX_RADIUS_KM": 100,
+    "MAX_NEAREST": 100,
+}
+
+# تخطيط مسارات المناديب (core/route_planner.py، manage.py plan_routes)
+DELIVERY_ROUTES = {
+    "WINDOW_MINUTES": 120,
+    "MAX_STOPS": 25,
+    "ZONE_DEGREES": 0.05,
+    "TWO_OPT_PASSES": 20,
+}
+
+# سعة فترات التسليم (core/slots.py، manage.py reconcile_delivery_slots)
+DELIVERY_SLOTS = {
+    "SLOT_MINUTES": 60,
+    "DEFAULT_CAPACITY": 20,
+    "OPENING_HOUR": 8,
+    "CLOSING_HOUR": 22,
+}
+
+# كاش قوائم المستخدم مع ETag (core/response_cache.py)
+RESPONSE_CACHE = {
+    "ENABLED": True,
+    "TIMEOUT": 300,
+    "BACKEND_ALIAS": "default",
+}
+
+# دفع تغيّر حالة المعاملات عبر SSE (core/status_events.py)؛ RedisBroker عند تشغيل أكثر من عملية
+STATUS_EVENTS = {
+    "BROKER": os.environ.get('STATUS_EVENTS_BROKER', 'core.status_events.LocalBroker'),
+    "REDIS_URL": os.environ.get('STATUS_EVENTS_REDIS_URL'),
+    "KEEPALIVE": 15,
+    "MAX_AGE": 300,
+}